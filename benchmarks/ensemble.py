@@ -0,0 +1,73 @@
+'''
+Evolves a grid of parameter sets with Ensemble (one vectorized loop over
+all the models) and with one OneZone run per model, and times both.
+
+Both paths use the same engines (Inputs.rate_option = 'convolution',
+Inputs.ejecta_option = 'ssp'), so they agree to round-off. The Ensemble
+loads the yields and the tables once, while every OneZone run reloads
+them; the sums of the evolution scale with the number of models in both.
+
+Run from the repository root:
+    python benchmarks/ensemble.py
+'''
+import time
+import itertools
+import numpy as np
+import galcem as glc
+
+nu = [0.5, 1., 2., 4.]
+tau_inf = [3., 7.]
+k_SFR = [1., 1.4]
+grid = list(itertools.product(nu, tau_inf, k_SFR))
+params = {'nu': [p[0] for p in grid], 'tau_inf': [p[1] for p in grid], 'k_SFR': [p[2] for p in grid]}
+
+
+def inputs():
+    IN = glc.Inputs()
+    IN.nTimeStep = 0.02
+    IN.Galaxy_age = 5.005 # time_chosen must extend one step past Galaxy_age
+    IN.rate_option = 'convolution'
+    IN.ejecta_option = 'ssp'
+    return IN
+
+
+if __name__ == '__main__':
+    tic = time.perf_counter()
+    ens = glc.Ensemble(inputs(), params, outdir='runs/benchmark_ensemble/')
+    toc_setup = time.perf_counter() - tic
+    ens.file1 = open(ens._dir_out + 'Terminal_output.txt', 'w')
+    tic = time.perf_counter()
+    ens.evolve()
+    toc_ensemble = time.perf_counter() - tic
+    ens.file1.close()
+
+    toc_onezone, toc_onezone_setup = 0., 0.
+    rel = {key: 0. for key in ['Mgas_v', 'Mstar_v', 'SFR_v', 'Z_v', 'Rate_SNIa', 'Rate_SNCC', 'Rate_LIMs', 'Mass_i_v']}
+    for k in range(ens.n_models):
+        IN = inputs()
+        tic = time.perf_counter()
+        oz = glc.OneZone(IN, outdir='runs/benchmark_ensemble/onezone/')
+        toc_onezone_setup += time.perf_counter() - tic
+        for key in params:
+            IN.__dict__[key] = params[key][k]
+        oz.infall = glc.morph.Infall(IN, time=oz.time_chosen).inf()
+        oz.Infall_rate = oz.infall(oz.time_chosen)
+        oz.Mtot = np.insert(np.cumsum((oz.Infall_rate[1:] + oz.Infall_rate[:-1]) * IN.nTimeStep / 2),
+                            0, IN.epsilon)
+        oz.file1 = open(oz._dir_out + 'Terminal_output.txt', 'w')
+        tic = time.perf_counter()
+        oz.evolve()
+        toc_onezone += time.perf_counter() - tic
+        oz.file1.close()
+        one = ens.model(k)
+        steps = slice(0, oz.idx_Galaxy_age + 1)
+        for key in rel:
+            a, b = oz.__dict__[key][..., steps], one.__dict__[key][..., steps]
+            rel[key] = max(rel[key], np.max(np.abs(a - b) / np.maximum(np.abs(a), 1e-30)))
+
+    print('\n%d models %12s %10s'%(ens.n_models, 'setup [s]', 'evolve [s]'))
+    print('%9s %12.2f %10.2f'%('Ensemble', toc_setup, toc_ensemble))
+    print('%9s %12.2f %10.2f'%('OneZone', toc_onezone_setup, toc_onezone))
+    print('max relative difference vs OneZone:')
+    for key, value in rel.items():
+        print('%12s %10.2e'%(key, value))
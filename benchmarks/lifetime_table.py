@@ -0,0 +1,81 @@
+'''
+Validates the compiled lifetime tables (Inputs.lifetime_option = 'table')
+against the tau(M,Z) and M(tau,Z) splines they tabulate, refitted from
+yield_interpolation/lifetime_mass_metallicity/data.csv as in
+compile_lifetime_tables, and times both on the grids evaluated by
+Wi_grid.grids and Wi.dMdtauM_component. Fails if the table and the
+refitted spline differ by more than TOLERANCE (relative).
+
+Run from the repository root:
+    python benchmarks/lifetime_table.py
+'''
+import os
+import time
+import numpy as np
+import pandas as pd
+from scipy.interpolate import SmoothBivariateSpline
+import galcem as glc
+from galcem.classes import morphology as morph
+
+TOLERANCE = 1e-10 # round-off of the bicubic Hermite cells, ~1e-13 in practice
+
+
+class Refitted_Spline:
+    '''
+    The spline of compile_lifetime_tables, evaluated by FITPACK with
+    the transforms and the derivative chain rule of Lifetime_Table
+    '''
+    def __init__(self, df, xcol, ycol):
+        self.spline = SmoothBivariateSpline(x=np.log10(df[xcol].to_numpy()),
+                                            y=np.sqrt(df['metallicity'].to_numpy()),
+                                            z=np.log10(df[ycol].to_numpy()))
+        self.bounds = [(knots[0], knots[-1]) for knots in self.spline.get_knots()]
+
+    def evaluate(self, x, metallicity, deriv=False):
+        x, metallicity = np.broadcast_arrays(np.asarray(x, dtype=float),
+                                             np.asarray(metallicity, dtype=float))
+        u = np.clip(np.log10(x), *self.bounds[0])
+        v = np.clip(np.sqrt(metallicity), *self.bounds[1])
+        s = self.spline(u, v, grid=False)
+        if not deriv:
+            return np.power(10., s)
+        return self.spline(u, v, dx=1, grid=False) * s / x
+
+
+def max_rel_diff(a, b):
+    return np.max(np.abs(a - b) / np.abs(b))
+
+
+def timeit(func, *args, repeat=200):
+    tic = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    return (time.perf_counter() - tic) / repeat
+
+
+if __name__ == '__main__':
+    inputs = glc.Inputs()
+    lifetimes = morph.Stellar_Lifetimes(inputs)
+    df = pd.read_csv(os.path.join(os.path.dirname(morph.__file__), '..', '..', 'yield_interpolation',
+                                  'lifetime_mass_metallicity', 'data.csv'))
+    tau = Refitted_Spline(df, 'mass', 'lifetime_Gyr')
+    mass_by_tau = Refitted_Spline(df, 'lifetime_Gyr', 'mass')
+    rng = np.random.default_rng(0)
+    # Includes queries outside of the fitted domain
+    mass = np.geomspace(0.05, 150., num=inputs.num_MassGrid)
+    lifetime = np.geomspace(1e-3, 100., num=inputs.num_MassGrid)
+    metallicity = rng.uniform(1e-5, 0.06, size=inputs.num_MassGrid)
+    checks = [('tau(M,Z)', lifetimes.interp_stellar_lifetimes_array, tau.evaluate, mass),
+              ('M(tau,Z)', lifetimes.interp_stellar_masses_array, mass_by_tau.evaluate, lifetime),
+              ('dM/dtau', lifetimes.dMdtauM_array,
+               lambda x, Z: - mass_by_tau.evaluate(x, Z, deriv=True), lifetime),
+              ('dtau/dM', lifetimes.dtauMdM_array, lambda x, Z: tau.evaluate(x, Z, deriv=True), mass)]
+    print('%10s %14s %12s %12s'%('', 'max rel diff', 'spline [ms]', 'table [ms]'))
+    worst = 0.
+    for label, table, spline, x in checks:
+        diff = max_rel_diff(table(x, metallicity), spline(x, metallicity))
+        worst = max(worst, diff)
+        print('%10s %14.2e %12.3f %12.3f'%(label, diff, 1e3*timeit(spline, x, metallicity),
+              1e3*timeit(table, x, metallicity)))
+    assert worst < TOLERANCE, 'the lifetime tables differ from the refitted splines by %.2e'%worst
+    print('max rel diff %.2e < %.0e'%(worst, TOLERANCE))
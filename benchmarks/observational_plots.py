@@ -0,0 +1,39 @@
+'''
+Draws the observational figures of a run with every observational layer
+(obs_layer of the plots): None (the model tracks alone), 'points' (the
+default: one vector collection of all the surveys per panel, Survey_Layer),
+'raster' (the same collection, rasterized into one image per panel) and
+'density' (a 2D histogram of all the surveys per panel), and prints the
+time to draw and save every figure and the size of its pdf.
+
+The difference with obs_layer=None is the cost of the observations:
+the rest of the time goes to the axes and ticks of the panels.
+
+Run from the repository root, on a saved run:
+    python benchmarks/observational_plots.py <run directory>
+'''
+import os
+import sys
+import time
+import contextlib
+import matplotlib
+matplotlib.use('Agg')
+import galcem as glc
+
+figures = {'observational_plot': 'elem_obs.pdf',
+           'observational_lelemZ_plot': 'elem_obs_lelemZ.pdf',
+           'obs_lZ_plot': 'elem_obs_lZ.pdf'}
+
+if __name__ == '__main__':
+    pl = glc.Plots(outdir=sys.argv[1])
+    glc.Abundance_Catalog.open()
+    print('%28s %10s %10s %10s'%('figure', 'obs_layer', 'time [s]', 'pdf [kB]'))
+    for name, pdf in figures.items():
+        for obs_layer in [None, 'points', 'raster', 'density']:
+            tic = time.perf_counter()
+            with contextlib.redirect_stdout(None):
+                getattr(pl, name)(obs_layer=obs_layer)
+            toc = time.perf_counter() - tic
+            print('%28s %10s %10.1f %10.0f'%(name, obs_layer, toc,
+                  os.path.getsize(pl._dir_out_figs + pdf) / 1e3))
+            matplotlib.pyplot.close('all')
@@ -0,0 +1,60 @@
+'''
+Reads the observational surveys as the plots used to, each parsing every
+file of input/observations/abund and filtering every survey by element,
+and through Abundance_Catalog, parsed once and cached on disk, which
+slices the rows of an element, and times both for the observational
+plots of Plots.plots() (up to 30 elements each).
+
+Run from the repository root:
+    python benchmarks/observations.py
+'''
+import os
+import glob
+import time
+import numpy as np
+import pandas as pd
+import galcem as glc
+
+n_plots = 5 # plots of Plots.plots() reading the surveys
+elemZ = np.arange(3, 33)
+path = os.path.join(os.path.dirname(glc.__file__), 'input', 'observations', 'abund')
+
+
+def text():
+    all_files = sorted(glob.glob(path + "/*.txt"), key=len)
+    li = [pd.read_table(filename, sep=',') for filename in all_files]
+    return [[(ll.iloc[np.where(ll.iloc[:,0] == Z)[0],1], ll.iloc[np.where(ll.iloc[:,0] == Z)[0],2])
+             for ll in li] for Z in elemZ]
+
+
+def catalog():
+    catalog = glc.Abundance_Catalog.open(path)
+    return [[(FeH, XFe) for label, FeH, XFe in catalog.by_survey(Z)] for Z in elemZ]
+
+
+if __name__ == '__main__':
+    tic = time.perf_counter()
+    for plot in range(n_plots):
+        points_text = text()
+    toc_text = time.perf_counter() - tic
+
+    cache_path = glc.Abundance_Catalog.catalog_path(os.path.abspath(path))
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+    tic = time.perf_counter()
+    glc.Abundance_Catalog(path)
+    toc_build = time.perf_counter() - tic
+    tic = time.perf_counter()
+    for plot in range(n_plots):
+        points_catalog = catalog()
+    toc_catalog = time.perf_counter() - tic
+
+    same = all(np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1])
+               for Z_text, Z_catalog in zip(points_text, points_catalog)
+               for a, b in zip(Z_text, Z_catalog))
+    print('%d surveys, %d rows, %d plots of %d elements'%(
+          len(glob.glob(path + "/*.txt")), len(glc.Abundance_Catalog.open(path)), n_plots, len(elemZ)))
+    print('%26s %10.3f'%('text files [s]', toc_text))
+    print('%26s %10.3f'%('catalog, first build [s]', toc_build))
+    print('%26s %10.3f'%('catalog, cached [s]', toc_catalog))
+    print('same points: %s'%same)
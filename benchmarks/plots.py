@@ -0,0 +1,28 @@
+'''
+Renders the figures of Plots.plots() of a run in this process and in a
+pool of worker processes, and prints the wall time of both and the time
+of every figure. The speed-up is bound by the cores of the node and by
+the slowest figure (iso_evolution_comp_plot).
+
+Run from the repository root, on a saved run:
+    python benchmarks/plots.py <run directory> [max_workers]
+'''
+import os
+import sys
+import time
+import galcem as glc
+
+if __name__ == '__main__':
+    outdir = sys.argv[1]
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    pl = glc.Plots(outdir=outdir)
+    walls, timings = {}, {}
+    for workers in [1, max_workers]:
+        tic = time.perf_counter()
+        timings[workers] = pl.plots(max_workers=workers)
+        walls[workers] = time.perf_counter() - tic
+    print('\n%10s %10s'%('workers', 'wall [s]'))
+    for workers, wall in walls.items():
+        print('%10d %10.1f'%(workers, wall))
+    print('\nslowest figures (serial):')
+    print(timings[1].sort_values('time[s]', ascending=False).head(5)[['figure', 'time[s]']].to_string(index=False))
@@ -0,0 +1,141 @@
+'''
+Validates the channel rates of Rate_Convolution (Inputs.rate_option =
+'convolution') against the Simpson path of Wi.compute_rates, on the
+SFR history of a reference run, and fails if any check exceeds its
+tolerance. The relative differences are floored at 1e-6 of the
+largest rate.
+
+    incremental vs FFT    Rate_Convolution.rate(ch, n) vs .convolve(ch):
+                          the same sums, they agree to round-off (ROUND_OFF,
+                          relative to the largest rate)
+    fixed Z               both paths at a constant metallicity, where the
+                          kernels only depend on the delay. They differ by
+                          the quadrature error of the Simpson path on
+                          IN.num_MassGrid = 200 masses (SIMPSON_TOLERANCE,
+                          1.0e-2 for the LIMs), which mostly goes away on
+                          REFINED_MASS_GRID masses (REFINED_TOLERANCE: what
+                          is left is the interpolation of the kernels in
+                          sqrt Z between the metallicity bins)
+    evolving Z            the Z_v of the run. Rate_Convolution follows the
+                          stars born at every t' (with Z(t') lifetimes), the
+                          Simpson path the birthtime of every mass: they
+                          differ by the Jacobian 1/|1 + dtau/dZ dZ/dt'| of
+                          the SNCC and LIMs rates, up to JACOBIAN_DIFFERENCE
+                          (7.9e-2 for the LIMs). With the Jacobian
+                          (jacobian_rate) on REFINED_MASS_GRID masses, the
+                          paths agree within REFINED_TOLERANCE again
+
+Run from the repository root:
+    python benchmarks/rate_convolution.py
+'''
+import copy
+import time
+import numpy as np
+import galcem as glc
+from galcem.classes import integration as gcint
+
+channels = ['SNIa', 'SNCC', 'LIMs']
+ROUND_OFF = 1e-12
+SIMPSON_TOLERANCE = 1.5e-2
+REFINED_MASS_GRID = 2000
+REFINED_TOLERANCE = 5e-3
+JACOBIAN_DIFFERENCE = 0.1
+
+
+def jacobian_rate(Wi_class, channel_switch):
+    '''
+    Wi.compute_rate with the Jacobian 1/|1 + dtau/dZ dZ/dt'| of the birthtimes,
+    which turns it into the integral over the birthtimes of Rate_Convolution
+    '''
+    birthtime_grid = Wi_class.grid_picker(channel_switch, 'birthtime')
+    mass_grid = Wi_class.grid_picker(channel_switch, 'mass')
+    if len(birthtime_grid) == 0:
+        return Wi_class.IN.epsilon
+    SFR_comp = np.multiply(Wi_class.SFR_component(birthtime_grid), Wi_class.IN.M_inf)
+    SFR_comp[SFR_comp<0] = 0.
+    metallicity_grid = Wi_class.Z_component(birthtime_grid)
+    dt = 1e-4 # [Gyr]
+    dZdt = (Wi_class.Z_component(birthtime_grid + dt) - Wi_class.Z_component(birthtime_grid - dt)) / (2 * dt)
+    dZ = 1e-3 * np.maximum(metallicity_grid, 1e-5)
+    lifetimes = Wi_class.lifetime_class.interp_stellar_lifetimes_array
+    dtaudZ = (lifetimes(mass_grid, metallicity_grid + dZ) - lifetimes(mass_grid, metallicity_grid)) / dZ
+    integrand = SFR_comp * Wi_class.IMF_component(mass_grid) / np.abs(1. + dtaudZ * dZdt)
+    return Wi_class.IN.factor * gcint.integr.simps(integrand, x=mass_grid)
+
+
+def simpson_rates(oz, Z_v, steps, num_MassGrid=None, jacobian=False):
+    IN = copy.copy(oz.IN)
+    if num_MassGrid is not None:
+        IN.num_MassGrid = num_MassGrid
+    rates = {ch: np.zeros(len(steps)) for ch in channels}
+    tic = time.perf_counter()
+    for k, n in enumerate(steps):
+        Wi_class = gcint.Wi(n, IN, oz.lifetime_class, oz.time_chosen, Z_v, oz.SFR_v,
+                            oz.Greggio05_SD, oz.IMF, oz.ZA_sorted)
+        for ch, rate in Wi_class.compute_rates().items():
+            rates[ch][k] = jacobian_rate(Wi_class, ch) if jacobian and ch != 'SNIa' else rate
+    return rates, time.perf_counter() - tic
+
+
+def rel_diff(a, b):
+    floor = 1e-6 * np.max(np.abs(b))
+    return np.max(np.abs(a - b) / np.maximum(np.abs(b), floor))
+
+
+def compare(oz, Z_v, steps, label, tolerances):
+    '''tolerances: {reference: {channel: max rel diff}}, reference among 'Simpson', 'refined' (and 'Jacobian')'''
+    tic = time.perf_counter()
+    conv = gcint.Rate_Convolution(oz.IN, oz.time_chosen, oz.lifetime_class, oz.IMF,
+                                  oz.Greggio05_SD, oz.SFR_v, Z_v)
+    toc_kernels = time.perf_counter() - tic
+    references = {}
+    references['Simpson'], toc_simpson = simpson_rates(oz, Z_v, steps)
+    references['refined'], _ = simpson_rates(oz, Z_v, steps, num_MassGrid=REFINED_MASS_GRID,
+                                             jacobian='Jacobian' in tolerances)
+    print('\n%s: Simpson %.2f s, kernels (%d metallicity bins) %.2f s'%(
+          label, toc_simpson, len(conv.Z_bins), toc_kernels))
+    print('%6s %18s %10s %14s %14s %14s'%('', 'incremental [ms]', 'FFT [ms]',
+                                          'incr. vs FFT', 'vs Simpson', 'vs refined'))
+    failures = []
+    for ch in channels:
+        conv.length = 0
+        incremental = np.zeros(len(oz.time_chosen))
+        tic = time.perf_counter()
+        for n in range(steps[-1] + 1):
+            conv.update(n)
+            incremental[n] = conv.rate(ch, n)
+        toc_incremental = time.perf_counter() - tic
+        tic = time.perf_counter()
+        fft = conv.convolve(ch)
+        toc_fft = time.perf_counter() - tic
+        diffs = {'round-off': np.max(np.abs(incremental[steps] - fft[steps])) / np.max(np.abs(fft[steps]))}
+        for reference, rates in references.items():
+            diffs[reference] = rel_diff(incremental[steps], rates[ch])
+        print('%6s %18.1f %10.2f %14.2e %14.2e %14.2e'%(ch, 1e3*toc_incremental, 1e3*toc_fft,
+              diffs['round-off'], diffs['Simpson'], diffs['refined']))
+        limits = {'round-off': ROUND_OFF, 'Simpson': tolerances['Simpson'][ch],
+                  'refined': tolerances['refined'][ch]}
+        failures += ['%s %s vs %s: %.2e > %.0e'%(label, ch, reference, diffs[reference], limit)
+                     for reference, limit in limits.items() if diffs[reference] > limit]
+    return failures
+
+
+if __name__ == '__main__':
+    inputs = glc.Inputs()
+    inputs.nTimeStep = 0.02
+    inputs.Galaxy_age = 5.005 # time_chosen must extend one step past Galaxy_age
+    oz = glc.OneZone(inputs, outdir='runs/benchmark_rate_convolution/')
+    oz.file1 = open(oz._dir_out + 'Terminal_output.txt', 'w')
+    oz.evolve()
+    oz.file1.close()
+    steps = np.arange(1, oz.idx_Galaxy_age + 1)
+    failures = compare(oz, np.ones(len(oz.Z_v)) * 0.01, steps, 'fixed Z = 0.01',
+                       {'Simpson': dict.fromkeys(channels, SIMPSON_TOLERANCE),
+                        'refined': dict.fromkeys(channels, REFINED_TOLERANCE)})
+    # 'refined' is the Simpson path with the Jacobian of the birthtimes (jacobian_rate)
+    failures += compare(oz, oz.Z_v, steps, 'evolving Z',
+                        {'Simpson': {'SNIa': SIMPSON_TOLERANCE, 'SNCC': SIMPSON_TOLERANCE,
+                                     'LIMs': JACOBIAN_DIFFERENCE},
+                         'refined': dict.fromkeys(channels, REFINED_TOLERANCE), 'Jacobian': True})
+    assert not failures, '\n'.join(failures)
+    print('\nall the rates agree within their tolerances')
@@ -0,0 +1,59 @@
+'''
+Counts the yield interpolant evaluations performed by OneZone.evolve
+with and without Inputs.RK4_const_rhs.
+
+The RHS of the isotope equations only depends on the timestep index,
+so evaluating it once per step should cut the yield evaluations by 4x.
+
+Run from the repository root:
+    python benchmarks/rk4_yield_calls.py
+'''
+import time
+import numpy as np
+import galcem as glc
+
+
+class CallCounter:
+    ''' Wraps a callable and counts its calls '''
+    def __init__(self, func):
+        self.func = func
+        self.calls = 0
+        self.empty = getattr(func, 'empty', False)
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return self.func(*args, **kwargs)
+
+
+def run(evolve_option, const_rhs, nTimeStep=0.25, Galaxy_age=2.1):
+    inputs = glc.Inputs()
+    inputs.nTimeStep = nTimeStep
+    inputs.Galaxy_age = Galaxy_age
+    inputs.evolve_option = evolve_option
+    inputs.RK4_const_rhs = const_rhs
+    oz = glc.OneZone(inputs, outdir='runs/benchmark_rk4_yield_calls/')
+    counters = []
+    for ch in ['SNCC', 'LIMs']:
+        oz.yield_models[ch] = [CallCounter(model) for model in oz.yield_models[ch]]
+        counters.extend(oz.yield_models[ch])
+    oz.yield_matrix = CallCounter(oz.yield_matrix)
+    oz.file1 = open(oz._dir_out + 'Terminal_output.txt', 'w')
+    tic = time.perf_counter()
+    oz.evolve()
+    toc = time.perf_counter() - tic
+    oz.file1.close()
+    if evolve_option == 'scalar':
+        calls = np.sum([c.calls for c in counters])
+    else:
+        calls = oz.yield_matrix.calls
+    return calls, toc
+
+
+if __name__ == '__main__':
+    print('%12s %10s %16s %10s'%('evolve', 'const_rhs', 'yield evals', 'time [s]'))
+    for evolve_option in ['scalar', 'vectorized']:
+        results = {}
+        for const_rhs in [False, True]:
+            results[const_rhs] = run(evolve_option, const_rhs)
+            print('%12s %10s %16d %10.2f'%(evolve_option, const_rhs, *results[const_rhs]))
+        print('%12s %10s %16.1fx'%('', 'ratio', results[False][0]/results[True][0]))
@@ -0,0 +1,61 @@
+'''
+Extracts the [Fe/H] and [X/Fe] tracks of n_runs copies of a run, as
+Plots._extract_comparison did (one RunResult and one element sum per
+element and per run), and with Run_Comparison: in a process pool on the
+first call, then from the tracks.npz of every run (a new session), then
+from memory, and times the four.
+
+Run from the repository root, on a saved run:
+    python benchmarks/run_comparison.py <run directory> [n_runs] [max_workers]
+'''
+import os
+import sys
+import time
+import shutil
+import pickle
+import numpy as np
+import galcem as glc
+
+if __name__ == '__main__':
+    run_dir = sys.argv[1] if sys.argv[1][-1]=='/' else sys.argv[1]+'/'
+    n_runs = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    max_workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+    outdir = 'runs/benchmark_run_comparison/'
+    run_dirs = []
+    for k in range(n_runs):
+        run_dirs.append(outdir + 'run_%d/'%k)
+        if os.path.isdir(run_dirs[-1]):
+            shutil.rmtree(run_dirs[-1])
+        shutil.copytree(run_dir, run_dirs[-1], ignore=shutil.ignore_patterns('figs', 'tracks.npz'))
+    metadata = pickle.load(open(run_dir + 'metadata.pkl', 'rb'))
+    Z_list = np.unique(metadata['ZA_sorted'][:,0])
+    Z_list = Z_list[Z_list > 0]
+    solar_norm_H = metadata['solarA09_vs_H_bymass'][Z_list]
+    solar_norm_Fe = metadata['solarA09_vs_Fe_bymass'][Z_list]
+    c = 3
+
+    tic = time.perf_counter()
+    per_element = {}
+    for d in run_dirs:
+        run = glc.runstore.RunResult(d)
+        FeH = np.log10(np.divide(run.element(26)[c:], run.element(1)[c:])) - solar_norm_H[26]
+        per_element[d] = FeH, np.array([run.ratio(val, 26)[c:] - solar_norm_Fe[val] for val in Z_list])
+    toc_element = time.perf_counter() - tic
+
+    timings = {}
+    for label in ['first call', 'tracks.npz', 'memory']:
+        if label == 'tracks.npz':
+            glc.Run_Comparison._tracks.clear()
+        tic = time.perf_counter()
+        comparison = glc.Run_Comparison(run_dirs, max_workers=max_workers)
+        tracks = {d: comparison.tracks(d, Z_list, solar_norm_H, solar_norm_Fe, c=c) for d in run_dirs}
+        timings[label] = time.perf_counter() - tic
+
+    same = all(np.allclose(per_element[d][0], tracks[d][0], equal_nan=True) and
+               np.allclose(per_element[d][1], tracks[d][1], equal_nan=True) for d in run_dirs)
+    print('%d runs, %d elements, %d timesteps, %d workers'%(
+          n_runs, len(Z_list), len(tracks[run_dirs[0]][0]) + c, max_workers))
+    print('%28s %10.3f'%('per element [s]', toc_element))
+    for label, toc in timings.items():
+        print('%28s %10.3f'%('Run_Comparison, %s [s]'%label, toc))
+    print('same tracks: %s'%same)
@@ -0,0 +1,48 @@
+'''
+Reads the outputs of a run as the plots used to, each re-parsing
+Mass_i.dat and phys.dat, and through RunResult, which reads the run store
+once and memoizes the element masses and the [X/Fe] tracks, and times
+both for the data of the plots of Plots.plots().
+
+Run from the repository root:
+    python benchmarks/run_result.py [nTimeStep]
+'''
+import sys
+import time
+import numpy as np
+import pandas as pd
+import galcem as glc
+
+n_plots = 9 # plots of Plots.plots() reading Mass_i.dat and phys.dat
+
+if __name__ == '__main__':
+    nTimeStep = float(sys.argv[1]) if len(sys.argv) > 1 else 0.02
+    inputs = glc.Inputs()
+    inputs.nTimeStep = nTimeStep
+    inputs.Galaxy_age = 5. + nTimeStep / 4. # time_chosen must extend one step past Galaxy_age
+    inputs.legacy_text_output = True
+    oz = glc.OneZone(inputs, outdir='runs/benchmark_run_result/')
+    oz.main()
+    Z_list = np.unique(oz.ZA_sorted[:,0])
+
+    tic = time.perf_counter()
+    for plot in range(n_plots):
+        phys = pd.read_csv(oz._dir_out + 'phys.dat', sep=',', comment='#')
+        Mass_i = np.loadtxt(oz._dir_out + 'Mass_i.dat')
+        Fe = np.sum(Mass_i[oz.ZA_sorted[:,0] == 26, 2:], axis=0)
+        XFe_text = [np.log10(np.divide(np.sum(Mass_i[oz.ZA_sorted[:,0] == elemZ, 2:], axis=0), Fe))
+                    for elemZ in Z_list]
+    toc_text = time.perf_counter() - tic
+
+    tic = time.perf_counter()
+    for plot in range(n_plots):
+        run = glc.RunResult.open(oz._dir_out)
+        phys = run.phys
+        XFe = [run.ratio(elemZ, 26) for elemZ in Z_list]
+    toc_run = time.perf_counter() - tic
+
+    print('\n%d isotopes x %d timesteps, data of %d plots:'%(len(oz.ZA_sorted), len(oz.time_chosen), n_plots))
+    print('%12s %8.3f s'%('text files', toc_text))
+    print('%12s %8.3f s'%('RunResult', toc_run))
+    print('max [X/Fe] difference: %.2e dex (4 digits of the text files)'%np.nanmax(
+          np.abs(np.array(XFe) - np.array(XFe_text))[np.isfinite(XFe_text)]))
@@ -0,0 +1,87 @@
+'''
+Saves the same evolved run as the text Mass_i.dat, X_i.dat and
+W_i_comp.pkl and as a Run_Store (run.gcs/), and compares their write
+time, size on disk, full read time, the read time of one isotope and of
+one timestep, and their precision. Then times evolve with and without
+streaming the finished timesteps to the Run_Store (Inputs.stream_output),
+and saves the run with Xi_v computed from Mass_i_v (Inputs.Xi_lazy),
+streamed and by save_outputs, against the X_i of the stored Xi_v.
+
+Run from the repository root:
+    python benchmarks/run_store.py [nTimeStep]
+'''
+import os
+import sys
+import time
+import numpy as np
+import galcem as glc
+from galcem.runstore import Run_Store
+
+
+def rel_error(a, b):
+    return np.max(np.abs(a - b) / np.maximum(np.abs(b), 1e-30))
+
+
+def size(paths):
+    return sum(os.path.getsize(path) for path in paths) / 1e6
+
+
+def run(nTimeStep, stream_output, Xi_lazy=False, outdir='runs/benchmark_run_store/'):
+    inputs = glc.Inputs()
+    inputs.nTimeStep = nTimeStep
+    inputs.Galaxy_age = 5. + nTimeStep / 4. # time_chosen must extend one step past Galaxy_age
+    inputs.stream_output = stream_output
+    inputs.Xi_lazy = Xi_lazy
+    oz = glc.OneZone(inputs, outdir=outdir)
+    oz.file1 = open(oz._dir_out + 'Terminal_output.txt', 'w')
+    tic = time.perf_counter()
+    oz.evolve()
+    oz.file1.close()
+    return oz, time.perf_counter() - tic
+
+
+if __name__ == '__main__':
+    nTimeStep = float(sys.argv[1]) if len(sys.argv) > 1 else 0.02
+    run(nTimeStep, False) # warm-up
+    streamed, toc_streamed = run(nTimeStep, True)
+    oz, toc_evolve = run(nTimeStep, False)
+    i_Fe56 = oz.iso_class.pick_i_by_iso(oz.ZA_sorted, 26, 56)
+    n = oz.idx_Galaxy_age
+
+    tic = time.perf_counter()
+    oz.save_outputs()
+    toc_store = time.perf_counter() - tic
+    store = Run_Store(oz._dir_out)
+    tic = time.perf_counter()
+    store.export_text()
+    toc_text = time.perf_counter() - tic
+    text_files = [oz._dir_out + name for name in ['Mass_i.dat', 'X_i.dat', 'W_i_comp.pkl']]
+    store_files = [store.path + name for name in os.listdir(store.path)]
+
+    reads = {}
+    for label, read in [('text', lambda: np.loadtxt(oz._dir_out + 'Mass_i.dat')),
+                        ('store', lambda: store.read('Mass_i')),
+                        ('store isotope', lambda: store.read('Mass_i', isotopes=i_Fe56)),
+                        ('store step', lambda: store.read('Mass_i', steps=n))]:
+        tic = time.perf_counter()
+        read()
+        reads[label] = time.perf_counter() - tic
+    text = np.loadtxt(oz._dir_out + 'Mass_i.dat')[:, 2:]
+    steps = slice(0, n + 1)
+
+    print('\n%d isotopes x %d timesteps %12s %10s %10s %14s'%(len(oz.ZA_sorted), len(oz.time_chosen),
+          'write [s]', 'size [MB]', 'read [s]', 'rel. error'))
+    print('%28s %12.2f %10.1f %10.3f %14.2e'%('text', toc_text, size(text_files), reads['text'],
+          rel_error(text[:, steps], oz.Mass_i_v[:, steps])))
+    print('%28s %12.2f %10.1f %10.3f %14.2e'%('run store', toc_store, size(store_files), reads['store'],
+          rel_error(store.read('Mass_i')[:, steps], oz.Mass_i_v[:, steps])))
+    print('run store: one isotope in %.4f s, one timestep in %.4f s'%(reads['store isotope'], reads['store step']))
+    print('evolve: %.2f s, streaming to the run store: %.2f s'%(toc_evolve, toc_streamed))
+
+    for stream_output in [True, False]:
+        lazy, toc_lazy = run(nTimeStep, stream_output, Xi_lazy=True, outdir='runs/benchmark_run_store_Xi_lazy/')
+        if not stream_output:
+            lazy.save_outputs()
+        print('Xi_lazy, %s: evolve %.2f s, X_i rel. error %.2e'%(
+              'streaming' if stream_output else 'save_outputs', toc_lazy,
+              rel_error(Run_Store(lazy._dir_out).read('X_i')[:, steps], store.read('X_i')[:, steps])))
@@ -0,0 +1,58 @@
+'''
+Validates the SNCC and LIMs ejecta of SSP_Ejecta (Inputs.ejecta_option =
+'ssp') against the Simpson integrals of the reference run (W_i_comp),
+on the SFR and metallicity histories of that run, and times both runs.
+
+The differences are the quadrature of the mass grids, and the metallicity
+bins of the tables (Inputs.ssp_Z_subdivisions). Only the isotopes above
+1e-6 of the total ejecta count.
+
+Run from the repository root:
+    python benchmarks/ssp_ejecta.py
+'''
+import time
+import numpy as np
+import galcem as glc
+from galcem.classes import integration as gcint
+
+
+def run(ejecta_option, rate_option):
+    inputs = glc.Inputs()
+    inputs.nTimeStep = 0.02
+    inputs.Galaxy_age = 5.005 # time_chosen must extend one step past Galaxy_age
+    inputs.ejecta_option = ejecta_option
+    inputs.rate_option = rate_option
+    tic = time.perf_counter()
+    oz = glc.OneZone(inputs, outdir='runs/benchmark_ssp_ejecta/')
+    toc_setup = time.perf_counter() - tic
+    oz.file1 = open(oz._dir_out + 'Terminal_output.txt', 'w')
+    tic = time.perf_counter()
+    oz.evolve()
+    oz.file1.close()
+    return oz, toc_setup, time.perf_counter() - tic
+
+
+if __name__ == '__main__':
+    print('%10s %12s %10s %10s'%('ejecta', 'rates', 'setup [s]', 'evolve [s]'))
+    for ejecta_option, rate_option in [('simpson', 'simpson'), ('ssp', 'simpson'), ('ssp', 'convolution')]:
+        oz, toc_setup, toc_evolve = run(ejecta_option, rate_option)
+        print('%10s %12s %10.2f %10.2f'%(ejecta_option, rate_option, toc_setup, toc_evolve))
+        if ejecta_option == 'simpson':
+            reference = oz
+
+    steps = np.arange(1, reference.idx_Galaxy_age + 1)
+    print('\n%6s %8s %12s %12s %14s %14s'%('', 'bins', 'total p50', 'total max', 
+                                           'isotopes p50', 'isotopes p99'))
+    for ch in ['SNCC', 'LIMs']:
+        ssp = gcint.SSP_Ejecta(reference.IN, reference.time_chosen, reference.lifetime_class,
+                               reference.IMF, ch, reference.__dict__['yields_%s_class'%ch],
+                               reference.SFR_v, reference.Z_v)
+        ssp.update(reference.idx_Galaxy_age)
+        ejecta = ssp.ejecta_history()[:, steps]
+        simpson = reference.W_i_comp[ch][:, steps]
+        born = simpson.sum(axis=0) > 0.
+        total = np.abs(ejecta[:, born].sum(axis=0) / simpson[:, born].sum(axis=0) - 1.)
+        significant = simpson > 1e-6 * simpson.sum(axis=0)
+        isotopes = np.abs(ejecta[significant] / simpson[significant] - 1.)
+        print('%6s %8d %12.2e %12.2e %14.2e %14.2e'%(ch, len(ssp.Z_bins), np.median(total),
+              np.max(total), np.median(isotopes), np.percentile(isotopes, 99)))
@@ -0,0 +1,48 @@
+'''
+Times the startup of galcem in fresh interpreters, as paid by every
+worker of a sweep: `import galcem`, a first and a second Inputs(),
+the static tables of Inputs, the first access to the lazy attributes
+of the package (glc.OneZone, glc.Plots, glc.morph, glc.yi, glc.gcint),
+and all of them (what `import galcem` imported before they were lazy).
+Prints the median time of every step over n interpreters, and whether
+pandas, scipy and matplotlib are imported after it.
+
+Run from the repository root:
+    python benchmarks/startup.py [n]
+'''
+import sys
+import json
+import subprocess
+import numpy as np
+
+steps = [('import galcem', 'pass', 'import galcem as glc'),
+         ('Inputs()', 'import galcem as glc', 'IN = glc.Inputs()'),
+         ('second Inputs()', 'import galcem as glc; glc.Inputs()', 'IN = glc.Inputs()'),
+         ('static tables', 'import galcem as glc; IN = glc.Inputs()',
+                           'tables = [getattr(IN, name) for name in IN.static_tables]'),
+         ('glc.OneZone', 'import galcem as glc', 'glc.OneZone'),
+         ('glc.Plots', 'import galcem as glc', 'glc.Plots'),
+         ('glc.morph', 'import galcem as glc', 'glc.morph'),
+         ('glc.yi', 'import galcem as glc', 'glc.yi'),
+         ('glc.gcint', 'import galcem as glc', 'glc.gcint'),
+         ('every attribute', 'import galcem as glc', 'attrs = [getattr(glc, name) for name in glc.__all__]')]
+
+script = '''
+import sys, time, json
+%s
+tic = time.perf_counter()
+%s
+toc = time.perf_counter() - tic
+print(json.dumps([toc] + [any(m == name or m.startswith(name + '.') for m in sys.modules)
+                          for name in ['pandas', 'scipy', 'matplotlib']]))
+'''
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print('median of %d interpreters'%n)
+    print('%18s %10s %8s %8s %12s'%('', 'time [s]', 'pandas', 'scipy', 'matplotlib'))
+    for label, setup, stmt in steps:
+        rows = [json.loads(subprocess.run([sys.executable, '-c', script%(setup, stmt)],
+                                          capture_output=True, check=True, text=True).stdout)
+                for k in range(n)]
+        print('%18s %10.3f %8s %8s %12s'%(label, np.median([row[0] for row in rows]), *rows[-1][1:]))
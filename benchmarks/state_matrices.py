@@ -0,0 +1,55 @@
+'''
+Evolves the same run with the (isotopes x timesteps) matrices Mass_i_v,
+Xi_v and W_i_comp in float64 arrays (default), in float32, in np.memmap
+files (Inputs.matrix_memmap), and with Xi_v computed from Mass_i_v and
+Mgas_v when indexed (Inputs.Xi_lazy), and prints the memory held by the
+matrices, the evolve time and the difference from the default run.
+
+Run from the repository root:
+    python benchmarks/state_matrices.py [nTimeStep]
+'''
+import sys
+import time
+import numpy as np
+import galcem as glc
+
+configs = {'default': {},
+           'float32': {'matrix_dtype': 'float32'},
+           'memmap': {'matrix_memmap': True},
+           'Xi_lazy': {'Xi_lazy': True}}
+
+
+def matrices(oz):
+    arrays = [oz.Mass_i_v] + list(oz.W_i_comp.values())
+    if not oz.IN.Xi_lazy:
+        arrays.append(oz.Xi_v)
+    return arrays
+
+
+def run(nTimeStep, overrides):
+    inputs = glc.Inputs()
+    inputs.nTimeStep = nTimeStep
+    inputs.Galaxy_age = 5. + nTimeStep / 4. # time_chosen must extend one step past Galaxy_age
+    for key, value in overrides.items():
+        inputs.__dict__[key] = value
+    oz = glc.OneZone(inputs, outdir='runs/benchmark_state_matrices/')
+    oz.file1 = open(oz._dir_out + 'Terminal_output.txt', 'w')
+    tic = time.perf_counter()
+    oz.evolve()
+    oz.file1.close()
+    return oz, time.perf_counter() - tic
+
+
+if __name__ == '__main__':
+    nTimeStep = float(sys.argv[1]) if len(sys.argv) > 1 else 0.02
+    print('%10s %12s %12s %10s %12s %12s'%('', 'memory [MB]', 'disk [MB]', 'evolve [s]', 'Mass_i_v', 'Xi_v'))
+    for name, overrides in configs.items():
+        oz, toc = run(nTimeStep, overrides)
+        on_disk = sum(a.nbytes for a in matrices(oz) if isinstance(a, np.memmap))
+        in_memory = sum(a.nbytes for a in matrices(oz)) - on_disk
+        if name == 'default':
+            reference = oz
+        steps = slice(0, oz.idx_Galaxy_age + 1)
+        diff = [np.max(np.abs(np.asarray(a[:, steps], dtype=float) - b[:, steps]) / np.maximum(b[:, steps], 1e-30))
+                for a, b in [(oz.Mass_i_v, reference.Mass_i_v), (oz.Xi_v, reference.Xi_v)]]
+        print('%10s %12.1f %12.1f %10.2f %12.2e %12.2e'%(name, in_memory/1e6, on_disk/1e6, toc, *diff))
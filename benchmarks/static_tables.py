@@ -0,0 +1,38 @@
+'''
+Builds n Inputs, as a sweep does, with the static physics tables read
+from their csv files by every Inputs (as before) and from the registry
+of the process (static_table), and prints the time of both and the size
+of the pickled Inputs (inputs.pkl) with the tables and with their keys.
+
+Run from the repository root:
+    python benchmarks/static_tables.py [n]
+'''
+import sys
+import time
+import pickle
+import galcem as glc
+from galcem.classes import inputs as gcin
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    tic = time.perf_counter()
+    for k in range(n):
+        IN = glc.Inputs()
+        for name, key in IN.static_tables.items():
+            IN.__dict__[name] = gcin.read_static_table(key)
+    toc_csv = time.perf_counter() - tic
+    size_csv = len(pickle.dumps(IN))
+
+    gcin.STATIC_TABLES.clear()
+    tic = time.perf_counter()
+    for k in range(n):
+        IN = glc.Inputs()
+        tables = [getattr(IN, name) for name in IN.static_tables]
+    toc_registry = time.perf_counter() - tic
+    size_registry = len(pickle.dumps(IN))
+
+    print('%d Inputs'%n)
+    print('%22s %10s %14s'%('', 'time [s]', 'inputs.pkl [B]'))
+    print('%22s %10.3f %14d'%('csv per Inputs', toc_csv, size_csv))
+    print('%22s %10.3f %14d'%('registry', toc_registry, size_registry))
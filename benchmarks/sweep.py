@@ -0,0 +1,33 @@
+'''
+Runs a heterogeneous grid of OneZone runs with Sweep (process pool,
+shared-memory tables) and prints its manifest: the status, the worker
+and the setup, evolve and output times of every run.
+
+The wall time of the sweep scales with the cores of the node, and the
+setup of every run excludes the loading of the yield and lifetime tables,
+which the workers map from shared memory.
+
+Run from the repository root:
+    python benchmarks/sweep.py [max_workers]
+'''
+import os
+import sys
+import time
+import numpy as np
+import galcem as glc
+from galcem.sweep import Sweep
+
+if __name__ == '__main__':
+    inputs = glc.Inputs()
+    inputs.nTimeStep = 0.02
+    inputs.Galaxy_age = 5.005 # time_chosen must extend one step past Galaxy_age
+    overrides = Sweep.grid({'IMF_option': ['Kroupa01', 'Salpeter55'],
+                            'k_SFR': [1., 1.4],
+                            'Z_grid_warm_start': [True, False]})
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    tic = time.perf_counter()
+    manifest = Sweep(inputs, overrides, outdir='runs/benchmark_sweep/', max_workers=max_workers).main()
+    toc = time.perf_counter() - tic
+    print(manifest.drop(columns=['outdir', 'error']).to_string(index=False))
+    print('\n%d runs on %d workers: %.1f s wall, %.1f s of runs'%(len(manifest), max_workers, toc,
+          np.nansum(manifest[['setup[s]', 'evolve[s]', 'output[s]']].to_numpy())))
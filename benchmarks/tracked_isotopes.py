@@ -0,0 +1,68 @@
+'''
+Evolves only a few elements (Inputs.tracked_isotopes), with the other
+isotopes lumped in H, He and metal pools, against a run of every isotope,
+and times both, with the default Simpson integrals and with the
+convolution rates and SSP ejecta.
+
+The pools sum the interpolated yields of the isotopes they lump, so
+Mgas_v, Z_v and the masses of the tracked elements match the full run to
+round-off (asserted, TOLERANCE). Only the convolution rates and SSP
+ejecta evolve faster: the Simpson path interpolates the yields of every
+lumped isotope at every step.
+
+Run from the repository root:
+    python benchmarks/tracked_isotopes.py
+'''
+import time
+import numpy as np
+import galcem as glc
+
+tracked = ['Fe', 'Mg', 'Eu']
+TOLERANCE = 1e-12 # relative
+
+
+def run(tracked_isotopes, rate_option, ejecta_option):
+    inputs = glc.Inputs()
+    inputs.nTimeStep = 0.02
+    inputs.Galaxy_age = 5.005 # time_chosen must extend one step past Galaxy_age
+    inputs.tracked_isotopes = tracked_isotopes
+    inputs.rate_option = rate_option
+    inputs.ejecta_option = ejecta_option
+    tic = time.perf_counter()
+    oz = glc.OneZone(inputs, outdir='runs/benchmark_tracked_isotopes/')
+    toc_setup = time.perf_counter() - tic
+    oz.file1 = open(oz._dir_out + 'Terminal_output.txt', 'w')
+    tic = time.perf_counter()
+    oz.evolve()
+    oz.file1.close()
+    return oz, toc_setup, time.perf_counter() - tic
+
+
+def element_mass(oz, elemZ, steps):
+    return np.sum(oz.Mass_i_v[oz.ZA_sorted[:,0] == elemZ][:, steps], axis=0)
+
+
+if __name__ == '__main__':
+    for rate_option, ejecta_option in [('simpson', 'simpson'), ('convolution', 'ssp')]:
+        full, setup_full, evolve_full = run(None, rate_option, ejecta_option)
+        part, setup_part, evolve_part = run(tracked, rate_option, ejecta_option)
+        steps = slice(1, full.idx_Galaxy_age + 1)
+        print('\n%s rates, %s ejecta: %d isotopes, tracked %s in %d rows (pools %s)'%(
+              rate_option, ejecta_option, len(full.ZA_sorted), tracked, len(part.ZA_sorted),
+              ', '.join(['(%d,%d)'%tuple(part.ZA_sorted[row]) for row in part.ZA_pools])))
+        print('%10s %10s %10s'%('', 'setup [s]', 'evolve [s]'))
+        print('%10s %10.2f %10.2f'%('all', setup_full, evolve_full))
+        print('%10s %10.2f %10.2f'%('tracked', setup_part, evolve_part))
+        print('max relative difference vs all the isotopes:')
+        diffs = {}
+        for key in ['Mgas_v', 'Z_v']:
+            a, b = full.__dict__[key][steps], part.__dict__[key][steps]
+            diffs[key] = np.max(np.abs(b / a - 1.))
+        for elem in tracked:
+            elemZ = full.IN.periodic['elemZ'][full.IN.periodic['elemSymb'] == elem].iloc[0]
+            a, b = element_mass(full, elemZ, steps), element_mass(part, elemZ, steps)
+            produced = a > 0.
+            diffs[elem] = np.max(np.abs(b[produced] / a[produced] - 1.))
+        for key, diff in diffs.items():
+            print('%10s %10.2e'%(key, diff))
+        assert max(diffs.values()) < TOLERANCE, 'the tracked run differs from the full run by %.2e'%max(diffs.values())
@@ -12,4 +12,11 @@ run_iso = setup_glc.ZA_sorted
 # The iso_class instance of the Isotopes class (in yields.py) lets you select the index (in run_iso) of various isotopes
 # For example, for C12 (Z=6)
 C12_idx = setup_glc.iso_class.pick_i_by_iso(setup_glc.ZA_sorted, 6, 12)
-# This is the Carbon 12 index in all the outputs (Mass_i.dat, X_i.dat, W_i_comp.pkl)
\ No newline at end of file
+# This is the Carbon 12 index in all the outputs (Mass_i, X_i, W_i_comp.<channel> of the run store)
+# e.g. the Carbon 12 masses at every timestep:
+#   C12_mass = glc.runstore.Run_Store('runs/'+directory_name+'/').read('Mass_i', isotopes=C12_idx)
+
+# To evolve only a few elements or isotopes, set before the run e.g.
+#   inputs.tracked_isotopes = ['Fe', 'Mg', (63,151)]
+# The other isotopes are then lumped in pools with A=0 in ZA_sorted:
+# (1,0) hydrogen, (2,0) helium and (0,0) the metals
@@ -1,6 +1,40 @@
+'''
+Inputs and Auxiliary are imported with the package (numpy only: pandas
+and scipy are Lazy_Modules), so that `import galcem` stays fast, e.g. in
+every worker of a galcem.sweep.Sweep. The other classes and modules (and
+pandas, scipy and matplotlib with them) are imported on first access,
+e.g. glc.OneZone or glc.Plots (see _LAZY)
+'''
+import importlib
 from .classes.inputs import Inputs, Auxiliary
-from .onezone import Setup, OneZone
-from .plottingtool import Plots
-from .classes import morphology as morph
-from .classes import yields as yi
-from .classes import integration as gcint
\ No newline at end of file
+
+# name -> (module, attribute of the module, or None for the module itself)
+_LAZY = {'Setup': ('.onezone', 'Setup'),
+         'OneZone': ('.onezone', 'OneZone'),
+         'Ensemble': ('.onezone', 'Ensemble'),
+         'Plots': ('.plottingtool', 'Plots'),
+         'morph': ('.classes.morphology', None),
+         'yi': ('.classes.yields', None),
+         'gcint': ('.classes.integration', None),
+         'runstore': ('.runstore', None),
+         'RunResult': ('.runstore', 'RunResult'),
+         'Abundance_Catalog': ('.observations', 'Abundance_Catalog'),
+         'Run_Comparison': ('.comparison', 'Run_Comparison'),
+         'sweep': ('.sweep', None)}
+
+__all__ = ['Inputs', 'Auxiliary'] + list(_LAZY)
+
+
+def __getattr__(name):
+    '''Imports the lazy attributes of the package on first access'''
+    if name not in _LAZY:
+        raise AttributeError('module %r has no attribute %r'%(__name__, name))
+    module, attr = _LAZY[name]
+    value = importlib.import_module(module, __name__)
+    value = value if attr is None else getattr(value, attr)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
@@ -5,8 +5,11 @@
 "    the input parameters to set up a run      " 
 "                                              "
 " LIST OF CLASSES:                             "
+"    __        Lazy_Module                     "
 "    __        Inputs                          "
+"    __        Static_Table                    "
 "    __        Auxiliary                       "
+"    __        ZA_Index                        "
 "                                              "
 """"""""""""""""""""""""""""""""""""""""""""""""
 
@@ -14,7 +17,93 @@ import os
 import time
 import math
 import numpy as np
-import pandas as pd
+
+# Compiled tables (yields, lifetimes) attached from shared memory by the workers
+# of a galcem.sweep.Sweep, by the absolute path of the file they are compiled to
+SHARED_TABLES = {}
+
+# Static physics tables of Inputs (see Static_Table), read once per process by static_table
+STATIC_TABLES = {}
+STATIC_TABLE_FILES = {'portinari98table14': 'starlifetime/portinari98table14.dat',
+                      'periodicinfo': 'physics/periodicinfo.dat',
+                      'asplund09_table3': 'physics/asplund09/table3.dat',
+                      'asplund09_table1': 'physics/asplund09/table1.dat'}
+
+
+class Lazy_Module:
+    '''
+    A module imported on the first access to one of its attributes,
+    e.g. integr = Lazy_Module('scipy.integrate') at the top of a module,
+    so that importing galcem does not import pandas and scipy.
+    Every attribute is looked up once, then kept as an attribute of 
+    the Lazy_Module: integr.simpson costs the same as with the module
+    '''
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def __repr__(self):
+        return '<Lazy_Module %r (%s)>'%(self._name, 'imported' if self._module else 'not imported')
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            import importlib
+            self.__dict__['_module'] = importlib.import_module(self._name)
+        value = getattr(self._module, attr)
+        self.__dict__[attr] = value
+        return value
+
+pd = Lazy_Module('pandas')
+integr = Lazy_Module('scipy.integrate')
+sm = Lazy_Module('scipy.misc')
+
+
+def read_static_table(key):
+    '''Reads the table key of STATIC_TABLE_FILES from galcem/input/'''
+    path = os.path.join(os.path.dirname(__file__), '..', 'input', STATIC_TABLE_FILES[key])
+    if key == 'portinari98table14':
+        df = pd.read_csv(path)
+        df.columns = [name.replace('#M','M').replace('Z=0.','Z') for name in df.columns]
+        return df
+    df = pd.read_csv(path, sep=',', comment='#')
+    if key == 'asplund09_table1':
+        for col in df.columns[2:]:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+def static_table(key):
+    '''
+    The table key of STATIC_TABLE_FILES, read on first use and kept in 
+    STATIC_TABLES for the process. Its columns are read-only arrays, 
+    shared by every Inputs: copy() the table to modify it
+    '''
+    if key not in STATIC_TABLES:
+        df = read_static_table(key)
+        columns = {}
+        for col in df.columns:
+            values = df[col].to_numpy(copy=True)
+            values.flags.writeable = False
+            columns[col] = values
+        STATIC_TABLES[key] = pd.DataFrame(columns, copy=False)
+    return STATIC_TABLES[key]
+
+
+class Static_Table:
+    '''
+    Attribute of Inputs holding a static physics table: the DataFrame 
+    static_table(key), with the key given by Inputs.static_tables, so that 
+    an Inputs (and its inputs.pkl) holds the key and not the table.
+    Assigning the attribute replaces the table for that Inputs only,
+    e.g. IN.periodic = my_periodic_table
+    '''
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, IN, owner=None):
+        if IN is None:
+            return self
+        return static_table(IN.static_tables[self.name])
 
 
 class Inputs:
@@ -23,6 +112,12 @@ class Inputs:
     
     ags_Galaxy (float): age of the Galaxy (Gyr)
     """
+    # Static physics tables, shared by every Inputs of the process (see Static_Table)
+    s_lifetimes_p98 = Static_Table()
+    periodic = Static_Table()
+    asplund3 = Static_Table()
+    asplund1 = Static_Table()
+    
     def __init__(self):
         '''	applies to the thick disk at 8 kpc '''        
         # Time parameters
@@ -30,6 +125,15 @@ class Inputs:
         self.numTimeStep = 2000 # Like FM
         self.num_MassGrid = 200
         self.include_channel = ['SNCC', 'LIMs', 'SNIa']
+        self.tracked_isotopes = None # None: evolve every isotope of the yields. Or a list of elements ('Fe' or 26) and isotopes ((26,56)), the others are lumped in H, He and metal pools. Only faster with rate_option = 'convolution' and ejecta_option = 'ssp': the Simpson path interpolates the yields of every lumped isotope at every step
+        self.evolve_option = 'vectorized' # or 'scalar' (reference path: one RK4 call per isotope)
+        self.RK4_const_rhs = True # The GCE equations' RHS only depends on the timestep index n: evaluate it once per RK4 step
+        self.matrix_dtype = 'float64' # or 'float32': dtype of the (isotopes x timesteps) matrices Mass_i_v, Xi_v and W_i_comp
+        self.matrix_memmap = False # True: the matrices are np.memmap files in <run directory>/matrices/ instead of arrays in memory
+        self.Xi_lazy = False # True: Xi_v is computed from Mass_i_v and Mgas_v when indexed, instead of stored
+        self.legacy_text_output = False # True: also writes the text Mass_i.dat, X_i.dat and W_i_comp.pkl next to the run store (run.gcs/)
+        self.stream_output = True # True: evolve appends the finished timesteps to the run store, which can be read while the run is computing. False: the run store is written by save_outputs
+        self.output_batch = 128 # timesteps per write (and per chunk) of the run store
         
         self.Galaxy_birthtime = 0. #0.1 # [Gyr]
         self.Galaxy_age = 13.8 # [Gyr]
@@ -74,6 +178,7 @@ class Inputs:
         self.SFR_option = 'SFRgal' # or 'CSFR'
         self.CSFR_option = None # None: no cosmic SFR, e.g. 'md14' for Madau & Dickinson (2014). This requires self.SFR_option='CSFR'
         self.SNIaDTD_option = 'Greggio05'# !!!!!!! 'GreggioRenzini83' # 'RuizMannucci01'
+        self.SNIaDTD_table = False # Interpolate f_SD_Ia(lifetime) from a table built once in Setup (~1e-4 of the peak DTD) instead of evaluating Greggio05
 
         self.yields_NSM_option = 'r14'
         self.yields_MRSN_option = 'n17'
@@ -82,20 +187,23 @@ class Inputs:
         self.LC18_vel_idx = 0 # !!!!!!! eventually you should write a function to compute this
         self.yields_SNIa_option = 'i99' # 'k20' 
         self.yields_BBN_option = 'gp13'
+        self.lifetime_option = 'table' # or 'spline' (dill-loaded SmootheSpline2D_FI models the tables are compiled from)
 
         self.delta_max = 8e-2 # Convergence limit for eq. 28, Portinari+98
         self.epsilon = 1e-32 # Avoid numerical errors - consistent with BBN
-        self.to_sec = .1 # Metallicity convergence break time
+        self.Z_grid_max_iter = 20 # Metallicity grid convergence (Wi_grid.grids): maximum fixed-point iterations
+        self.Z_grid_rtol = 5e-4 # Metallicity grid convergence: relative tolerance between iterates
+        self.Z_grid_warm_start = True # Start from the converged metallicity grid of the previous timestep
         self.factor = 1 #!!!!!!!
+        self.rate_option = 'simpson' # or 'convolution': Rate_SNIa, Rate_SNCC, Rate_LIMs from the delay-time kernels of gcint.Rate_Convolution
+        self.rate_Z_bins = 16 # Metallicity bins of the Rate_Convolution kernels
+        self.ejecta_option = 'simpson' # or 'ssp': SNCC and LIMs ejecta from the single stellar population tables of gcint.SSP_Ejecta
+        self.ssp_Z_subdivisions = 2 # SSP_Ejecta metallicity bins per interval between the yield and lifetime metallicities
         
-        _dir = os.path.join(os.path.dirname( __file__ ), '..')
-        self.s_lifetimes_p98 = pd.read_csv(_dir+'/input/starlifetime/portinari98table14.dat')
-        self.s_lifetimes_p98.columns = [name.replace('#M','M').replace('Z=0.','Z') for name in self.s_lifetimes_p98.columns]
-        self.periodic = pd.read_csv(_dir+'/input/physics/periodicinfo.dat', sep=',', comment='#')
-        self.asplund3 = pd.read_csv(_dir+'/input/physics/asplund09/table3.dat', sep=',', comment='#')
-        self.asplund1 = pd.read_csv(_dir+'/input/physics/asplund09/table1.dat', sep=',', comment='#')
-        for col in self.asplund1.columns[2:]:
-            self.asplund1[col] = pd.to_numeric(self.asplund1[col], errors='coerce')
+        self.static_tables = {'s_lifetimes_p98': 'portinari98table14', # Attribute: key of the table in STATIC_TABLE_FILES
+                              'periodic': 'periodicinfo',
+                              'asplund3': 'asplund09_table3',
+                              'asplund1': 'asplund09_table1'}
     
     def __repr__(self):
         aux = Auxiliary()
@@ -319,8 +427,18 @@ class Auxiliary:
         print(json.dumps(repr_dict, default=str, indent=4))
         return '\n'.join(repr_dict)
 
+    def simpson_weights(self, x):
+        '''
+        Quadrature weights w s.t. np.dot(w, y) == integr.simpson(y, x=x).
+        Simpson's rule is linear in y, so w is its response to the unit vectors
+        '''
+        return integr.simpson(np.eye(len(x)), x=x, axis=-1)
+
     def pick_ZA_sorted_idx(self, ZA_sorted, Z=1,A=1):
-        return np.intersect1d(np.where(ZA_sorted[:,0]==Z), np.where(ZA_sorted[:,1]==A))[0]
+        idx = ZA_Index.of(ZA_sorted).lookup(Z, A)
+        if idx < 0:
+            raise IndexError('[Z, A] = [%d, %d] is not in ZA_sorted'%(Z, A))
+        return int(idx)
 
     def age_from_z(self, zf, h = 0.7, OmegaLambda0 = 0.7, Omegam0 = 0.3, Omegar0 = 1e-4, lookback_time = False):
         '''
@@ -337,18 +455,18 @@ class Auxiliary:
         lookback time.
         '''
         H0 = 100 * h * 3.24078e-20 * 3.15570e16 # [ km s^-1 Mpc^-1 * Mpc km^-1 * s Gyr^-1 ]
-        age = scipy.integrate.quad(lambda z: 1 / ( (z + 1) *np.sqrt(OmegaLambda0 + 
+        age = integr.quad(lambda z: 1 / ( (z + 1) *np.sqrt(OmegaLambda0 + 
                                 Omegam0 * (z+1)**3 + Omegar0 * (z+1)**4) ), 
                                 zf, np.inf)[0] / H0 # Since BB [Gyr]
         if not lookback_time:
             return age
         else:
-            age0 = scipy.ntegrate.quad(lambda z: 1 / ( (z + 1) *np.sqrt(OmegaLambda0 
+            age0 = integr.quad(lambda z: 1 / ( (z + 1) *np.sqrt(OmegaLambda0 
                                 + Omegam0 * (z+1)**3 + Omegar0 * (z+1)**4) ),
                                  0, np.inf)[0] / H0 # present time [Gyr]
             return age0 - age
 
-    def RK4(self, f, t, y, n, h, **kwargs):
+    def RK4(self, f, t, y, n, h, const_rhs=False, **kwargs):
         '''
         Classic Runge-Kutta 4th order for solving:     dy/dt = f(t,y,n)
         
@@ -358,11 +476,16 @@ class Auxiliary:
             y    dependent variable
             n    timestep index
             h    timestep width (delta t)
+            const_rhs    True if f is constant within the step, i.e. it
+                         depends on neither y nor t but only on n. Then
+                         k1 = k2 = k3 = k4 and f is evaluated only once
         
         RETURN
             next timestep
         '''
         k1 = f(t, y, n, **kwargs)
+        if const_rhs:
+            return y + h * k1
         k2 = f(t+0.5*h, y+0.5*h*k1, n, **kwargs)
         k3 = f(t+0.5*h, y+0.5*h*k2, n, **kwargs)
         k4 = f(t+h, y+h*k3, n, **kwargs)
@@ -370,3 +493,62 @@ class Auxiliary:
 
     def fastquad(self):
         "https://stackoverflow.com/questions/65269540/how-can-i-speed-up-scipy-integrate-quad"
+
+
+class ZA_Index:
+    '''
+    (Z,A) -> row lookup for an isotope list (e.g. ZA_sorted).
+    
+    Every pair is encoded in one integer key, Z * A_max + A, and the keys 
+    are sorted once, so a bulk lookup is a single np.searchsorted.
+    Repeated pairs resolve to their first row, like the former 
+    np.intersect1d(np.where(Z), np.where(A))[0] lookups.
+    
+    INPUT
+        ZA    (n,2) array of [Z,A] pairs
+    '''
+    A_max = 1000 # larger than any mass number
+    _cache = [] # (ZA, ZA_Index) of the last isotope lists passed to of()
+    
+    def __init__(self, ZA):
+        self.ZA = np.asarray(ZA).astype(int).reshape(-1, 2)
+        keys = self.encode(self.ZA[:,0], self.ZA[:,1])
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+    
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+    
+    def __len__(self):
+        return len(self.ZA)
+    
+    @classmethod
+    def of(cls, ZA, cache_size=8):
+        '''
+        Index of the array ZA, built once per array object 
+        (ZA must not be modified in place afterwards)
+        '''
+        for cached_ZA, index in cls._cache:
+            if cached_ZA is ZA:
+                return index
+        index = cls(ZA)
+        cls._cache.insert(0, (ZA, index))
+        del cls._cache[cache_size:]
+        return index
+    
+    def encode(self, Z, A):
+        return np.asarray(Z).astype(int) * self.A_max + np.asarray(A).astype(int)
+    
+    def lookup(self, Z, A, missing=-1):
+        '''Rows of the (Z, A) pairs (scalars or arrays), "missing" where absent'''
+        keys = self.encode(Z, A)
+        if len(self.sorted_keys) == 0:
+            return np.full(keys.shape, missing, dtype=int)
+        pos = np.minimum(np.searchsorted(self.sorted_keys, keys), len(self.sorted_keys) - 1)
+        return np.where(self.sorted_keys[pos] == keys, self.order[pos], missing)
+    
+    def lookup_ZA(self, ZA, missing=-1):
+        '''Rows of the [Z,A] pairs of an (n,2) array, "missing" where absent'''
+        ZA = np.asarray(ZA).reshape(-1, 2)
+        return self.lookup(ZA[:,0], ZA[:,1], missing=missing)
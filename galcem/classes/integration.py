@@ -5,29 +5,385 @@
 "  part of the integro-differential equations  "
 "                                              "
 " LIST OF CLASSES:                             "
+"    __        History                         "
+"    __        Rate_Convolution                "
+"    __        SSP_Ejecta                      "
 "    __        Wi_grid                         "
 "    __        Wi                              "
 "                                              "
 """"""""""""""""""""""""""""""""""""""""""""""""
-import time
+import os
 import numpy as np
-import pandas as pd
-import scipy.interpolate as interp
-import scipy.integrate as integr
 
 from ..classes import morphology as morph
-from ..classes.inputs import Auxiliary
+from ..classes.inputs import Auxiliary, Lazy_Module
+
+integr = Lazy_Module('scipy.integrate')
+
+SSP_TABLE_VERSION = 2 # bump when the SSP_Ejecta tables change
+
+
+class History:
+    '''
+    Time series on time_chosen (e.g. Z_v, SFR_v) filled one timestep 
+    at a time, and evaluated at arbitrary times (e.g. birthtimes).
+    
+    values is kept by reference: OneZone fills it, and calls update(n) 
+    once per timestep. Evaluations linearly interpolate the samples 
+    [0, n], extrapolating the first and last segments beyond them, 
+    with the same arithmetic as interp1d(fill_value='extrapolate') 
+    but without building an interpolant at every call.
+    '''
+    def __init__(self, time_chosen, values, age_idx=0):
+        self.time = time_chosen
+        self.values = values
+        self.update(age_idx)
+    
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+    
+    def update(self, age_idx):
+        '''The samples up to age_idx (included) are filled'''
+        self.length = age_idx + 1
+    
+    def __call__(self, time):
+        time = np.asarray(time, dtype=float)
+        idx = np.clip(np.searchsorted(self.time[:self.length], time), 1, self.length - 1)
+        x_lo, x_hi = self.time[idx-1], self.time[idx]
+        y_lo, y_hi = self.values[idx-1], self.values[idx]
+        slope = (y_hi - y_lo) / (x_hi - x_lo)
+        return slope * (time - x_lo) + y_lo
+
+
+class Rate_Convolution:
+    '''
+    Channel rates (Rate_SNIa, Rate_SNCC, Rate_LIMs) as discrete convolutions 
+    of the SFR history with delay-time kernels, on the uniform time_chosen.
+    
+    For a star born at t' the kernel only depends on the delay tau = t - t' 
+    and on the metallicity at birth Z(t'), through the stellar lifetimes:
+        SNIa          f_SD_Ia(tau),  tau(Mu_SNIa,Z) < tau < tau(Ml_SNIa,Z)
+        SNCC, LIMs    IN.factor * IMF(M) dM,  M in [Ml_ch, Mu_ch]
+    times M_inf (IN.M_inf), i.e. the same integrands as Wi.compute_rateSNIa 
+    and Wi.compute_rate.
+    Each kernel is tabulated on a bank of metallicity bins Z_b (uniform in 
+    sqrt Z over the Portinari+98 lifetimes), and integrated against the 
+    linear hat functions of the timesteps, so that a piecewise-linear 
+    SFR(t') (as History interpolates it) is convolved exactly:
+        R_n = sum_b sum_{j<=n} c_b(Z_j) SFR_j W_b[n-j] - c_b(Z_0) SFR_0 W_b^fall[n]
+    with c_b the linear interpolation weights in sqrt Z. The last term drops 
+    the stars born before the Galaxy (birthtime < 0), as Wi_grid.grids does.
+    
+    update(n) stores c_b(Z_n) SFR_n once Z_v[n] and SFR_v[n] are known, 
+    rate(ch, n) then costs O(n) (the coupled, incremental case), 
+    while convolve(ch) returns the rates of all the filled steps by FFT.
+    SFR_v and Z_v may have leading (e.g. model) axes before the time axis,
+    see bind(), and the rates then have the same leading axes.
+    
+    At a fixed metallicity both paths compute the same integral, up to 
+    the quadrature error of the Simpson path (1e-2 at most, on its 
+    IN.num_MassGrid masses, see benchmarks/rate_convolution.py). 
+    With an evolving Z they differ by the Jacobian 1/|1 + dtau/dZ dZ/dt'|, 
+    which the Simpson path over the birthtime of each mass leaves out 
+    (8e-2 at most, for the LIMs).
+    '''
+    def __init__(self, IN, time_chosen, lifetime_class, IMF, Greggio05_SD, SFR_v, Z_v, 
+                 channels=['SNIa', 'SNCC', 'LIMs'], num_nodes=2**15):
+        self.IN = IN
+        self.time_chosen = time_chosen
+        self.dt = self.IN.nTimeStep
+        self.SFR_v = SFR_v
+        self.Z_v = Z_v
+        self.lifetime_class = lifetime_class
+        self.IMF = IMF
+        self.Greggio05_SD = Greggio05_SD
+        self.Z_bins = self.metallicity_bins()
+        self.kernels = {ch: self.kernel(ch, num_nodes) for ch in channels}
+        self.M_inf = self.IN.M_inf
+        self.SFR_c = np.zeros((len(self.Z_bins),) + np.shape(SFR_v)) # c_b(Z_j) SFR_j
+        self.length = 0
+    
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+    
+    def lifetime_metallicities(self):
+        '''Metallicities of the Portinari+98 lifetimes'''
+        return np.array([float('0.'+col[1:]) for col in self.IN.s_lifetimes_p98.columns if col.startswith('Z')])
+    
+    def metallicity_bins(self):
+        '''IN.rate_Z_bins metallicities, uniform in sqrt Z over the Portinari+98 lifetimes'''
+        Z_p98 = self.lifetime_metallicities()
+        return np.linspace(np.sqrt(np.min(Z_p98)), np.sqrt(np.max(Z_p98)), num=self.IN.rate_Z_bins)**2
+    
+    def Z_coordinate(self, metallicity):
+        '''The kernels are interpolated linearly in sqrt Z, as the lifetimes are fitted'''
+        return np.sqrt(metallicity)
+    
+    def Z_weights(self, metallicity):
+        '''Linear interpolation weights c_b(Z), clamped to the bins. Shape (bins,) + Z.shape'''
+        metallicity = np.asarray(metallicity, dtype=float)
+        x = self.Z_coordinate(np.clip(metallicity.ravel(), self.Z_bins[0], self.Z_bins[-1]))
+        x_bins = self.Z_coordinate(self.Z_bins)
+        idx = np.clip(np.searchsorted(x_bins, x) - 1, 0, len(x_bins) - 2)
+        t = (x - x_bins[idx]) / (x_bins[idx+1] - x_bins[idx])
+        weights = np.zeros((len(self.Z_bins), len(x)))
+        cols = np.arange(len(x))
+        weights[idx, cols] = 1. - t
+        weights[idx+1, cols] += t
+        return weights.reshape((len(self.Z_bins),) + metallicity.shape)
+    
+    def hat_weights(self, lifetime, weight):
+        '''
+        Integrates the quadrature nodes (lifetime, weight) against the hat 
+        functions centered on the delays m*dt. weight is (nodes,) or (nodes, columns).
+        Returns W[m] and W^fall[m], the share of W[m] from lifetimes in [m dt, (m+1) dt].
+        '''
+        import scipy.sparse as sparse
+        N = len(self.time_chosen)
+        x = lifetime / self.dt
+        keep = np.where((x >= 0.) & (x < N - 1))[0]
+        m = np.floor(x[keep]).astype(int)
+        frac = x[keep] - m
+        fall = sparse.csr_matrix((1. - frac, (m, keep)), shape=(N, len(x)))
+        rise = sparse.csr_matrix((frac, (m + 1, keep)), shape=(N, len(x)))
+        W_fall = fall @ weight
+        return rise @ weight + W_fall, W_fall
+    
+    def mass_nodes(self, Ml, Mu, metallicity, num_nodes):
+        '''
+        Quadrature nodes over [Ml, Mu] at a fixed metallicity, refined at the 
+        masses whose lifetimes are the hat vertices m*dt. 
+        Returns the masses, their lifetimes and trapezoidal weights.
+        '''
+        mass = np.geomspace(Ml, Mu, num=num_nodes)
+        lifetime = self.lifetime_class.interp_stellar_lifetimes_array(mass, np.ones(len(mass))*metallicity)
+        vertices = np.arange(np.ceil(lifetime[-1]/self.dt), np.floor(lifetime[0]/self.dt)+1) * self.dt
+        # tau(M) decreases with M
+        mass = np.union1d(mass, np.exp(np.interp(np.log(vertices), np.log(lifetime[::-1]), 
+                                                 np.log(mass[::-1]))))
+        lifetime = self.lifetime_class.interp_stellar_lifetimes_array(mass, np.ones(len(mass))*metallicity)
+        return mass, lifetime, self.trapezoid(mass)
+    
+    def kernel(self, channel_switch, num_nodes):
+        '''Hat-integrated kernels of every metallicity bin. Returns W, W^fall of shape (bins, timesteps)'''
+        Ml, Mu = self.IN.__dict__['Ml_'+channel_switch], self.IN.__dict__['Mu_'+channel_switch]
+        W, W_fall = [], []
+        for Z in self.Z_bins:
+            if channel_switch == 'SNIa':
+                tau_lo, tau_hi = self.lifetime_class.interp_stellar_lifetimes_array(
+                                    np.array([Mu, Ml]), np.array([Z, Z]))
+                # Nodes refined at the hat vertices m*dt
+                lifetime = np.union1d(np.linspace(tau_lo, tau_hi, num=num_nodes), 
+                                np.arange(np.ceil(tau_lo/self.dt), np.floor(tau_hi/self.dt)+1) * self.dt)
+                weight = self.Greggio05_SD(lifetime) * self.trapezoid(lifetime)
+            else:
+                mass, lifetime, dM = self.mass_nodes(Ml, Mu, Z, num_nodes)
+                weight = self.IN.factor * self.IMF(mass) * dM
+            W_Z, W_fall_Z = self.hat_weights(lifetime, weight)
+            W.append(W_Z)
+            W_fall.append(W_fall_Z)
+        return np.array(W), np.array(W_fall)
+    
+    def trapezoid(self, x):
+        '''Trapezoidal quadrature weights of the nodes x'''
+        dx = np.diff(x)
+        return np.concatenate([dx, [0.]]) / 2. + np.concatenate([[0.], dx]) / 2.
+    
+    def bind(self, SFR_v, Z_v, M_inf=None):
+        '''
+        Copy sharing the kernels, which convolves other SFR_v and Z_v histories,
+        e.g. of several models at once (leading model axis, M_inf per model)
+        '''
+        import copy
+        other = copy.copy(self)
+        other.SFR_v = SFR_v
+        other.Z_v = Z_v
+        other.M_inf = self.M_inf if M_inf is None else np.asarray(M_inf, dtype=float)
+        other.SFR_c = np.zeros((len(self.Z_bins),) + np.shape(SFR_v))
+        other.length = 0
+        return other
+    
+    def update(self, age_idx):
+        '''Z_v and SFR_v are filled up to age_idx (included)'''
+        new = slice(self.length, age_idx + 1)
+        self.SFR_c[..., new] = self.Z_weights(self.Z_v[..., new]) * self.SFR_v[..., new]
+        self.length = age_idx + 1
+    
+    def convolution(self, channel_switch, age_idx):
+        '''
+        The sum over the birth timesteps and the metallicity bins at time_chosen[age_idx], 
+        O(age_idx). The bins that no star was born in are skipped
+        '''
+        W, W_fall = self.kernels[channel_switch]
+        n = age_idx
+        born = self.SFR_c[..., :n+1] != 0.
+        total = 0.
+        for b in np.where(np.any(born.reshape(len(born), -1), axis=1))[0]:
+            total = total + (np.dot(self.SFR_c[b, ..., n::-1], W[b, :n+1]) 
+                             - np.multiply.outer(self.SFR_c[b, ..., 0], W_fall[b, n]))
+        return total
+    
+    def scale(self, total, columns=0):
+        '''Multiplies the sums by M_inf, broadcast over the model axes'''
+        return np.reshape(self.M_inf, np.shape(self.M_inf) + (1,) * columns) * total
+    
+    def rate(self, channel_switch, age_idx):
+        '''Rate of the channel at time_chosen[age_idx]'''
+        rate = self.scale(self.convolution(channel_switch, age_idx))
+        return np.where(rate > 0., rate, self.IN.epsilon)[()]
+    
+    def rates(self, age_idx):
+        return {ch: self.rate(ch, age_idx) for ch in self.kernels}
+    
+    def fft_convolution(self, channel_switch):
+        '''
+        The sums of convolution() at all the filled timesteps, by FFT. 
+        Shape (model axes..., timesteps, kernel columns...)
+        '''
+        from scipy.signal import fftconvolve
+        W, W_fall = self.kernels[channel_switch]
+        n = self.length
+        models = self.SFR_c.ndim - 2 # leading model axes
+        columns = W.ndim - 2 # e.g. isotopes
+        SFR_c = self.SFR_c[..., :n].reshape(self.SFR_c.shape[:-1] + (n,) + (1,) * columns)
+        W = W[:, :n].reshape(W.shape[:1] + (1,) * models + (n,) + W.shape[2:])
+        W_fall = W_fall[:, :n].reshape(W.shape)
+        SFR_0 = self.SFR_c[..., :1].reshape(self.SFR_c.shape[:-1] + (1,) + (1,) * columns)
+        full = fftconvolve(SFR_c, W, axes=1+models)
+        return (np.sum(full[(slice(None),) * (1 + models) + (slice(0, n),)], axis=0)
+                - np.sum(SFR_0 * W_fall, axis=0))
+    
+    def convolve(self, channel_switch):
+        '''Rates of the channel at all the filled timesteps, by FFT'''
+        rate = self.scale(self.fft_convolution(channel_switch), columns=1)
+        return np.where(rate > 0., rate, self.IN.epsilon)
+
+
+class SSP_Ejecta(Rate_Convolution):
+    '''
+    Ejecta of the SNCC or LIMs channel (W_i_comp[ch][:,n], every isotope 
+    in ZA_sorted) from single stellar population (SSP) tables.
+    
+    The SSP ejecta per unit mass formed, of the stars of age tau = m*dt 
+    born with metallicity Z_b, are tabulated once (hat-integrated as in 
+    Rate_Convolution, whose sums they share), with the integrand of Wi.compute:
+        E_b[m, i] = int hat_m(tau) IMF(M) dMdtauM(tau,Z_b) y_i(M,Z_b) dtau,  
+                    M in [Ml_ch, Mu_ch], tau = tau(M,Z_b)
+    so the ejecta at every step are a weighted sum of the SFR history 
+    against the table, IN.factor * M_inf * sum_b sum_j c_b(Z_j) SFR_j E_b[n-j],
+    instead of Simpson integrals over the mass grids of every step.
+    
+    The metallicity bins refine the metallicities of the yield set and of 
+    the Portinari+98 lifetimes, interpolated linearly in log Z. 
+    The tables are cached in yield_interpolation/ssp/ (memory-mapped .npy), 
+    keyed by a hash of the inputs they depend on, the yields included.
+    '''
+    def __init__(self, IN, time_chosen, lifetime_class, IMF, channel_switch, yield_class, 
+                 SFR_v, Z_v, num_nodes=2**12):
+        self.channel_switch = channel_switch
+        self.yield_class = yield_class
+        self.interpolant = yield_class.interpolant # Yield_Table
+        self._ejecta = (None, None) # last (age_idx, ejecta), for the per-isotope evolution
+        super().__init__(IN, time_chosen, lifetime_class, IMF, None, SFR_v, Z_v, 
+                         channels=[channel_switch], num_nodes=num_nodes)
+    
+    def metallicity_bins(self):
+        '''The yield and lifetime metallicities, each interval split in IN.ssp_Z_subdivisions (in log Z)'''
+        log_Z = np.log10(np.union1d(self.lifetime_metallicities(), self.yield_class.metallicity_bins))
+        sub = self.IN.ssp_Z_subdivisions
+        return np.power(10., np.unique(np.concatenate([np.linspace(lo, hi, sub+1) 
+                                        for lo, hi in zip(log_Z[:-1], log_Z[1:])])))
+    
+    def Z_coordinate(self, metallicity):
+        return np.log10(metallicity)
+    
+    def cache_path(self, nodes):
+        '''
+        Path of the cached table, from a hash of the quadrature nodes, of the options 
+        and of the yield table (grid and values), so that a recompiled table gets new SSP tables
+        '''
+        import hashlib
+        key = hashlib.sha1()
+        key.update(repr((SSP_TABLE_VERSION, self.channel_switch, 
+                         self.IN.__dict__['yields_%s_option'%self.channel_switch], 
+                         self.interpolant.ycol, self.dt, len(self.time_chosen))).encode())
+        pools = [self.interpolant.pools[row] for row in sorted(self.interpolant.pools)]
+        yields = [self.interpolant.log_mass, self.interpolant.log_metallicity, self.interpolant.values]
+        for array in [self.Z_bins, self.interpolant.ZA_sorted[self.interpolant.rows]] + pools + yields + nodes:
+            key.update(np.ascontiguousarray(array, dtype=float).tobytes())
+        root = os.path.join(os.path.dirname(__file__), '..', '..', 'yield_interpolation', 'ssp')
+        return os.path.join(os.path.abspath(root), 'ssp_%s_%s.v%d.npy'%(
+                            self.channel_switch, key.hexdigest()[:16], SSP_TABLE_VERSION))
+    
+    def kernel(self, channel_switch, num_nodes):
+        '''
+        SSP tables E_b[m, i] and E_b^fall[m, i], of shape (bins, timesteps, isotopes 
+        tabulated by the channel), loaded from the cache or computed and cached
+        '''
+        Ml, Mu = self.IN.__dict__['Ml_'+channel_switch], self.IN.__dict__['Mu_'+channel_switch]
+        nodes = [self.mass_nodes(Ml, Mu, Z, num_nodes) for Z in self.Z_bins]
+        # The IMF and the lifetimes are part of the key through their values at the nodes
+        path = self.cache_path([array for mass, lifetime, dM in nodes 
+                                for array in (mass, lifetime, self.IMF(mass))])
+        if not os.path.exists(path):
+            E = np.zeros((2, len(self.Z_bins), len(self.time_chosen), len(self.interpolant.rows)))
+            for b, (Z, (mass, lifetime, dM)) in enumerate(zip(self.Z_bins, nodes)):
+                yields = np.power(10., self.interpolant.log_evaluate(mass, np.ones(len(mass))*Z))
+                # tau decreases along the mass nodes: -trapezoid(lifetime) integrates over the birthtimes
+                mass_comp = self.IMF(mass) * self.lifetime_class.dMdtauM_array(lifetime, 
+                                np.ones(len(mass))*Z) * -self.trapezoid(lifetime)
+                E[0, b], E[1, b] = self.hat_weights(lifetime, mass_comp[:, None] * yields)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + '.%d.tmp'%os.getpid()
+            with open(tmp_path, 'wb') as f:
+                np.save(f, E)
+            os.replace(tmp_path, path)
+        E = np.load(path, mmap_mode='r')
+        return E[0], E[1]
+    
+    def bind(self, SFR_v, Z_v, M_inf=None):
+        other = super().bind(SFR_v, Z_v, M_inf=M_inf)
+        other._ejecta = (None, None)
+        return other
+    
+    def ejecta(self, age_idx):
+        '''Ejecta of every isotope in ZA_sorted at time_chosen[age_idx]. Shape (model axes..., isotopes)'''
+        if self._ejecta[0] != (age_idx, self.length):
+            ejecta = np.zeros(self.SFR_c.shape[1:-1] + (len(self.interpolant.ZA_sorted),))
+            ejecta[..., self.interpolant.rows] = self.IN.factor * self.scale(
+                            self.convolution(self.channel_switch, age_idx), columns=1)
+            self._ejecta = ((age_idx, self.length), ejecta)
+        return self._ejecta[1]
+    
+    def ejecta_history(self):
+        '''Ejecta at all the filled timesteps, by FFT. Shape (model axes..., isotopes in ZA_sorted, timesteps)'''
+        ejecta = np.zeros(self.SFR_c.shape[1:-1] + (len(self.interpolant.ZA_sorted), self.length))
+        ejecta[..., self.interpolant.rows, :] = self.IN.factor * self.scale(
+                            np.swapaxes(self.fft_convolution(self.channel_switch), -1, -2), columns=2)
+        return ejecta
 
 
 class Wi_grid:
-    ''' grids for the Wi integral '''
-    def __init__(self, metallicity, age_idx, IN, lifetime_class, time_chosen, Z_v):
+    '''
+    grids for the Wi integral 
+    
+    Z_grid_state (optional) persists across timesteps: it holds the last two 
+    converged metallicity grids of every mass range, used to warm-start 
+    the next timestep (IN.Z_grid_warm_start). The number of fixed-point 
+    iterations of every grids() call is recorded in self.iterations.
+    '''
+    def __init__(self, metallicity, age_idx, IN, lifetime_class, time_chosen, Z_v, Z_grid_state=None, Z_history=None):
         self.metallicity = metallicity 
         self.age_idx = age_idx
         self.IN = IN
         self.Z_v = Z_v
+        self.Z_history = History(time_chosen, Z_v, age_idx) if Z_history is None else Z_history
         self.lifetime_class = lifetime_class
         self.time_chosen = time_chosen
+        self.Z_grid_state = {} if Z_grid_state is None else Z_grid_state
+        self.iterations = {} # fixed-point iterations per (Ml_lim, Mu_lim)
     
     def __repr__(self):
         aux = Auxiliary()
@@ -39,39 +395,64 @@ class Wi_grid:
         employed in the rate intragrals.
         
         Ml_lim and Mu_lim are mass limits for each channel.
+        
+        The metallicity at birth Z(t - tau(M, Z)) is solved by fixed-point
+        iteration (secant-accelerated), until Z and Z(t - tau(M, Z)) agree 
+        within IN.Z_grid_rtol, or for at most IN.Z_grid_max_iter iterations.
+        The first guess extrapolates the converged grids of the previous 
+        timesteps if available (IN.Z_grid_warm_start), otherwise it is 
+        the metallicity at the birthtimes tau(M, Z(t)) ago.
         '''
         mass_grid = np.geomspace(Ml_lim, Mu_lim, num = self.IN.num_MassGrid)
-        df_mz = pd.DataFrame(np.array([mass_grid, np.ones(len(mass_grid))*
-                        self.metallicity]).T, columns=['mass', 'metallicity'])
-        lifetime_grid0 = self.lifetime_class.interp_stellar_lifetimes(df_mz)
-        birthtime_grid0 = self.time_chosen[self.age_idx] - lifetime_grid0 
-        metallicity_grid0 = self.Z_component(birthtime_grid0)
-        metallicity_grid = np.ones(len(metallicity_grid0))
+        key = (Ml_lim, Mu_lim)
+        if self.IN.Z_grid_warm_start and key in self.Z_grid_state:
+            # Linear extrapolation in time of the last two converged grids
+            history = self.Z_grid_state[key]
+            metallicity_grid0 = history[-1][1]
+            if len(history) > 1:
+                (t0, Z0), (t1, Z1) = history
+                metallicity_grid0 = Z1 + (Z1 - Z0) * (self.time_chosen[self.age_idx] - t1) / (t1 - t0)
+                metallicity_grid0 = np.where(metallicity_grid0 >= 0., metallicity_grid0, Z1)
+        else:
+            lifetime_grid0 = self.lifetime_class.interp_stellar_lifetimes_array(mass_grid, 
+                                    np.ones(len(mass_grid))*self.metallicity)
+            metallicity_grid0 = self.Z_component(self.time_chosen[self.age_idx] - lifetime_grid0)
         
         # Make sure the grid points for the integration converge
-        timeout = time.time() + self.IN.to_sec 
-        trackZ = 0
-        while not np.allclose(metallicity_grid, metallicity_grid0, equal_nan=False, rtol=5e-04):
-            trackZ += 1
-            metallicity_grid0 = metallicity_grid
-            df_mz = pd.DataFrame(np.array([mass_grid, metallicity_grid0]).T,
-                                    columns=['mass', 'metallicity'])
-            lifetime_grid = self.lifetime_class.interp_stellar_lifetimes(df_mz)
+        metallicity_grid_prev, residual_prev = None, None
+        for trackZ in range(1, self.IN.Z_grid_max_iter+1):
+            lifetime_grid = self.lifetime_class.interp_stellar_lifetimes_array(mass_grid, 
+                                                                             metallicity_grid0)
             birthtime_grid = self.time_chosen[self.age_idx] - lifetime_grid
             metallicity_grid = self.Z_component(birthtime_grid)
-            if time.time() > timeout:
-                #print(f"Error: The metallicity grid isn't converging within {self.IN.to_sec} seconds.")
+            # Each mass is an independent fixed point: the stars born before 
+            # the Galaxy (birthtime <= 0) are discarded, and need not converge
+            born = birthtime_grid > 0.
+            if np.allclose(metallicity_grid[born], metallicity_grid0[born], 
+                           equal_nan=False, rtol=self.IN.Z_grid_rtol):
                 break
-        #print(f'{trackZ=}')
+            # Secant step on Z - Z(t - tau(M,Z)) = 0. The plain iteration 
+            # oscillates slowly for long-lived stars, where Z(t) is steep
+            residual = metallicity_grid - metallicity_grid0
+            metallicity_grid_next = metallicity_grid.copy()
+            if residual_prev is not None:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    secant = metallicity_grid0 - residual * (metallicity_grid0 
+                             - metallicity_grid_prev) / (residual - residual_prev)
+                use = np.isfinite(secant) & (secant >= 0.)
+                metallicity_grid_next[use] = secant[use]
+            metallicity_grid_prev, residual_prev = metallicity_grid0, residual
+            metallicity_grid0 = metallicity_grid_next
+        self.Z_grid_state[key] = (self.Z_grid_state.get(key, [])[-1:] 
+                                  + [(self.time_chosen[self.age_idx], metallicity_grid)])
+        self.iterations[key] = trackZ
         positive_idx = np.where(birthtime_grid > 0.)
         return (birthtime_grid[positive_idx], lifetime_grid[positive_idx], 
                 mass_grid[positive_idx])
 
     def Z_component(self, birthtime_grid):
-        # Returns the interpolated SFR vector computed at the birthtime grids
-        _Z_interp = interp.interp1d(self.time_chosen[:self.age_idx+1],
-                    self.Z_v[:self.age_idx+1], fill_value='extrapolate')
-        return _Z_interp(birthtime_grid) # Linear metallicity
+        # Returns the interpolated metallicity vector computed at the birthtime grids
+        return self.Z_history(birthtime_grid) # Linear metallicity
             
 class Wi:
     '''
@@ -81,23 +462,29 @@ class Wi:
     birthtime (t')     is the stellar birthtime
     lifetime (tau)    is the stellar lifetime
     '''
-    def __init__(self, age_idx, IN, lifetime_class, time_chosen, Z_v, SFR_v, Greggio05_SD, IMF, ZA_sorted):
+    def __init__(self, age_idx, IN, lifetime_class, time_chosen, Z_v, SFR_v, Greggio05_SD, IMF, ZA_sorted, 
+                 Z_grid_state=None, Z_history=None, SFR_history=None):
         self.IN = IN
         self.lifetime_class = lifetime_class
         self.time_chosen = time_chosen
         self.Z_v = Z_v
         self.SFR_v = SFR_v
+        self.Z_history = History(time_chosen, Z_v, age_idx) if Z_history is None else Z_history
+        self.SFR_history = History(time_chosen, SFR_v, age_idx) if SFR_history is None else SFR_history
         self.Greggio05_SD = Greggio05_SD
         self.IMF = IMF
         self.ZA_sorted = ZA_sorted
         self.metallicity = self.Z_v[age_idx]
         self.age_idx = age_idx
-        self.Wi_grid_class = Wi_grid(self.metallicity, self.age_idx, self.IN, lifetime_class, self.time_chosen, self.Z_v)
+        self.Wi_grid_class = Wi_grid(self.metallicity, self.age_idx, self.IN, lifetime_class, self.time_chosen, self.Z_v, 
+                                     Z_grid_state=Z_grid_state, Z_history=self.Z_history)
         #self.MRSN_birthtime_grid, self.MRSN_lifetime_grid, self.MRSN_mass_grid = self.Wi_grid_class.grids(self.IN.Ml_MRSN, self.IN.Mu_MRSN)
         #self.NSM_birthtime_grid, self.NSM_lifetime_grid, self.NSM_mass_grid = self.Wi_grid_class.grids(self.IN.Ml_NSM, self.IN.Mu_NSM)
         self.SNIa_birthtime_grid, self.SNIa_lifetime_grid, self.SNIa_mass_grid = self.Wi_grid_class.grids(self.IN.Ml_SNIa, self.IN.Mu_SNIa)
         self.SNCC_birthtime_grid, self.SNCC_lifetime_grid, self.SNCC_mass_grid = self.Wi_grid_class.grids(self.IN.Ml_SNCC, self.IN.Mu_SNCC)
         self.LIMs_birthtime_grid, self.LIMs_lifetime_grid, self.LIMs_mass_grid = self.Wi_grid_class.grids(self.IN.Ml_LIMs, self.IN.Mu_LIMs)
+        self.Z_grid_iterations = {ch: self.Wi_grid_class.iterations[(self.IN.__dict__['Ml_'+ch], self.IN.__dict__['Mu_'+ch])]
+                                  for ch in ['SNIa', 'SNCC', 'LIMs']}
     
     def __repr__(self):
         aux = Auxiliary()
@@ -114,16 +501,12 @@ class Wi:
     def Z_component(self, birthtime_grid):
         ''' Returns the interpolated metallicity vector
         computed at the birthtime grids'''
-        _Z_interp = interp.interp1d(self.time_chosen[:self.age_idx+1], 
-                    self.Z_v[:self.age_idx+1], fill_value='extrapolate')
-        return _Z_interp(birthtime_grid) # Linear metallicity
+        return self.Z_history(birthtime_grid) # Linear metallicity
     
     def SFR_component(self, birthtime_grid):
         '''Returns the interpolated SFR vector 
         computed at the birthtime grids'''
-        SFR_interp = interp.interp1d(self.time_chosen[:self.age_idx+1],
-                    self.SFR_v[:self.age_idx+1], fill_value='extrapolate')
-        return SFR_interp(birthtime_grid)
+        return self.SFR_history(birthtime_grid)
 
     def IMF_component(self, mass_grid):
         # Returns the IMF vector computed at the mass grids
@@ -132,18 +515,12 @@ class Wi:
     def dMdtauM_component(self, lifetime_grid, birthtime_grid):
         '''computes the derivative of M(tauM) w.r.t. tauM'''
         metallicity_grid = self.Z_component(birthtime_grid)
-        df_lz = pd.DataFrame(np.array([lifetime_grid,
-                        metallicity_grid]).T, columns=['lifetime_Gyr',
-                                                        'metallicity'])
-        return self.lifetime_class.dMdtauM(df_lz)
+        return self.lifetime_class.dMdtauM_array(lifetime_grid, metallicity_grid)
 
     def dtauMdM_component(self, mass_grid, birthtime_grid):
         '''computes the derivative of tauM(M) w.r.t. M'''
         metallicity_grid = self.Z_component(birthtime_grid)
-        df_lz = pd.DataFrame(np.array([mass_grid,
-                        metallicity_grid]).T, columns=['mass',
-                                                        'metallicity'])
-        return self.lifetime_class.dtauMdM(df_lz)
+        return self.lifetime_class.dtauMdM_array(mass_grid, metallicity_grid)
     
     #def yield_component(self, channel_switch, mass_grid, birthtime_grid, vel_idx=None):
     #    return interpolation(mass_grid, metallicity(birthtime_grid))
@@ -160,7 +537,7 @@ class Wi:
         birthtime_grid = self.grid_picker(channel_switch, 'birthtime')
         lifetime_grid = self.grid_picker(channel_switch, 'lifetime')
         SFR_comp = np.multiply(self.SFR_component(birthtime_grid), self.IN.M_inf)
-        F_SNIa = np.array([D.f_SD_Ia for D in self.Greggio05_SD(lifetime_grid)])
+        F_SNIa = self.Greggio05_SD(lifetime_grid)
         #F_SNIa = [DTD_class.MaozMannucci12(t) for t in lifetime_grid]
         integrand = np.multiply(SFR_comp, F_SNIa)
         return integr.simps(integrand, x=birthtime_grid)
@@ -9,22 +9,21 @@
 "    __        Star_Formation_Rate             "
 "    __        Initial_Mass_Function           "
 "    __        Stellar_Lifetimes               "
+"    __        Lifetime_Table                  "
 "    __        Greggio05                       "
+"    __        Greggio05_DTD                   "
 "    __        DTD                             "
 "                                              "
 """"""""""""""""""""""""""""""""""""""""""""""""
 
 import math, time
 import os
-import dill
 import numpy as np
-import scipy.integrate
-import scipy.misc as sm 
-import scipy.interpolate as interp
-import scipy.integrate as integr
-import scipy.stats as ss
 
-from ..classes.inputs import Auxiliary
+from ..classes.inputs import Auxiliary, Lazy_Module, SHARED_TABLES
+
+integr = Lazy_Module('scipy.integrate')
+interp = Lazy_Module('scipy.interpolate')
 
 class Infall:
     '''
@@ -84,7 +83,7 @@ class Infall:
         USED IN:
             inf() and SFR()
         """
-        return np.divide(self.IN.M_inf, scipy.integrate.quad(self.infall_func(),
+        return np.divide(self.IN.M_inf, integr.quad(self.infall_func(),
                              self.time[0], self.IN.Galaxy_age)[0])
 
     def inf(self):
@@ -158,6 +157,8 @@ class Star_Formation_Rate:
         return wind_eff * SFR(Mgas, morphology)
 
 
+IMF_QUADRATURES = {} # Initial_Mass_Function.quad of the built-in IMFs, for the whole process
+
 class Initial_Mass_Function:
     '''
     CLASS
@@ -237,7 +238,22 @@ class Initial_Mass_Function:
         return Mstar * self.IMF_select()(Mstar)
         
     def normalization(self): 
-        return np.reciprocal(integr.quad(self.integrand, self.Ml, self.Mu)[0])
+        return np.reciprocal(self.quad('integrand', self.Ml, self.Mu))
+    
+    def quad(self, function, Mlow, Mhigh):
+        '''
+        integr.quad of the 'integrand', 'IMF' or 'massweighted_IMF' function 
+        within [Mlow, Mhigh]. Memoized for the built-in IMFs, 
+        e.g. across the runs of a galcem.sweep worker
+        '''
+        key = (self.option, self.Ml, self.Mu, self.IN.IMF_single_slope, function, Mlow, Mhigh)
+        if self.custom or key not in IMF_QUADRATURES:
+            f = self.integrand if function == 'integrand' else getattr(self, function)()
+            value = integr.quad(f, Mlow, Mhigh)[0]
+            if self.custom:
+                return value
+            IMF_QUADRATURES[key] = value
+        return IMF_QUADRATURES[key]
 
     def IMF(self): #!!!!!!!! it is missing the time dependence (for the IGIMF or custom IMFs)
         '''
@@ -257,12 +273,9 @@ class Initial_Mass_Function:
         If massweighted==False, computes the same fraction, by number,
         w.r.t. the IMF.
         '''
-        if massweighted==True:
-            function = self.massweighted_IMF()
-        else:
-            function = self.IMF()
-        numerator = integr.quad(function, Mlow, Mhigh)[0]
-        denominator = integr.quad(function, self.Ml, self.Mu)[0]
+        function = 'massweighted_IMF' if massweighted==True else 'IMF'
+        numerator = self.quad(function, Mlow, Mhigh)
+        denominator = self.quad(function, self.Ml, self.Mu)
         return np.divide(numerator, denominator)
     
     def IMF_test(self):
@@ -279,13 +292,35 @@ class Stellar_Lifetimes:
     The first column of s_lifetimes_p98 identifies the stellar mass
     All the other columns indicate the respective lifetimes, 
     evaluated at different metallicities.
+    
+    tau(M,Z) and M(tau,Z) are smoothing splines in (log10 x, sqrt Z) 
+    of log10 y, see yield_interpolation/lifetime_mass_metallicity/main.py.
+    With IN.lifetime_option == 'table' (default) they are evaluated from
+    Lifetime_Table's, otherwise from the dill-loaded spline models.
+    The tables are compiled from data.csv if they are missing or outdated 
+    (see lifetime_table_stamp).
     '''
     def __init__(self, IN):
         self.IN = IN
         s_mlz_root = os.path.dirname(__file__)+'/../../yield_interpolation/lifetime_mass_metallicity/'
         self.s_mass = self.IN.s_lifetimes_p98['M'].values
-        self.lifetime_by_mass_metallicity_loaded = dill.load(open(s_mlz_root+'models/lifetime_by_mass_metallicity.pkl','rb'))
-        self.mass_by_lifetime_metallicity_loaded = dill.load(open(s_mlz_root+'models/mass_by_lifetime_metallicity.pkl','rb'))
+        self.option = self.IN.lifetime_option
+        self.table_path = None # compiled lifetime tables, if any
+        if self.option == 'spline':
+            import dill
+            self.lifetime_by_mass_metallicity_loaded = dill.load(open(s_mlz_root+'models/lifetime_by_mass_metallicity.pkl','rb'))
+            self.mass_by_lifetime_metallicity_loaded = dill.load(open(s_mlz_root+'models/mass_by_lifetime_metallicity.pkl','rb'))
+        else:
+            path = s_mlz_root + 'lifetime_tables.v%d.npz'%LIFETIME_TABLE_VERSION
+            if os.path.abspath(path) not in SHARED_TABLES:
+                stamp = lifetime_table_stamp(s_mlz_root+'data.csv')
+                if compiled_lifetime_stamp(path) != stamp:
+                    import pandas as pd
+                    compile_lifetime_tables(pd.read_csv(s_mlz_root+'data.csv'), path, stamp=stamp)
+            self.table_path = path
+            tables = load_lifetime_tables(path)
+            self.lifetime_by_mass_metallicity_loaded = Lifetime_Table(tables, 'lifetime_by_mass_metallicity')
+            self.mass_by_lifetime_metallicity_loaded = Lifetime_Table(tables, 'mass_by_lifetime_metallicity')
     
     def __repr__(self):
         aux = Auxiliary()
@@ -312,14 +347,197 @@ class Stellar_Lifetimes:
         with respect to dm, and multiplied by dt/dt' * dt/dtau = 1
         '''
         return self.lifetime_by_mass_metallicity_loaded(df_mass_metallicity, dwrt='mass')
+    
+    def _frame(self, xcol, x, metallicity):
+        import pandas as pd
+        x, metallicity = np.broadcast_arrays(np.asarray(x, dtype=float), metallicity)
+        return pd.DataFrame({xcol: x, 'metallicity': metallicity})
+    
+    def interp_stellar_lifetimes_array(self, mass, metallicity):
+        '''interp_stellar_lifetimes() for arrays (metallicity may be a scalar)'''
+        if self.option == 'spline':
+            return self.interp_stellar_lifetimes(self._frame('mass', mass, metallicity))
+        return self.lifetime_by_mass_metallicity_loaded.evaluate(mass, metallicity)
+    
+    def interp_stellar_masses_array(self, lifetime, metallicity):
+        '''interp_stellar_masses() for arrays (metallicity may be a scalar)'''
+        if self.option == 'spline':
+            return self.interp_stellar_masses(self._frame('lifetime_Gyr', lifetime, metallicity))
+        return self.mass_by_lifetime_metallicity_loaded.evaluate(lifetime, metallicity)
+    
+    def dMdtauM_array(self, lifetime, metallicity):
+        '''dMdtauM() for arrays (metallicity may be a scalar)'''
+        if self.option == 'spline':
+            return self.dMdtauM(self._frame('lifetime_Gyr', lifetime, metallicity))
+        return - self.mass_by_lifetime_metallicity_loaded.evaluate(lifetime, metallicity, deriv=True)
+    
+    def dtauMdM_array(self, mass, metallicity):
+        '''dtauMdM() for arrays (metallicity may be a scalar)'''
+        if self.option == 'spline':
+            return self.dtauMdM(self._frame('mass', mass, metallicity))
+        return self.lifetime_by_mass_metallicity_loaded.evaluate(mass, metallicity, deriv=True)
+
+
+LIFETIME_TABLE_VERSION = 1 # bump whenever the layout of the compiled .npz changes
+
+def lifetime_table_stamp(csv_path):
+    '''sha1 of LIFETIME_TABLE_VERSION, and the name, size and modification time of csv_path'''
+    import hashlib
+    stat = os.stat(csv_path)
+    return hashlib.sha1(repr((LIFETIME_TABLE_VERSION, os.path.basename(csv_path), 
+                              stat.st_size, stat.st_mtime_ns)).encode()).hexdigest()
+
+def compiled_lifetime_stamp(path):
+    '''The stamp the lifetime tables at path were compiled with, or None (missing, or compiled without one)'''
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as npz:
+        return str(npz['stamp']) if 'stamp' in npz.files else None
+
+def compile_lifetime_tables(df, path, num=64, stamp=''):
+    '''
+    Fits tau(M,Z) and M(tau,Z) as in yield_interpolation/lifetime_mass_metallicity/main.py
+    (scipy's SmoothBivariateSpline of log10 y over u = log10 x, v = sqrt Z) 
+    and tabulates the spline s and its analytic partial derivatives 
+    s_u, s_v, s_uv on a (u, v) grid refining the spline knots, 
+    for Lifetime_Table. 
+    
+    INPUT
+        df      yield_interpolation/lifetime_mass_metallicity/data.csv
+        path    output .npz, replaced atomically
+        num     minimum number of grid nodes along each axis
+        stamp   lifetime_table_stamp of the data.csv of df, stored in the tables
+    '''
+    arrays = {'version': LIFETIME_TABLE_VERSION, 'stamp': stamp}
+    for name, xcol, ycol in [('lifetime_by_mass_metallicity', 'mass', 'lifetime_Gyr'),
+                             ('mass_by_lifetime_metallicity', 'lifetime_Gyr', 'mass')]:
+        spline = interp.SmoothBivariateSpline(x=np.log10(df[xcol].to_numpy()),
+                                              y=np.sqrt(df['metallicity'].to_numpy()),
+                                              z=np.log10(df[ycol].to_numpy()))
+        axes = []
+        for knots in spline.get_knots():
+            knots = np.unique(knots)
+            steps = np.linspace(0., 1., -(-(num-1)//(len(knots)-1)), endpoint=False)
+            axes.append(np.append((knots[:-1, None] + np.diff(knots)[:, None] * steps).ravel(), knots[-1]))
+        u, v = np.meshgrid(*axes, indexing='ij')
+        arrays[name+'.u'], arrays[name+'.v'] = axes
+        for dx, dy in [(0, 0), (1, 0), (0, 1), (1, 1)]:
+            arrays[name+'.s%d%d'%(dx, dy)] = spline(u.ravel(), v.ravel(), dx=dx, dy=dy, grid=False).reshape(u.shape)
+    tmp_path = path + '.%d.tmp'%os.getpid()
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_lifetime_tables(path):
+    '''
+    The arrays of the compiled lifetime tables. Tables attached from 
+    shared memory (SHARED_TABLES) are not read again, and hold the 
+    coefficients of every Lifetime_Table as well
+    '''
+    if os.path.abspath(path) in SHARED_TABLES:
+        return SHARED_TABLES[os.path.abspath(path)]
+    return np.load(path)
+
+
+class Lifetime_Table:
+    '''
+    Vectorized ndarray evaluator of the compiled tau(M,Z) or M(tau,Z) spline 
+    (see compile_lifetime_tables), a drop-in for the SmootheSpline2D_FI models.
+    
+    Bicubic Hermite interpolation of the tabulated s, s_u, s_v, s_uv,
+    stored as the power-basis coefficients of each cell.
+    The grid refines the spline knots, so every cell lies within a single 
+    bicubic piece of the spline, which the Hermite interpolant reproduces: 
+    the table agrees with the spline to round-off (~1e-12 relative, 
+    see benchmarks/lifetime_table.py), derivatives included. 
+    Queries are clamped to the spline domain, as FITPACK does.
+    '''
+    def __init__(self, tables, name):
+        self.name = name
+        self.u = tables[name+'.u']
+        self.v = tables[name+'.v']
+        if name+'.coeffs' in tables:
+            self.coeffs = tables[name+'.coeffs']
+        else:
+            self.coeffs = self.cell_coefficients([[tables[name+'.s%d%d'%(du, dv)] 
+                                                  for dv in (0, 1)] for du in (0, 1)])
+    
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+    
+    def cell_coefficients(self, s):
+        '''
+        Power-basis coefficients C of the bicubic Hermite interpolant of each cell, 
+        s(u,v) = sum_kl C[k,l] t^k w^l with t, w the position within the cell
+        '''
+        hu = np.diff(self.u)[:, None]
+        hv = np.diff(self.v)[None, :]
+        def corners(table, scale):
+            return [[table[a:len(table)-1+a, b:table.shape[1]-1+b] * scale 
+                     for b in (0, 1)] for a in (0, 1)]
+        f, fv, fu, fuv = (corners(s[0][0], 1.), corners(s[0][1], hv),
+                          corners(s[1][0], hu), corners(s[1][1], hu*hv))
+        # rows: s(0), s(1), ds/dt(0), ds/dt(1) along u; columns: the same along v
+        G = np.array([[f[0][0], f[0][1], fv[0][0], fv[0][1]],
+                      [f[1][0], f[1][1], fv[1][0], fv[1][1]],
+                      [fu[0][0], fu[0][1], fuv[0][0], fuv[0][1]],
+                      [fu[1][0], fu[1][1], fuv[1][0], fuv[1][1]]])
+        M = np.array([[1., 0., 0., 0.], [0., 0., 1., 0.], 
+                      [-3., 3., -2., -1.], [2., -2., 1., 1.]])
+        C = np.einsum('ka,abij,lb->ijkl', M, G, M)
+        return C.reshape(-1, 4, 4)
+    
+    def _cell(self, axis, x):
+        x = np.clip(x, axis[0], axis[-1])
+        i = np.clip(np.searchsorted(axis, x, side='right') - 1, 0, len(axis) - 2)
+        h = axis[i+1] - axis[i]
+        return i, (x - axis[i]) / h, h
+    
+    def surface(self, u, v, deriv=False):
+        '''s(u,v), or ds/du(u,v) if deriv'''
+        i, t, hu = self._cell(self.u, u)
+        j, w, hv = self._cell(self.v, v)
+        C = self.coeffs[i * (len(self.v) - 1) + j]
+        if deriv:
+            tpow = np.stack([np.zeros_like(t), np.ones_like(t), 2*t, 3*t**2], axis=-1) / hu[..., None]
+        else:
+            tpow = np.stack([np.ones_like(t), t, t**2, t**3], axis=-1)
+        wpow = np.stack([np.ones_like(w), w, w**2, w**3], axis=-1)
+        return np.einsum('...k,...kl,...l->...', tpow, C, wpow)
+    
+    def evaluate(self, x, metallicity, deriv=False):
+        '''
+        y(x, Z), or dy/dx(x, Z) if deriv. 
+        The derivative follows the chain rule of FriendlyInterpolant, which
+        evaluates the derivative of the y transform at the transformed value
+        (dy/dx = s_u * s / x), to match the fitted spline models.
+        '''
+        x, metallicity = np.broadcast_arrays(np.asarray(x, dtype=float), 
+                                             np.asarray(metallicity, dtype=float))
+        u = np.log10(x)
+        v = np.sqrt(metallicity)
+        s = self.surface(u, v)
+        if not deriv:
+            return np.power(10., s)
+        return self.surface(u, v, deriv=True) * s / x
+    
+    def __call__(self, dfx, dwrt=None):
+        '''Same call signature as the SmootheSpline2D_FI models'''
+        xcol = [col for col in dfx.columns if col != 'metallicity'][0]
+        return self.evaluate(dfx[xcol].to_numpy(), dfx['metallicity'].to_numpy(), 
+                             deriv=dwrt is not None)
+
 
 class Greggio05:
     '''Greggio (2005, A&A 441, 1055G) Single degenerate
     https://ui.adsabs.harvard.edu/abs/2005A%26A...441.1055G/abstract 
     
-    tauMS in Gyr'''
+    tauMS in Gyr, a scalar or an array: every attribute 
+    is then evaluated elementwise'''
     def __init__(self, tauMS):
-        self.tauMS = tauMS # 
+        self.tauMS = np.asarray(tauMS, dtype=float) # 
         self.K = 0.86 # Valid for Kroupa01, alpha=2.35, gamma=1 of Eq. (16)
         self.k_alpha = 1.55 # 1.55 For Kroupa01, 2.83 for Salpeter55
         self.A_Ia = 1e-3 # 1e-3 For Kroupa01, 5e-4 for Salpeter55
@@ -342,37 +560,29 @@ class Greggio05:
         
     def f_SD_Ia_func(self):
         val = self.k_alpha * self.A_Ia * 10**self.K * self.n_SD * self.deriv_m2_abs
-        if val > 0.:
-            return val 
-        else:
-            return 0.
+        return np.where(val > 0., val, 0.)
 
     def Girardi00_secondary_lifetime(self):
         '''Eq. (12) returns m2'''
-        logtauMS = np.log10(self.tauMS*1e9, where=self.tauMS>0.)
-        if np.logical_and(self.tauMS> 0.04, self.tauMS< 25):
-            return np.piecewise(logtauMS, [logtauMS==0., logtauMS > 0.], 
-                            [1e-32, 10**(0.0471*logtauMS**2 - 1.2*logtauMS + 7.3)])
-        else:
-            return 1e-32
+        valid = np.logical_and(self.tauMS> 0.04, self.tauMS< 25)
+        logtauMS = np.log10(np.where(valid, self.tauMS, 1.)*1e9)
+        return np.where(valid, 10**(0.0471*logtauMS**2 - 1.2*logtauMS + 7.3), 1e-32)
         
     def SD_n_m2(self):
         '''Distribution function of the secondaries in SNIa progenitor systems
         obtained by summing over all possible primaries, ranging from 
         a minimum value (m_{1,i}) to 8 Msun
         Eq. (16)'''
-        if self.m2<=8:
-            exponent = self.alpha + self.gamma
-            return self.m2**(-self.alpha) * ((self.m2/self.m1i)**exponent - (self.m2/8)**exponent)
-        else:
-            return 0.
+        exponent = self.alpha + self.gamma
+        return np.where(self.m2<=8, self.m2**(-self.alpha) * ((self.m2/self.m1i)**exponent 
+                        - (self.m2/8)**exponent), 0.)
     
     def m1i_func(self):
-        return np.amax([self.m2, self.m1n])
+        return np.maximum(self.m2, self.m1n)
     
     def m1n_func(self):
         '''Eq. (19)'''
-        return np.amax([2., 2. + 10.*(self.mWDn - 0.6)])
+        return np.maximum(2., 2. + 10.*(self.mWDn - 0.6))
     
     def mWDn_func(self):
         '''Eq. (17)'''
@@ -384,12 +594,41 @@ class Greggio05:
     
     def m2c_func(self):
         '''Eq. (18)'''
-        return np.amax([0.3, 0.3 + 0.1*(self.m2-2), 0.15*(self.m2-4)])
+        return np.maximum(np.maximum(0.3, 0.3 + 0.1*(self.m2-2)), 0.15*(self.m2-4))
     
     def abs_deriv_m2(self):
         '''Page 5 right after Eq. (14)
         $|\dot{m}_2| \propto \tau^{-1.44}$'''
-        return np.power(self.tauMS,-1.44, where=self.tauMS>0.)
+        return np.where(self.tauMS>0., np.power(np.where(self.tauMS>0., self.tauMS, 1.), -1.44), 0.)
+
+
+class Greggio05_DTD:
+    '''
+    f_SD_Ia(tauMS) of Greggio05 for arrays of lifetimes [Gyr]. 
+    
+    With table=True, f_SD_Ia is tabulated once on "num" log-spaced lifetimes 
+    spanning its support (0.04 < tauMS < 25 Gyr, zero elsewhere) and 
+    linearly interpolated in log(tauMS), otherwise Greggio05 is evaluated.
+    '''
+    def __init__(self, table=True, num=4096):
+        self.table = table
+        self.tau_min, self.tau_max = 0.04, 25.
+        if self.table:
+            self.log_tau = np.linspace(np.log10(np.nextafter(self.tau_min, np.inf)), 
+                                       np.log10(np.nextafter(self.tau_max, -np.inf)), num)
+            self.f_SD_Ia = Greggio05(np.power(10., self.log_tau)).f_SD_Ia
+            
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+    
+    def __call__(self, tauMS):
+        tauMS = np.asarray(tauMS, dtype=float)
+        if not self.table:
+            return Greggio05(tauMS).f_SD_Ia
+        inside = np.logical_and(tauMS > self.tau_min, tauMS < self.tau_max)
+        log_tau = np.log10(np.where(inside, tauMS, 1.))
+        return np.where(inside, np.interp(log_tau, self.log_tau, self.f_SD_Ia), 0.)
       
      
 class DTD:
@@ -14,6 +14,9 @@
 "    __        Yields_LIMs (subclass)                "
 "    __        Yields_MRSN (subclass)                "
 "    __        Yields_NSM (subclass)                 "
+"    __        Channel_Interpolant                   "
+"    __        Yield_Table                           "
+"    __        Yield_Table_Isotope                   "
 "                                                    "
 """"""""""""""""""""""""""""""""""""""""""""""""""""""
 
@@ -21,8 +24,7 @@ import numpy as np
 import pandas as pd
 from pandas.core.common import flatten
 import os
-import re
-from ..classes.inputs import Auxiliary
+from ..classes.inputs import Auxiliary, ZA_Index, SHARED_TABLES
 
 
 class Isotopes:
@@ -40,9 +42,7 @@ class Isotopes:
     
     def pick_i_by_iso(self, ZA_sorted, elemZ, elemA):
         '''Finds the isotope entry in the isotope list'''
-        idx_Z = np.where(ZA_sorted[:,0] == elemZ)[0]
-        idx_A = np.where(ZA_sorted[:,1] == elemA)[0]
-        idx =  np.intersect1d(idx_Z, idx_A)[0]
+        idx = Auxiliary().pick_ZA_sorted_idx(ZA_sorted, Z=elemZ, A=elemA)
         print("[Z, A] = ", ZA_sorted[idx])
         return idx
         
@@ -103,16 +103,9 @@ class Concentrations:
     
     def abund_percentage(self, ZA_sorted):
         ''' Isotopic abundances by number from Asplund et al. (2009)'''
-        percentages = []
-        for ZA_idx in ZA_sorted:
-            Z_select = self.IN.asplund3.loc[self.IN.asplund3['elemZ'].values == ZA_idx[0]]
-            ZA_select = Z_select.loc[Z_select['elemA'].values == ZA_idx[1]]
-            percentages.append(ZA_select['percentage'].values)
-        percentages_pd = np.array(percentages, dtype='object')
-        for i, val in enumerate(percentages_pd):
-            if val.size <= 0:
-                percentages_pd[i] = np.array([1e-5])
-        return np.array(percentages_pd, dtype=np.float16)
+        select_id = ZA_Index(self.IN.asplund3[['elemZ', 'elemA']].to_numpy()).lookup_ZA(ZA_sorted)
+        percentages = self.IN.asplund3['percentage'].to_numpy()[select_id]
+        return np.where(select_id >= 0, percentages, 1e-5).astype(np.float16)
 
     def extract_ZA_pairs(self, yields):
         ZA_pairs = np.column_stack((yields.elemZ, yields.elemA))
@@ -129,6 +122,42 @@ class Concentrations:
         ZA_sorted = Z_sorted[list(flatten(A_sorted))]
         return np.unique(ZA_sorted, axis=0)
     
+    def ZA_tracked(self, ZA_sorted, tracked):
+        '''
+        Selects the rows of ZA_sorted listed in tracked, by element symbol ('Fe'),
+        atomic number (26) or [Z,A] pair ((26,56)). The other isotopes are lumped 
+        into pools, rows with A = 0: (1,0) hydrogen, (2,0) helium, and (0,0) 
+        the metals, which is appended last so that the metals are all the rows 
+        from i_Z on.
+        
+        Returns the tracked ZA_sorted with the pools, 
+        and {row of a pool: [Z,A] pairs lumped in it}
+        '''
+        symbols = dict(zip(self.IN.periodic['elemSymb'], self.IN.periodic['elemZ']))
+        keep = np.zeros(len(ZA_sorted), dtype=bool)
+        for item in tracked:
+            if isinstance(item, str):
+                if item not in symbols:
+                    raise ValueError('Unknown element symbol in tracked_isotopes: %s'%item)
+                keep |= ZA_sorted[:,0] == symbols[item]
+            elif np.ndim(item) == 0:
+                keep |= ZA_sorted[:,0] == item
+            else:
+                keep |= (ZA_sorted[:,0] == item[0]) & (ZA_sorted[:,1] == item[1])
+        if not np.any(keep):
+            raise ValueError('None of the tracked_isotopes is in the yields of the run')
+        untracked = ZA_sorted[~keep]
+        groups = [((1,0), untracked[:,0] == 1), ((2,0), untracked[:,0] == 2), 
+                  ((0,0), untracked[:,0] > 2)]
+        ZA = np.unique(np.vstack([ZA_sorted[keep]] + [[pool] for pool, lumped 
+                                  in groups[:2] if np.any(lumped)]), axis=0)
+        if np.any(groups[2][1]):
+            ZA = np.vstack([ZA, [groups[2][0]]])
+        rows = ZA_Index(ZA).lookup_ZA(np.array([pool for pool, _ in groups]))
+        pools = {rows[g]: untracked[lumped] for g, (_, lumped) in enumerate(groups)
+                 if np.any(lumped)}
+        return ZA, pools
+    
         
 class Yields:
     ''' Parent class for all Yields_* classes '''
@@ -145,10 +174,45 @@ class Yields:
         self.metallicityIni = None # Initial stellar metallicity (n.b. not all yields have it!)
         self.stellarMassIni = None # Initial stellar mass (n.b. not all yields have it!)
         self._dir = os.path.join(os.path.dirname( __file__ ), '..')
+        self.table_path = None # compiled yield table, if any (see compiled_table)
     
     def __repr__(self):
         aux = Auxiliary()
         return aux.repr(self)
+    
+    def select_yields(self, ZA_sorted, pools=None):
+        '''
+        yields_list at the rows of ZA_sorted (0. if not tabulated). 
+        The rows of the pools (see Concentrations.ZA_tracked) sum 
+        the yields of the isotopes they lump
+        '''
+        index = ZA_Index(np.column_stack((self.elemZ, self.elemA)))
+        select_id = index.lookup_ZA(ZA_sorted)
+        yields = [self.yields_list[i] if i >= 0 else 0. for i in select_id]
+        for row, ZA_lumped in ({} if pools is None else pools).items():
+            lumped = index.lookup_ZA(ZA_lumped)
+            yields[row] = np.sum([self.yields_list[i] for i in lumped if i >= 0])
+        return yields
+    
+    def compiled_table(self, option, ycol='massfrac'):
+        '''
+        Loads the compiled yield table of yield_interpolation/<option>/,
+        compiling it from data.csv if it is missing or outdated: 
+        compiled from another data.csv (name, size and modification time), 
+        ycol or YIELD_TABLE_VERSION (see yield_table_stamp)
+        '''
+        root = os.path.join(self._dir, '..', 'yield_interpolation', option)
+        path = yield_table_path(root, option)
+        csv_path = os.path.join(root, 'data.csv')
+        if os.path.abspath(path) not in SHARED_TABLES and os.path.exists(csv_path):
+            stamp = yield_table_stamp(csv_path, ycol=ycol)
+            if compiled_table_stamp(path) != stamp:
+                df = pd.read_csv(csv_path)
+                if 'irv' in df.columns:
+                    df = df.loc[df['irv']==0]
+                compile_yield_table(df, path, ycol=ycol, stamp=stamp)
+        self.table_path = path
+        return load_yield_table(path)
         
         
 class Yields_BBN(Yields):
@@ -176,17 +240,8 @@ class Yields_BBN(Yields):
             self.massCol = np.multiply(self.tables['numbFrac'], self.tables['mass'])
             self.yields_list = np.divide(self.massCol, np.sum(self.massCol)) # fraction by mass 
       
-    def construct_yields(self, ZA_sorted):
-        yields = []
-        for i,val in enumerate(ZA_sorted):
-            select_idz = np.where(self.elemZ == val[0])[0]
-            select_ida = np.where(self.elemA == val[1])[0]
-            select_id = np.intersect1d(select_idz,select_ida)
-            if len(select_id) > 0.:
-                yields.append(self.yields_list[select_id[0]])
-            else:
-                yields.append(0.)
-        self.yields = np.array(yields)
+    def construct_yields(self, ZA_sorted, pools=None):
+        self.yields = np.array(self.select_yields(ZA_sorted, pools))
         
 class Yields_SNIa(Yields):
     '''
@@ -222,17 +277,8 @@ class Yields_SNIa(Yields):
             self.elemA = self.tables['elemA']
             self.elemZ = self.tables['elemZ']
             
-    def construct_yields(self, ZA_sorted):
-        yields = []
-        for i,val in enumerate(ZA_sorted):
-            select_idz = np.where(self.elemZ == val[0])[0]
-            select_ida = np.where(self.elemA == val[1])[0]
-            select_id = np.intersect1d(select_idz,select_ida)
-            if len(select_id) > 0.:
-                yields.append(self.yields_list[select_id[0]])
-            else:
-                yields.append(0.)
-        self.yields = yields
+    def construct_yields(self, ZA_sorted, pools=None):
+        self.yields = self.select_yields(ZA_sorted, pools)
                 
 class Yields_SNCC(Yields):
     '''
@@ -242,6 +288,7 @@ class Yields_SNCC(Yields):
         self.IN = IN
         self.option = self.IN.yields_SNCC_option if option is None else option
         self.rotationalVelocity_bins = None
+        self.interpolant = None # Yield_Table of all the isotopes (see construct_yields)
         super().__init__()
     
     def __repr__(self):
@@ -250,33 +297,14 @@ class Yields_SNCC(Yields):
  
     def import_yields(self):
         if self.option == 'lc18':
-            import re
-            import glob
-            lc18 = pd.read_csv('yield_interpolation/lc18/data.csv')
-            lc18_yield_dir = 'yield_interpolation/lc18/models/'
-            self.metallicity_bins = np.unique(lc18['metallicity'].values)
-            self.elemA = lc18['a'].values #np.unique(lc18['a'].values)
-            self.elemZ = lc18['z'].values #np.unique(lc18['z'].values)
-            self.yields_list = glob.glob(lc18_yield_dir+'*.pkl')
-            patternz = "/lc18_z(.*?).a"
-            z_list = [re.search(patternz, yl).group(1) for yl in self.yields_list]
-            searcha = [".a",".irv0"]
-            a_list = [yl[yl.find(searcha[0])+len(searcha[0]):yl.find(searcha[1])] for yl in self.yields_list]
-            ZA_list = np.column_stack([z_list, a_list])
-            self.ZA_list = ZA_list.astype('int')
+            self.tables = self.compiled_table('lc18')
+            self.metallicity_bins = self.tables['metallicity_bins']
+            self.elemZ = self.tables['ZA'][:,0]
+            self.elemA = self.tables['ZA'][:,1]
             
-    def construct_yields(self, ZA_sorted):
-        import dill
-        yields = []
-        yields_l = pd.Series(self.yields_list, dtype='str')
-        for i,val in enumerate(ZA_sorted):
-            pattern = '/lc18_z'+ str(val[0]) + '.a' + str(val[1])+'.irv0'
-            select_id = np.where(yields_l.str.contains(pattern))[0]
-            if len(select_id) > 0.:
-                yields.append(dill.load(open(yields_l.iloc[select_id[0]],'rb')))
-            else:
-                yields.append(pd.DataFrame(columns=['mass', 'metallicity']))
-        self.yields = yields
+    def construct_yields(self, ZA_sorted, pools=None):
+        self.interpolant = Yield_Table(self.tables, ZA_sorted, pools=pools)
+        self.yields = self.interpolant.isotope_models()
     
     
 class Yields_LIMs(Yields):
@@ -287,6 +315,7 @@ class Yields_LIMs(Yields):
         self.IN = IN
         self.option = self.IN.yields_LIMs_option if option is None else option
         self.Returned_stellar_mass = None
+        self.interpolant = None # Yield_Table of all the isotopes (see construct_yields)
         super().__init__()
     
     def __repr__(self):
@@ -334,33 +363,14 @@ class Yields_LIMs(Yields):
             self.Returned_stellar_mass = self.is_unique('Mfin', split_length)  
         
         if self.option == 'c15':
-            import re
-            import glob
-            c15 = pd.read_csv('yield_interpolation/c15/data.csv')
-            c15_yield_dir = 'yield_interpolation/c15/models/'
-            self.metallicity_bins = np.unique(c15['metallicity'].values)
-            self.elemA = c15['a'].values #np.unique(c15['a'].values)
-            self.elemZ = c15['z'].values #np.unique(c15['z'].values)
-            self.yields_list = glob.glob(c15_yield_dir+'*.pkl')
-            patternz = "/c15_z(.*?).a"
-            z_list = [re.search(patternz, yl).group(1) for yl in self.yields_list]
-            searcha = [".a",".irv0"]
-            a_list = [yl[yl.find(searcha[0])+len(searcha[0]):yl.find(searcha[1])] for yl in self.yields_list]
-            ZA_list = np.column_stack([z_list, a_list])
-            self.ZA_list = ZA_list.astype('int')
+            self.tables = self.compiled_table('c15')
+            self.metallicity_bins = self.tables['metallicity_bins']
+            self.elemZ = self.tables['ZA'][:,0]
+            self.elemA = self.tables['ZA'][:,1]
             
-    def construct_yields(self, ZA_sorted):
-        import dill
-        yields = []
-        yields_l = pd.Series(self.yields_list, dtype='str')
-        for i,val in enumerate(ZA_sorted):
-            pattern = '/c15_z'+ str(val[0]) + '.a' + str(val[1])+'.irv0'
-            select_id = np.where(yields_l.str.contains(pattern))[0]
-            if len(select_id) > 0.:
-                yields.append(dill.load(open(yields_l.iloc[select_id[0]],'rb')))
-            else:
-                yields.append(pd.DataFrame(columns=['mass', 'metallicity']))
-        self.yields = yields
+    def construct_yields(self, ZA_sorted, pools=None):
+        self.interpolant = Yield_Table(self.tables, ZA_sorted, pools=pools)
+        self.yields = self.interpolant.isotope_models()
         
         
 class Yields_MRSN(Yields):
@@ -399,17 +409,8 @@ class Yields_MRSN(Yields):
             self.massFrac = [i['X'].values for i in li]
             self.yields_list = np.multiply(ej_select, self.massFrac)
                 
-    def construct_yields(self, ZA_sorted):
-        yields = []
-        for i,val in enumerate(ZA_sorted):
-            select_idz = np.where(self.elemZ == val[0])[0]
-            select_ida = np.where(self.elemA == val[1])[0]
-            select_id = np.intersect1d(select_idz,select_ida)
-            if len(select_id) > 0.:
-                yields.append(self.yields_list[select_id[0]])
-            else:
-                yields.append(0.)
-        self.yields = yields
+    def construct_yields(self, ZA_sorted, pools=None):
+        self.yields = self.select_yields(ZA_sorted, pools)
 
 class Yields_NSM(Yields):
     '''
@@ -442,3 +443,360 @@ class Yields_NSM(Yields):
     #    #NSMobject['massFrac'] = self.massFrac
     #    #NSMobject['yields'] = self.yields
     #    return NSMobject # err: not a string
+
+
+class Channel_Interpolant:
+    '''
+    Interpolates the yields of all the isotopes of a channel at once.
+    
+    Equivalent to fitting one LinearAndNearestNeighbor_FI per isotope
+    (see yield_interpolation/fit_isotope_interpolants.py), i.e. linear
+    interpolation of log10(ycol) in (log10 metallicity, log10 mass) 
+    inside the convex hull of the tabulated points, and nearest neighbor 
+    elsewhere (or wherever the linear interpolation returns nan). 
+    All the isotopes of a yield table share the same (mass, metallicity) 
+    points, so the Delaunay triangulation is built once, the barycentric 
+    weights are computed once per query grid, and they are applied 
+    to the (points x isotopes) value matrix with one sparse matmul.
+    
+    INPUT
+        df           yield table (e.g. yield_interpolation/lc18/data.csv),
+                     one row per isotope per tabulated stellar model
+        ZA_sorted    [Z,A] pairs of the isotopes tracked in the run
+        ycol         column of df to interpolate
+    '''
+    def __init__(self, df, ZA_sorted, ycol='massfrac'):
+        import scipy.spatial as spatial
+        self.xcols = ['metallicity', 'mass'] # same order as the fitted interpolants
+        self.ycol = ycol
+        self.ZA_sorted = ZA_sorted
+        # Tabulated points, in the order of the first isotope in df
+        groups = df.groupby(['z', 'a'], sort=False)
+        first = df.loc[groups.groups[next(iter(groups.groups))]]
+        points_index = pd.MultiIndex.from_frame(first[self.xcols])
+        table = df.pivot_table(index=self.xcols, columns=['z', 'a'], values=ycol, aggfunc='sum')
+        table = table.reindex(points_index)
+        ZA_table = np.array(table.columns.tolist()).astype(int)
+        # Rows of ZA_sorted tabulated in this channel, and the matching table columns
+        columns = ZA_Index(ZA_table).lookup_ZA(ZA_sorted)
+        self.rows = np.where(columns >= 0)[0]
+        columns = columns[self.rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.values = np.log10(table.to_numpy()[:, columns])
+        # Rescaled to the unit cube, as in scipy's LinearNDInterpolator(rescale=True)
+        points = np.ascontiguousarray(np.log10(first[self.xcols].to_numpy(dtype=float)))
+        self.offset = np.mean(points, axis=0)
+        self.scale = np.ptp(points, axis=0)
+        self.scale[~(self.scale > 0)] = 1.
+        self.points = (points - self.offset) / self.scale
+        self.tri = spatial.Delaunay(self.points)
+        self.tree = spatial.cKDTree(self.points)
+    
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+    
+    def _scale_x(self, mass, metallicity):
+        x = np.log10(np.column_stack([metallicity, mass]).astype(float))
+        return (x - self.offset) / self.scale
+
+    def weights(self, mass, metallicity):
+        '''
+        Sparse (query points x tabulated points) matrix of the barycentric 
+        weights, and the boolean mask of the query points outside the hull
+        '''
+        import scipy.sparse as sparse
+        x = self._scale_x(mass, metallicity)
+        ndim = x.shape[1]
+        simplex = self.tri.find_simplex(x)
+        outside = simplex < 0
+        transform = self.tri.transform[simplex]
+        c = np.einsum('ijk,ik->ij', transform[:, :ndim, :], 
+                      x - transform[:, ndim, :])
+        c = np.column_stack([c, 1. - c.sum(axis=1)])
+        indices = self.tri.simplices[simplex]
+        c[outside] = 0.
+        W = sparse.csr_matrix((c.ravel(), indices.ravel(), 
+                               np.arange(0, c.size+1, ndim+1)),
+                              shape=(len(x), len(self.points)))
+        return W, outside
+
+    def nearest(self, mass, metallicity):
+        '''Index of the nearest tabulated point for every query point'''
+        return self.tree.query(self._scale_x(mass, metallicity))[1]
+
+    def log_evaluate(self, mass, metallicity):
+        '''Returns the (query points x rows) matrix of log10(yields)'''
+        W, outside = self.weights(mass, metallicity)
+        log_yields = W @ self.values
+        log_yields[outside] = np.nan
+        # +inf: -inf (null yield) times a round-off negative barycentric weight
+        nan_idx = np.where(np.isnan(log_yields) | np.isposinf(log_yields))
+        if len(nan_idx[0]) > 0:
+            nan_rows, nan_rows_inv = np.unique(nan_idx[0], return_inverse=True)
+            nearest = self.nearest(np.asarray(mass)[nan_rows], 
+                                   np.asarray(metallicity)[nan_rows])
+            log_yields[nan_idx] = self.values[nearest[nan_rows_inv], nan_idx[1]]
+        return log_yields
+
+    def evaluate(self, mass, metallicity):
+        '''
+        Returns the (ZA_sorted x query points) matrix of yields. 
+        Isotopes not tabulated by the channel are zero.
+        '''
+        log_yields = self.log_evaluate(mass, metallicity)
+        yields = np.zeros((len(self.ZA_sorted), len(log_yields)))
+        yields[self.rows] = np.power(10., log_yields.T)
+        return yields
+
+    def __call__(self, df_mass_metallicity):
+        '''Same as evaluate(), but takes a DataFrame like the fitted interpolants'''
+        return self.evaluate(df_mass_metallicity['mass'].to_numpy(),
+                             df_mass_metallicity['metallicity'].to_numpy())
+
+
+YIELD_TABLE_VERSION = 1 # bump whenever the layout of the compiled .npz changes
+
+def yield_table_path(root, option):
+    '''Path of the compiled yield table of yield_interpolation/<option>/'''
+    return os.path.join(root, '%s_yields.v%d.npz'%(option, YIELD_TABLE_VERSION))
+
+def yield_table_stamp(csv_path, ycol='massfrac'):
+    '''sha1 of YIELD_TABLE_VERSION, ycol, and the name, size and modification time of csv_path'''
+    import hashlib
+    stat = os.stat(csv_path)
+    return hashlib.sha1(repr((YIELD_TABLE_VERSION, ycol, os.path.basename(csv_path), 
+                              stat.st_size, stat.st_mtime_ns)).encode()).hexdigest()
+
+def compiled_table_stamp(path):
+    '''The stamp the yield table at path was compiled with, or None (missing, or compiled without one)'''
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as npz:
+        return str(npz['stamp']) if 'stamp' in npz.files else None
+
+def compile_yield_table(df, path, ycol='massfrac', subdivisions=8, stamp=''):
+    '''
+    Compiles a yield table (e.g. yield_interpolation/lc18/data.csv) 
+    into one uncompressed .npz, read at runtime by Yield_Table.
+    
+    log10(ycol) of all the isotopes is tabulated on a rectilinear 
+    (log10 metallicity, log10 mass) grid, containing all the tabulated 
+    metallicities and masses, with every interval between them 
+    split in "subdivisions" uniform steps. The grid values come from 
+    Channel_Interpolant, so they are exact at the tabulated models.
+    
+    INPUT
+        df              yield table, one row per isotope per stellar model
+        path            output .npz (see yield_table_path), replaced atomically
+        ycol            column of df to tabulate
+        subdivisions    number of grid steps between tabulated values
+        stamp           yield_table_stamp of the data.csv of df, stored in the table
+    '''
+    ZA = np.unique(df[['z', 'a']].to_numpy(dtype=int), axis=0)
+    names = df.drop_duplicates(['z', 'a']).set_index(['z', 'a'])['isotope']
+    interpolant = Channel_Interpolant(df, ZA, ycol=ycol)
+    def refine(x):
+        steps = np.linspace(0., 1., subdivisions, endpoint=False)
+        fine = (x[:-1, None] + np.diff(x)[:, None] * steps).ravel()
+        return np.append(fine, x[-1])
+    log_mass = refine(np.log10(np.unique(df['mass'].to_numpy(dtype=float))))
+    log_metallicity = refine(np.log10(np.unique(df['metallicity'].to_numpy(dtype=float))))
+    grid_Z, grid_M = np.meshgrid(log_metallicity, log_mass, indexing='ij')
+    values = np.full((grid_Z.size, len(ZA)), -np.inf)
+    values[:, interpolant.rows] = interpolant.log_evaluate(np.power(10., grid_M.ravel()),
+                                                           np.power(10., grid_Z.ravel()))
+    # A new file replaces the table, so the runs that memory-mapped the old one keep reading it
+    tmp_path = path + '.%d.tmp'%os.getpid()
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, version=YIELD_TABLE_VERSION, stamp=stamp, ycol=ycol, ZA=ZA, 
+                 isotope=np.array([names.get(tuple(za), '') for za in ZA], dtype=str),
+                 metallicity_bins=np.unique(df['metallicity'].to_numpy(dtype=float)),
+                 log_mass=log_mass, log_metallicity=log_metallicity, values=values)
+    os.replace(tmp_path, path)
+
+def load_yield_table(path):
+    '''
+    Loads a compiled yield table into a dictionary. 
+    The "values" array is memory-mapped straight from the .npz member
+    (np.load would copy it), so it costs no I/O until it is interpolated.
+    Tables attached from shared memory (SHARED_TABLES) are not read again.
+    '''
+    if os.path.abspath(path) in SHARED_TABLES:
+        return dict(SHARED_TABLES[os.path.abspath(path)])
+    import struct
+    import zipfile
+    table = {}
+    with open(path, 'rb') as f:
+        with zipfile.ZipFile(f) as zf:
+            for name in zf.namelist():
+                if name != 'values.npy':
+                    with zf.open(name) as member:
+                        table[name[:-4]] = np.lib.format.read_array(member)
+            info = zf.getinfo('values.npy')
+        # Local file header: 30 bytes, then the member name and the extra field
+        f.seek(info.header_offset)
+        name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    table['values'] = np.memmap(path, dtype=dtype, mode='r', shape=shape, 
+                                order='F' if fortran_order else 'C', offset=offset)
+    return table
+
+
+class Yield_Table:
+    '''
+    Yields of all the isotopes of a channel, from its compiled table 
+    (see compile_yield_table and yield_interpolation/compile_yield_tables.py).
+    
+    Bilinear interpolation of log10(yields) on the rectilinear 
+    (log10 metallicity, log10 mass) grid of the table, clamped 
+    to the grid edges outside of it. Same interface as Channel_Interpolant,
+    which it replaces at runtime: the grid nodes are exact, and in between
+    the two differ by the curvature of the piecewise-linear Delaunay 
+    surface within one grid cell.
+    
+    The pools of ZA_sorted (see Concentrations.ZA_tracked) are the sums 
+    of the interpolated yields of the isotopes they lump, so a run with 
+    Inputs.tracked_isotopes ejects the same metals as a run of every isotope.
+    
+    INPUT
+        table        dictionary returned by load_yield_table
+        ZA_sorted    [Z,A] pairs of the isotopes tracked in the run
+        pools        {row of ZA_sorted: [Z,A] pairs lumped in it}, or None
+    '''
+    def __init__(self, table, ZA_sorted, pools=None):
+        self.ZA_sorted = ZA_sorted
+        self.ycol = str(table['ycol'])
+        self.log_mass = table['log_mass']
+        self.log_metallicity = table['log_metallicity']
+        index = ZA_Index(table['ZA'])
+        columns = index.lookup_ZA(ZA_sorted)
+        self.rows = np.where(columns >= 0)[0]
+        columns = columns[self.rows]
+        if np.array_equal(columns, np.arange(len(table['ZA']))):
+            self.values = table['values'] # keeps the memory map
+        else:
+            # C order: the sparse products would copy the columns at every call
+            self.values = np.ascontiguousarray(table['values'][:, columns])
+        self.pools = {} # {row: [Z,A] pairs of the table lumped in it}
+        self.lumped = {} # {column of a pool: log10(yields) of the isotopes it lumps}
+        pool_values, lumped_values = [], []
+        for row, ZA_lumped in sorted(({} if pools is None else pools).items()):
+            lumped = index.lookup_ZA(ZA_lumped)
+            lumped = lumped[lumped >= 0]
+            if len(lumped) > 0:
+                self.pools[row] = table['ZA'][lumped]
+                lumped_values.append(np.ascontiguousarray(table['values'][:, lumped]))
+                # The summed yields at the grid nodes, for the pool column of values
+                with np.errstate(divide='ignore'):
+                    pool_values.append(np.log10(np.sum(np.power(10., lumped_values[-1]), axis=1)))
+        if pool_values:
+            rows = np.concatenate([self.rows, list(self.pools)])
+            order = np.argsort(rows)
+            self.rows = rows[order]
+            self.values = np.ascontiguousarray(np.column_stack([self.values] + pool_values)[:, order])
+            columns = np.argsort(order)[-len(pool_values):]
+            self.lumped = dict(zip(columns, lumped_values))
+    
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+    
+    def _bracket(self, axis, x):
+        '''Grid interval containing x (clamped to the grid), and the position within it'''
+        x = np.clip(x, axis[0], axis[-1])
+        i = np.clip(np.searchsorted(axis, x, side='right') - 1, 0, len(axis) - 2)
+        t = (x - axis[i]) / (axis[i+1] - axis[i])
+        # Round-off off a grid node would mix in the -inf of a null neighbor
+        t[np.abs(t) < 1e-9] = 0.
+        t[np.abs(1. - t) < 1e-9] = 1.
+        return i, t
+
+    def weights(self, mass, metallicity):
+        '''
+        Sparse (query points x grid nodes) matrix of the bilinear weights, 
+        and the boolean mask of the query points outside the grid
+        '''
+        import scipy.sparse as sparse
+        log_mass = np.log10(np.asarray(mass, dtype=float))
+        log_metallicity = np.log10(np.asarray(metallicity, dtype=float))
+        outside = ((log_mass < self.log_mass[0]) | (log_mass > self.log_mass[-1]) |
+                   (log_metallicity < self.log_metallicity[0]) | 
+                   (log_metallicity > self.log_metallicity[-1]))
+        iz, tz = self._bracket(self.log_metallicity, log_metallicity)
+        im, tm = self._bracket(self.log_mass, log_mass)
+        nm = len(self.log_mass)
+        node = iz * nm + im
+        indices = np.column_stack([node, node + 1, node + nm, node + nm + 1])
+        c = np.column_stack([(1. - tz) * (1. - tm), (1. - tz) * tm, 
+                             tz * (1. - tm), tz * tm])
+        W = sparse.csr_matrix((c.ravel(), indices.ravel(), np.arange(0, c.size+1, 4)),
+                              shape=(len(c), len(self.log_metallicity) * nm))
+        W.eliminate_zeros() # zero weights must not multiply the -inf of null yields
+        return W, outside
+
+    def log_evaluate(self, mass, metallicity, columns=slice(None)):
+        '''
+        Returns the (query points x rows[columns]) matrix of log10(yields).
+        The pools sum the yields of the isotopes they lump, interpolated one by one
+        '''
+        W, outside = self.weights(mass, metallicity)
+        log_yields = W @ self.values[:, columns]
+        if self.lumped:
+            selected = np.arange(len(self.rows))[columns]
+            for k, column in enumerate(np.atleast_1d(selected)):
+                if column in self.lumped:
+                    with np.errstate(divide='ignore'):
+                        pool = np.log10(np.sum(np.power(10., W @ self.lumped[column]), axis=1))
+                    if np.ndim(selected) == 0:
+                        return pool
+                    log_yields[:, k] = pool
+        return log_yields
+
+    def evaluate(self, mass, metallicity):
+        '''
+        Returns the (ZA_sorted x query points) matrix of yields. 
+        Isotopes not tabulated by the channel are zero.
+        '''
+        log_yields = self.log_evaluate(mass, metallicity)
+        yields = np.zeros((len(self.ZA_sorted), len(log_yields)))
+        yields[self.rows] = np.power(10., log_yields.T)
+        return yields
+
+    def __call__(self, df_mass_metallicity):
+        '''Same as evaluate(), but takes a DataFrame like the fitted interpolants'''
+        return self.evaluate(df_mass_metallicity['mass'].to_numpy(),
+                             df_mass_metallicity['metallicity'].to_numpy())
+    
+    def isotope_models(self):
+        '''One Yield_Table_Isotope per row of ZA_sorted'''
+        columns = dict(zip(self.rows, range(len(self.rows))))
+        return [Yield_Table_Isotope(self, columns.get(i)) for i in range(len(self.ZA_sorted))]
+
+
+class Yield_Table_Isotope:
+    '''
+    Single isotope of a Yield_Table, called like the fitted 
+    per-isotope interpolants (OneZone.evolve_option == 'scalar').
+    "empty" flags the isotopes not tabulated by the channel.
+    '''
+    def __init__(self, table, column):
+        self.table = table
+        self.column = column
+        self.empty = column is None
+    
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+    
+    def __call__(self, df_mass_metallicity):
+        log_yields = self.table.log_evaluate(df_mass_metallicity['mass'].to_numpy(),
+                                             df_mass_metallicity['metallicity'].to_numpy(),
+                                             columns=self.column)
+        return np.power(10., log_yields)
@@ -0,0 +1,150 @@
+""""""""""""""""""""""""""""""""""""""""""""""""
+"                                              "
+"           COMPARISON OF SEVERAL RUNS         "
+"   [Fe/H] and [X/Fe] tracks of many run       "
+"   directories, extracted in a process pool   "
+"   and cached in every run directory          "
+"                                              "
+" LIST OF CLASSES:                             "
+"    __        Run_Comparison                  "
+"                                              "
+""""""""""""""""""""""""""""""""""""""""""""""""
+
+import os
+import time
+import pickle
+import numpy as np
+import pandas as pd
+from .classes.inputs import Auxiliary
+from . import runstore as rs
+
+TRACKS_VERSION = 1 # bump whenever the layout of tracks.npz changes
+TRACKS_FILE = 'tracks.npz'
+
+
+def run_hash(run_dir):
+    '''sha1 of the input hash of a run and of the modification time of its outputs'''
+    import hashlib
+    hash_IN = rs.Run_Store(run_dir).input_hash if rs.Run_Store.exists(run_dir) else None
+    return hashlib.sha1(repr((TRACKS_VERSION, hash_IN, rs.RunResult.stamp(run_dir))).encode()).hexdigest()
+
+
+def run_tracks(run_dir):
+    '''
+    Element tracks of a run, from <run directory>/tracks.npz if it holds
+    the current run hash, or extracted from the outputs (and cached):
+        elemZ   atomic numbers of the run
+        Fe      mass of Fe at every timestep
+        FeH     log10(Fe/H) at every timestep
+        XFe     log10(X/Fe) of every elemZ at every timestep
+    (the solar normalizations are subtracted by Run_Comparison.tracks)
+    '''
+    key = run_hash(run_dir)
+    path = run_dir + TRACKS_FILE
+    if os.path.isfile(path):
+        with np.load(path) as npz:
+            if str(npz['run_hash']) == key:
+                return key, {name: npz[name] for name in ['elemZ', 'Fe', 'FeH', 'XFe']}
+    run = rs.RunResult(run_dir) # not RunResult.open: the pool of runs is not kept in memory
+    Z = run.ZA_sorted[:,0]
+    # The isotopes of every element are consecutive rows: one reduceat sums all the elements
+    rows = np.where(Z > 0)[0]
+    rows = rows[np.argsort(Z[rows], kind='stable')]
+    elemZ, starts = np.unique(Z[rows], return_index=True)
+    elements = np.add.reduceat(run.Mass_i[rows], starts, axis=0)
+    Fe, H = elements[elemZ == 26][0], elements[elemZ == 1][0]
+    tracks = {'elemZ': elemZ, 'Fe': Fe, 'FeH': np.log10(np.divide(Fe, H)), 
+              'XFe': np.log10(np.divide(elements, Fe))}
+    tmp_path = path + '.%d.tmp'%os.getpid()
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, run_hash=key, **tracks)
+    os.replace(tmp_path, path)
+    return key, tracks
+
+
+def extract_tracks(run_dir):
+    '''Worker of Run_Comparison.load: (run directory, run hash, tracks, time [s], pid, error)'''
+    tic = time.perf_counter()
+    try:
+        key, tracks = run_tracks(run_dir)
+        return run_dir, key, tracks, time.perf_counter() - tic, os.getpid(), ''
+    except Exception as e:
+        return run_dir, None, None, time.perf_counter() - tic, os.getpid(), repr(e)
+
+
+class Run_Comparison:
+    '''
+    [Fe/H] and [X/Fe] tracks of several run directories, for the figures
+    comparing runs (e.g. Plots.observational_helemZ_dir_comparison_plot).
+
+    The tracks of every run (log10 of the element mass ratios, see
+    run_tracks) are extracted once, by a pool of max_workers processes
+    (os.cpu_count() by default, 1 extracts in this process), and cached in
+    <run directory>/tracks.npz and in memory, keyed by the run hash
+    (run_hash: the input hash and the modification time of the outputs),
+    so that a rewritten run is extracted again.
+    tracks() subtracts the solar normalizations and selects the elements.
+
+    run_dirs [list of str]: run directories
+    '''
+    _tracks = {} # absolute run directory -> (run hash, tracks)
+
+    def __init__(self, run_dirs, max_workers=None, start_method='fork'):
+        self.run_dirs = [run_dir if run_dir[-1]=='/' else run_dir+'/' for run_dir in run_dirs]
+        self.timings = self.load(max_workers=max_workers, start_method=start_method)
+
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+
+    def load(self, max_workers=None, start_method='fork'):
+        '''
+        Extracts the tracks of the runs not in memory, or rewritten since.
+        Returns the time [s], worker and error of every extracted run
+        '''
+        missing = [run_dir for run_dir in self.run_dirs
+                   if os.path.abspath(run_dir) not in self._tracks
+                   or self._tracks[os.path.abspath(run_dir)][0] != run_hash(run_dir)]
+        max_workers = os.cpu_count() if max_workers is None else max_workers
+        if max_workers == 1 or len(missing) <= 1:
+            rows = [extract_tracks(run_dir) for run_dir in missing]
+        else:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            context = multiprocessing.get_context(start_method)
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(missing)), mp_context=context) as pool:
+                rows = list(pool.map(extract_tracks, missing))
+        for run_dir, key, tracks, toc, pid, error in rows:
+            if error == '':
+                self._tracks[os.path.abspath(run_dir)] = (key, tracks)
+        timings = pd.DataFrame([[run_dir, toc, pid, error] for run_dir, key, tracks, toc, pid, error in rows],
+                               columns=['run', 'time[s]', 'pid', 'error'])
+        for run_dir, error in timings.loc[timings['error'] != '', ['run', 'error']].to_numpy():
+            print('%s failed: %s'%(run_dir, error))
+        return timings
+
+    def raw(self, run_dir):
+        '''The cached tracks of run_dir (see run_tracks)'''
+        run_dir = run_dir if run_dir[-1]=='/' else run_dir+'/'
+        return self._tracks[os.path.abspath(run_dir)][1]
+
+    def tracks(self, run_dir, Z_list, solar_norm_H=None, solar_norm_Fe=None, c=0):
+        '''
+        [Fe/H] and [X/Fe] (rows of Z_list) of run_dir, from the timestep c on.
+        The solar normalizations (indexed by elemZ) default to those in the
+        metadata.pkl of the run. The elements the run lacks have no mass (log10(0/Fe))
+        '''
+        run_dir = run_dir if run_dir[-1]=='/' else run_dir+'/'
+        tracks = self.raw(run_dir)
+        if solar_norm_H is None or solar_norm_Fe is None:
+            metadata = pickle.load(open(run_dir + 'metadata.pkl', 'rb'))
+            solar_norm_H = metadata['solarA09_vs_H_bymass'] if solar_norm_H is None else solar_norm_H
+            solar_norm_Fe = metadata['solarA09_vs_Fe_bymass'] if solar_norm_Fe is None else solar_norm_Fe
+        Z_list = np.asarray(Z_list)
+        XFe = np.log10(np.divide(np.zeros((len(Z_list), 1)), tracks['Fe'][c:]))
+        rows = np.searchsorted(tracks['elemZ'], Z_list).clip(max=len(tracks['elemZ'])-1)
+        found = tracks['elemZ'][rows] == Z_list
+        XFe[found] = tracks['XFe'][rows[found], c:]
+        XFe -= np.asarray(solar_norm_Fe[Z_list])[:, None]
+        FeH = tracks['FeH'][c:] - solar_norm_H[26]
+        return FeH, XFe
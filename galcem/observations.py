@@ -0,0 +1,178 @@
+""""""""""""""""""""""""""""""""""""""""""""""""
+"                                              "
+"          OBSERVATIONAL ABUNDANCES            "
+"   The surveys of input/observations/abund    "
+"   parsed once into one columnar catalog,     "
+"   indexed by element and cached on disk      "
+"                                              "
+" LIST OF CLASSES:                             "
+"    __        Abundance_Catalog               "
+"                                              "
+""""""""""""""""""""""""""""""""""""""""""""""""
+
+import os
+import numpy as np
+import pandas as pd
+from .classes.inputs import Auxiliary
+
+ABUND_CATALOG_VERSION = 1 # bump whenever the layout of the cached .npz changes
+ABUND_MISSING = -30. # placeholder of the surveys for a missing value
+ABUND_COLUMNS = ['elemZ', 'FeH', 'XFe', 'XFe_ionized', 'FeH_err', 'XFe_err']
+
+
+class Abundance_Catalog:
+    '''
+    Every survey of input/observations/abund/*.txt in one table, with
+    one row per star and element and the columns:
+        survey          index of the survey (file), in the order of the plots
+        paper           index of the paperName in papers (a survey may list several)
+        elemZ           atomic number
+        FeH             [Fe/H] (by mass, Asplund et al., 2009)
+        XFe             [X/Fe] (by mass, neutral)
+        XFe_ionized     [X/Fe] (by mass, ionized)
+        FeH_err         error of [Fe/H] (NaN: the surveys list none)
+        XFe_err         error of [X/Fe] (NaN: the surveys list none)
+    Missing values keep the ABUND_MISSING placeholder of the surveys.
+
+    The rows are sorted by elemZ (then by survey, in the order of the file),
+    so that the rows of an element are one slice (query).
+    The catalog is parsed once and cached in yield_interpolation/observations/,
+    and parsed again when a survey file is added, removed or modified
+    (name, size and modification time). Abundance_Catalog.open() returns
+    the same instance for a directory, so that every plot shares it.
+
+    path [str]: directory of the surveys (default: input/observations/abund)
+    '''
+    _catalogs = {} # absolute path of the surveys -> (stamp, Abundance_Catalog)
+
+    def __init__(self, path=None, cache=True):
+        if path is None:
+            path = os.path.join(os.path.dirname(__file__), 'input', 'observations', 'abund')
+        self.path = os.path.abspath(path)
+        self.files = self.survey_files(self.path)
+        self.stamp = self.file_stamp(self.files)
+        self.cache_path = self.catalog_path(self.path) if cache else None
+        columns = self.load() if cache else None
+        if columns is None:
+            columns = self.parse()
+            if cache:
+                self.save(columns)
+        self.surveys = list(columns.pop('surveys'))
+        self.papers = list(columns.pop('papers'))
+        self.columns = columns
+        elemZ = self.columns['elemZ']
+        self.elemZ = np.unique(elemZ)
+        self.offsets = np.searchsorted(elemZ, np.append(self.elemZ, self.elemZ[-1]+1))
+
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+
+    def __len__(self):
+        return len(self.columns['elemZ'])
+
+    @classmethod
+    def open(cls, path=None):
+        '''The Abundance_Catalog of path, shared until a survey file changes'''
+        if path is None:
+            path = os.path.join(os.path.dirname(__file__), 'input', 'observations', 'abund')
+        key = os.path.abspath(path)
+        stamp = cls.file_stamp(cls.survey_files(key))
+        if key not in cls._catalogs or cls._catalogs[key][0] != stamp:
+            cls._catalogs[key] = (stamp, cls(key))
+        return cls._catalogs[key][1]
+
+    @staticmethod
+    def survey_files(path):
+        '''The survey files, in the order of the plots (shortest name first)'''
+        import glob
+        return sorted(glob.glob(path + "/*.txt"), key=len)
+
+    @staticmethod
+    def file_stamp(files):
+        '''sha1 of the name, size and modification time of every survey file'''
+        import hashlib
+        key = hashlib.sha1(repr(ABUND_CATALOG_VERSION).encode())
+        for filename in files:
+            stat = os.stat(filename)
+            key.update(('%s,%d,%d;'%(os.path.basename(filename), stat.st_size, stat.st_mtime_ns)).encode())
+        return key.hexdigest()
+
+    @staticmethod
+    def catalog_path(path):
+        '''Path of the cached catalog of the surveys in path'''
+        import hashlib
+        root = os.path.join(os.path.dirname(__file__), '..', 'yield_interpolation', 'observations')
+        return os.path.join(os.path.abspath(root), 'abund_%s.v%d.npz'%(
+                            hashlib.sha1(path.encode()).hexdigest()[:16], ABUND_CATALOG_VERSION))
+
+    def parse(self):
+        '''Reads every survey file into the columns of the catalog'''
+        frames, surveys = [], []
+        for j, filename in enumerate(self.files):
+            df = pd.read_table(filename, sep=',')
+            surveys.append(df['paperName'][0])
+            frames.append(pd.DataFrame({'survey': np.full(len(df), j, dtype=np.int16),
+                                        'paperName': df['paperName'].to_numpy(),
+                                        'elemZ': df.iloc[:,0].to_numpy(dtype=np.int16),
+                                        'FeH': df.iloc[:,1].to_numpy(dtype=float),
+                                        'XFe': df.iloc[:,2].to_numpy(dtype=float),
+                                        'XFe_ionized': df.iloc[:,3].to_numpy(dtype=float)}))
+        df = pd.concat(frames, ignore_index=True).sort_values(['elemZ', 'survey'], kind='stable')
+        codes, papers = pd.factorize(df['paperName'])
+        columns = {'surveys': np.array(surveys, dtype=str), 'papers': np.array(papers, dtype=str),
+                   'survey': df['survey'].to_numpy(), 'paper': codes.astype(np.int32)}
+        for name in ABUND_COLUMNS:
+            columns[name] = df[name].to_numpy() if name in df else np.full(len(df), np.nan)
+        return columns
+
+    def load(self):
+        '''The cached columns, or None if there are none for the current survey files'''
+        if not os.path.exists(self.cache_path):
+            return None
+        with np.load(self.cache_path) as npz:
+            if str(npz['stamp']) != self.stamp:
+                return None
+            return {name: npz[name] for name in npz.files if name != 'stamp'}
+
+    def save(self, columns):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = self.cache_path + '.%d.tmp'%os.getpid()
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, stamp=self.stamp, **columns)
+        os.replace(tmp_path, self.cache_path)
+
+    def rows(self, elemZ):
+        '''The slice of the rows of elemZ'''
+        k = np.searchsorted(self.elemZ, elemZ)
+        if k == len(self.elemZ) or self.elemZ[k] != elemZ:
+            return slice(0, 0)
+        return slice(self.offsets[k], self.offsets[k+1])
+
+    def query(self, elemZ, columns=None):
+        '''The rows of elemZ (one atomic number or a list of them), as a DataFrame'''
+        columns = ['survey', 'paper'] + ABUND_COLUMNS if columns is None else columns
+        idx = np.r_[tuple(self.rows(Z) for Z in np.atleast_1d(elemZ))]
+        df = pd.DataFrame({name: self.columns[name][idx] for name in columns})
+        if 'paper' in df:
+            df['paper'] = np.array(self.papers, dtype=object)[df['paper'].to_numpy()]
+        return df
+
+    def points(self, elemZ, x='FeH', y='XFe'):
+        '''(survey index, x, y) of every row of elemZ, in the order of the surveys'''
+        rows = self.rows(elemZ)
+        return self.columns['survey'][rows], self.columns[x][rows], self.columns[y][rows]
+
+    def by_survey(self, elemZ, x='FeH', y='XFe'):
+        '''
+        (survey label, x, y) of every survey for elemZ, in the order of the surveys,
+        empty for the surveys without elemZ: the plots cycle their markers and colors by survey
+        '''
+        survey, X, Y = self.points(elemZ, x=x, y=y)
+        bounds = np.searchsorted(survey, np.arange(len(self.surveys)+1))
+        return [(label, X[bounds[j]:bounds[j+1]], Y[bounds[j]:bounds[j+1]])
+                for j, label in enumerate(self.surveys)]
+
+    def survey_elements(self, j):
+        '''The atomic numbers listed by survey j'''
+        return np.unique(self.columns['elemZ'][self.columns['survey'] == j])
@@ -7,6 +7,8 @@
 " LIST OF CLASSES:                             "
 "    __        Setup (parent)                  "
 "    __        OneZone (subclass)              "
+"    __        Ensemble (subclass)             "
+"    __        Mass_Fractions                  "
 "                                              "
 """"""""""""""""""""""""""""""""""""""""""""""""
 
@@ -15,12 +17,14 @@ import pickle
 import time
 import numpy as np
 import pandas as pd
-import scipy.integrate as integr
 #from scipy.interpolate import *
 from .classes import morphology as morph
 from .classes import yields as yi
 from .classes import integration as gcint
-from .classes.inputs import Auxiliary
+from .classes.inputs import Auxiliary, Lazy_Module
+from .runstore import Run_Store, Run_Writer, input_hash
+
+integr = Lazy_Module('scipy.integrate')
 
 class Setup:
     """
@@ -72,21 +76,14 @@ class Setup:
         self.IMF = self.IMF_class.IMF() #() # Function @ input stellar mass
         
         #normalization
-        self.Greggio05_SD = np.vectorize(morph.Greggio05) # [func(lifetime)]
+        self.Greggio05_SD = morph.Greggio05_DTD(table=self.IN.SNIaDTD_table) # [func(lifetime)]
         gal_time = np.logspace(-3,1.5, num=1000)
-        DTD_SNIa = [D.f_SD_Ia for D in self.Greggio05_SD(gal_time)]
+        DTD_SNIa = morph.Greggio05(gal_time).f_SD_Ia
         K = 1/integr.simpson(DTD_SNIa, x=gal_time)
-        self.f_SNIa_v = np.array([K * D.f_SD_Ia for D in self.Greggio05_SD(self.time_chosen)])
+        self.f_SNIa_v = K * morph.Greggio05(self.time_chosen).f_SD_Ia
         
         # Comparison of rates with observations from Mannucci+05
-        SNmassfrac = self.IMF_class.IMF_fraction(self.IN.Ml_SNCC, self.IN.Mu_SNCC, massweighted=True)
-        SNnfrac = self.IMF_class.IMF_fraction(self.IN.Ml_SNCC, self.IN.Mu_SNCC, massweighted=False)
-        N_IMF = integr.quad(self.IMF, self.Ml, self.Mu)[0]
-        self.IN.MW_RSNCC = self.IN.Mannucci05_convert_to_SNrate_yr('II', self.IN.morphology, 
-                                                           SNmassfrac=SNmassfrac, SNnfrac=SNnfrac, NtotvsMtot=N_IMF)
-        N_RSNIa = np.multiply(self.IN.Mannucci05_SN_rate('Ia', self.IN.morphology),
-                              1.4 * self.IN.M_inf /1.e10 * 1e-2) # 1.4 Msun for Chandrasekhar's limit (SD scenario) 
-        self.IN.MW_RSNIa = np.array([N_RSNIa[0], N_RSNIa[0]+ N_RSNIa[1], N_RSNIa[0] - N_RSNIa[2]])
+        self.observed_rates(self.IN)
         
         # Initialize Yields
         self.iso_class = yi.Isotopes(self.IN)
@@ -127,18 +124,23 @@ class Setup:
         self.Infall_rate = self.infall(self.time_chosen)
         # Sorted list of unique [Z,A] pairs which include all isotopes
         self.ZA_sorted = self.c_class.ZA_sorted(ZA_all) 
+        # Rows of ZA_sorted which lump the untracked isotopes, if IN.tracked_isotopes
+        self.ZA_pools = None
+        if self.IN.tracked_isotopes is not None:
+            self.ZA_sorted, self.ZA_pools = self.c_class.ZA_tracked(self.ZA_sorted, 
+                                                                    self.IN.tracked_isotopes)
         # name of elements for all isotopes
         self.ZA_symb_list = self.IN.periodic['elemSymb'][self.ZA_sorted[:,0]]
         
         # Load Interpolation Models
         self._dir = os.path.dirname(__file__)
-        self.yields_BBN_class.construct_yields(self.ZA_sorted)
+        self.yields_BBN_class.construct_yields(self.ZA_sorted, pools=self.ZA_pools)
         self.models_BBN = self.yields_BBN_class.yields
-        self.yields_SNCC_class.construct_yields(self.ZA_sorted)
+        self.yields_SNCC_class.construct_yields(self.ZA_sorted, pools=self.ZA_pools)
         self.models_SNCC = self.yields_SNCC_class.yields
-        self.yields_LIMs_class.construct_yields(self.ZA_sorted)
+        self.yields_LIMs_class.construct_yields(self.ZA_sorted, pools=self.ZA_pools)
         self.models_LIMs = self.yields_LIMs_class.yields
-        self.yields_SNIa_class.construct_yields(self.ZA_sorted)
+        self.yields_SNIa_class.construct_yields(self.ZA_sorted, pools=self.ZA_pools)
         self.models_SNIa = self.yields_SNIa_class.yields
         #self.yields_NSM_class.construct_yields(self.ZA_sorted)
         #self.models_NSM = self.yields_NSM_class.yields
@@ -146,11 +148,15 @@ class Setup:
         #self.models_MRSN = self.yields_MRSN_class.yields
         self.yield_models = {ch: self.__dict__['models_'+ch] 
                             for ch in self.IN.include_channel}
+        # All-isotope interpolants for the vectorized evolution
+        self.yield_interpolants = {'SNCC': self.yields_SNCC_class.interpolant,
+                                   'LIMs': self.yields_LIMs_class.interpolant}
         
         # Initialize Global tracked quantities
         self.asplund3_percent = self.c_class.abund_percentage(self.ZA_sorted)
         # starting idx [int]. Excludes H and He for the metallicity selection
-        self.i_Z = np.where(self.ZA_sorted[:,0]>2)[0][0] 
+        # (the metal pool (0,0), if any, is the last row)
+        self.i_Z = np.where((self.ZA_sorted[:,0]>2) | (self.ZA_sorted[:,0]==0))[0][0] 
         
         # The total baryonic mass (i.e. the infall mass) is computed right away
         self.Mtot = np.insert(np.cumsum((self.Infall_rate[1:]
@@ -162,11 +168,11 @@ class Setup:
         self.SFR_v = self.initialize()
         # Mass_i_v is the gass mass (i,j) where the i rows are the isotopes 
         # and j are the timesteps, [:,j] follows the timesteps
-        self.Mass_i_v = self.initialize(matrix=True)
-        self.W_i_comp = {ch: self.initialize(matrix=True) 
+        self.Mass_i_v = self.initialize(matrix=True, name='Mass_i_v')
+        self.W_i_comp = {ch: self.initialize(matrix=True, name='W_i_comp_'+ch) 
                          for ch in self.IN.include_channel} #dtype=object
-        self.W_i_comp['BBN'] = self.initialize(matrix=True) 
-        self.Xi_v = self.initialize(matrix=True) 
+        self.W_i_comp['BBN'] = self.initialize(matrix=True, name='W_i_comp_BBN') 
+        self.Xi_v = self.mass_fractions()
         self.Z_v = self.initialize() # Metallicity 
         #self.G_v = self.initialize() # G 
         #self.S_v = self.initialize() # S = 1 - G 
@@ -175,17 +181,143 @@ class Setup:
         self.Rate_SNIa = self.initialize() 
         self.Rate_NSM = self.initialize()
         self.Rate_MRSN = self.initialize() 
+        # Histories of Z_v and SFR_v, evaluated at the birthtimes (filled once per timestep)
+        self.Z_history = gcint.History(self.time_chosen, self.Z_v)
+        self.SFR_history = gcint.History(self.time_chosen, self.SFR_v)
+        # Metallicity grid fixed point (Wi_grid.grids): warm-start state and iterations per timestep
+        self.Z_grid_state = {}
+        self.Z_grid_iter_v = {ch: np.zeros(len(self.time_chosen), dtype=int) 
+                              for ch in ['SNIa', 'SNCC', 'LIMs']}
+        if self.IN.rate_option == 'convolution':
+            self.rate_convolution = gcint.Rate_Convolution(self.IN, self.time_chosen, 
+                                    self.lifetime_class, self.IMF, self.Greggio05_SD, 
+                                    self.SFR_v, self.Z_v)
+        if self.IN.ejecta_option == 'ssp':
+            self.ssp_ejecta = {ch: gcint.SSP_Ejecta(self.IN, self.time_chosen, self.lifetime_class, 
+                                    self.IMF, ch, self.__dict__['yields_%s_class'%ch], 
+                                    self.SFR_v, self.Z_v) 
+                               for ch in ['SNCC', 'LIMs'] if ch in self.IN.include_channel}
     
     def __repr__(self):
         aux = Auxiliary()
         return aux.repr(self)
    
-    def initialize(self,matrix=False):
+    def observed_rates(self, IN):
+        ''' Sets IN.MW_RSNCC and IN.MW_RSNIa, the Mannucci+05 rates for IN.morphology and IN.M_inf '''
+        SNmassfrac = self.IMF_class.IMF_fraction(IN.Ml_SNCC, IN.Mu_SNCC, massweighted=True)
+        SNnfrac = self.IMF_class.IMF_fraction(IN.Ml_SNCC, IN.Mu_SNCC, massweighted=False)
+        N_IMF = self.IMF_class.quad('IMF', self.Ml, self.Mu)
+        IN.MW_RSNCC = IN.Mannucci05_convert_to_SNrate_yr('II', IN.morphology, 
+                                                           SNmassfrac=SNmassfrac, SNnfrac=SNnfrac, NtotvsMtot=N_IMF)
+        N_RSNIa = np.multiply(IN.Mannucci05_SN_rate('Ia', IN.morphology),
+                              1.4 * IN.M_inf /1.e10 * 1e-2) # 1.4 Msun for Chandrasekhar's limit (SD scenario) 
+        IN.MW_RSNIa = np.array([N_RSNIa[0], N_RSNIa[0]+ N_RSNIa[1], N_RSNIa[0] - N_RSNIa[2]])
+    
+    def save_inputs(self):
+        ''' Writes inputs.pkl, inputs.txt and metadata.pkl to the output directory '''
+        pickle.dump(self.IN,open(self._dir_out + 'inputs.pkl','wb'))
+        self.save_metadata()
+        with open(self._dir_out + 'inputs.txt', 'w') as f: 
+            for key, value in self.IN.__dict__.items(): 
+                if type(value) is not pd.DataFrame:
+                    f.write('%s:\t%s\n' % (key, value))
+        with open(self._dir_out + 'inputs.txt', 'a') as f: 
+            static_tables = [key for key in getattr(self.IN, 'static_tables', {}) if key not in self.IN.__dict__]
+            for key, value in [(key, getattr(self.IN, key)) for key in static_tables] + list(self.IN.__dict__.items()): 
+                if type(value) is pd.DataFrame:
+                    with open(self._dir_out + 'inputs.txt', 'a') as ff:
+                        ff.write('\n %s type %s\n'%(key, str(type(value))))
+                    #value.to_csv(self._dir_out + 'inputs.txt', mode='a',
+                    #             sep='\t', index=True, header=True)
+    
+    def save_metadata(self):
+        ''' 
+        Writes metadata.pkl: the quantities of the Setup which Plots needs 
+        (isotopes and solar normalizations), so that it draws a run without a Setup
+        '''
+        metadata = {'ZA_sorted': self.ZA_sorted,
+                    'ZA_symb_list': self.ZA_symb_list,
+                    'i_Z': self.i_Z,
+                    'asplund3_percent': self.asplund3_percent,
+                    'solarA09_vs_H_bymass': self.c_class.solarA09_vs_H_bymass,
+                    'solarA09_vs_Fe_bymass': self.c_class.solarA09_vs_Fe_bymass}
+        pickle.dump(metadata, open(self._dir_out + 'metadata.pkl','wb'))
+    
+    def save_outputs(self):
+        '''
+        Writes phys.dat and the Run_Store of an evolved run (unless evolve streamed it),
+        and the text Mass_i.dat, X_i.dat and W_i_comp.pkl if IN.legacy_text_output
+        '''
+        phys_df = pd.DataFrame(self.phys_columns())
+        phys_df.to_csv(self._dir_out+'phys.dat', index=False, 
+                       header="phys = pd.read_csv(run_path+'phys.dat', sep=',', comment='#')")
+        if not self.IN.stream_output:
+            self.run_writer().close()
+        if self.IN.legacy_text_output:
+            Run_Store(self._dir_out).export_text()
+    
+    def phys_columns(self, steps=slice(None)):
+        ''' The columns of phys.dat, at the timesteps steps '''
+        G_v = np.divide(self.Mgas_v[steps], self.Mtot[steps])
+        S_v = 1 - G_v
+        return {
+            'time[Gyr]'   : self.time_chosen[steps],
+            'Mtot[Msun]'  : self.Mtot[steps], 
+            'Mgas[Msun]'  : self.Mgas_v[steps],
+            'Mstar[Msun]' : self.Mstar_v[steps], 
+            'SFR[Msun/yr]': self.SFR_v[steps]/1e9 * self.IN.M_inf, # rescale to Msun/yr from Msun/Gyr/galMass
+            'Inf[Msun/yr]': self.Infall_rate[steps]/1e9, #/Gyr to /yr conversion
+            'Zfrac'       : self.Z_v[steps],
+            'Gfrac'       : G_v, 
+            'Sfrac'       : S_v, 
+            'R_CC[M/yr]'  : self.Rate_SNCC[steps]/1e9,
+            'R_Ia[M/yr]'  : self.Rate_SNIa[steps]/1e9,
+            'R_LIMs[M/y]' : self.Rate_LIMs[steps]/1e9,
+            'DTD_Ia[N/yr]': self.f_SNIa_v[steps]
+        }
+    
+    def run_writer(self):
+        ''' 
+        Run_Writer of the Run_Store: Mass_i, X_i, W_i_comp.<channel> 
+        and the columns of phys.dat, in chunks of IN.output_batch timesteps
+        '''
+        arrays = {'Mass_i': self.Mass_i_v, 'X_i': self.Xi_v}
+        if self.W_i_comp is not None:
+            arrays.update({'W_i_comp.'+ch: W for ch, W in self.W_i_comp.items()})
+        arrays['phys'] = lambda steps: np.array(list(self.phys_columns(steps).values()))
+        return Run_Writer(self._dir_out, arrays, self.ZA_sorted, self.time_chosen,
+                          input_hash=input_hash(self.IN), batch=self.IN.output_batch,
+                          labels={'phys': list(self.phys_columns(slice(0, 0)))})
+   
+    def initialize(self, matrix=False, name=None, models=None):
+        '''
+        Array filled with IN.epsilon, one value per timestep, or (isotopes x timesteps) 
+        if matrix, with a leading axis of the models if any (Ensemble).
+        The matrices are of dtype IN.matrix_dtype, and np.memmap files 
+        <outdir>/matrices/<name>.dat if IN.matrix_memmap
+        '''
+        shape = (len(self.time_chosen),)
         if matrix==True:
-            return self.IN.epsilon * np.ones((len(self.ZA_sorted),
-                                        len(self.time_chosen)), dtype=float)
-        else:
-            return self.IN.epsilon * np.ones(len(self.time_chosen)) 
+            shape = (len(self.ZA_sorted),) + shape
+        if models is not None:
+            shape = (models,) + shape
+        if matrix==True and self.IN.matrix_memmap:
+            os.makedirs(self._dir_out + 'matrices/', exist_ok=True)
+            array = np.memmap(self._dir_out + 'matrices/%s.dat'%name, 
+                              dtype=self.IN.matrix_dtype, mode='w+', shape=shape)
+            array[...] = self.IN.epsilon
+            return array
+        return self.IN.epsilon * np.ones(shape, dtype=self.IN.matrix_dtype if matrix else float)
+    
+    def mass_fractions(self, models=None):
+        '''
+        Xi_v: computed from Mass_i_v, Mgas_v and Xi_norm_v when indexed 
+        if IN.Xi_lazy, otherwise stored
+        '''
+        if self.IN.Xi_lazy:
+            self.Xi_norm_v = np.ones(self.Mgas_v.shape)
+            return Mass_Fractions(self.Mass_i_v, self.Mgas_v, self.Xi_norm_v)
+        return self.initialize(matrix=True, name='Xi_v', models=models)
         
 class OneZone(Setup):
     """
@@ -209,50 +341,11 @@ class OneZone(Setup):
         ''' Run the OneZone program '''
         self.tic.append(time.process_time())
         self.file1 = open(self._dir_out + "Terminal_output.txt", "w")
-        pickle.dump(self.IN,open(self._dir_out + 'inputs.pkl','wb'))
-        with open(self._dir_out + 'inputs.txt', 'w') as f: 
-            for key, value in self.IN.__dict__.items(): 
-                if type(value) is not pd.DataFrame:
-                    f.write('%s:\t%s\n' % (key, value))
-        with open(self._dir_out + 'inputs.txt', 'a') as f: 
-            for key, value in self.IN.__dict__.items(): 
-                if type(value) is pd.DataFrame:
-                    with open(self._dir_out + 'inputs.txt', 'a') as ff:
-                        ff.write('\n %s type %s\n'%(key, str(type(value))))
-                    #value.to_csv(self._dir_out + 'inputs.txt', mode='a',
-                    #             sep='\t', index=True, header=True)
+        self.save_inputs()
         self.evolve()
         self.aux.tic_count(string="Computation time", tic=self.tic)
-        G_v = np.divide(self.Mgas_v, self.Mtot)
-        S_v = 1 - G_v
         print("Saving the output...")
-        phys_dat = {
-            'time[Gyr]'   : self.time_chosen,
-            'Mtot[Msun]'  : self.Mtot, 
-            'Mgas[Msun]'  : self.Mgas_v,
-            'Mstar[Msun]' : self.Mstar_v, 
-            'SFR[Msun/yr]': self.SFR_v/1e9 * self.IN.M_inf, # rescale to Msun/yr from Msun/Gyr/galMass
-            'Inf[Msun/yr]': self.Infall_rate/1e9, #/Gyr to /yr conversion
-            'Zfrac'       : self.Z_v,
-            'Gfrac'       : G_v, 
-            'Sfrac'       : S_v, 
-            'R_CC[M/yr]'  : self.Rate_SNCC/1e9,
-            'R_Ia[M/yr]'  : self.Rate_SNIa/1e9,
-            'R_LIMs[M/y]' : self.Rate_LIMs/1e9,
-            'DTD_Ia[N/yr]': self.f_SNIa_v
-        }
-        phys_df = pd.DataFrame(phys_dat)
-        phys_df.to_csv(self._dir_out+'phys.dat', index=False, 
-                       header="phys = pd.read_csv(run_path+'phys.dat', sep=',', comment='#')")
-        np.savetxt(self._dir_out+'Mass_i.dat', np.column_stack((
-            self.ZA_sorted, self.Mass_i_v)), fmt=' '.join(['%5.i']*2+['%12.4e']
-                                                 *self.Mass_i_v[0,:].shape[0]),
-                header = 'elemZ    elemA    masses[Msun] # of every isotope for every timestep')
-        np.savetxt(self._dir_out+'X_i.dat', np.column_stack((
-            self.ZA_sorted, self.Xi_v)), fmt=' '.join(['%5.i']*2 + ['%12.4e']*
-                                                    self.Xi_v[0,:].shape[0]),
-                header = 'elemZ    elemA    X_i # abundance mass ratios of every isotope for every timestep (normalized to solar, Asplund et al., 2009)')
-        pickle.dump(self.W_i_comp,open(self._dir_out + 'W_i_comp.pkl','wb'))
+        self.save_outputs()
         self.aux.tic_count(string="Output saved in", tic=self.tic)
         self.file1.close()
     
@@ -266,44 +359,86 @@ class OneZone(Setup):
         # Second timestep: infall only
         self.Mass_i_v[:,1] = np.multiply(self.Mtot[1], self.models_BBN)
         self.Mgas_v[1] = self.Mtot[1]
+        # The finished timesteps are written to the Run_Store as the run proceeds
+        writer = self.run_writer() if self.IN.stream_output else None
         for n in range(len(self.time_chosen[:self.idx_Galaxy_age])+1):
             print('time [Gyr] = %.2f'%self.time_chosen[n])
             self.file1.write('n = %d\n'%n)
             self.total_evolution(n)        
-            self.Xi_v[:, n] = np.divide(self.Mass_i_v[:,n], self.Mgas_v[n])
+            if not self.IN.Xi_lazy:
+                self.Xi_v[:, n] = np.divide(self.Mass_i_v[:,n], self.Mgas_v[n])
             self.Z_v[n] = np.divide(np.sum(self.Mass_i_v[self.i_Z:,n]),
                                     self.Mgas_v[n])
             self.file1.write(' sum X_i at n %d= %.3f\n'%(n, np.sum(
                              self.Xi_v[:,n])))
+            self.Z_history.update(n)
+            self.SFR_history.update(n)
+            if self.IN.rate_option == 'convolution':
+                self.rate_convolution.update(n)
+            if self.IN.ejecta_option == 'ssp':
+                for ssp in self.ssp_ejecta.values():
+                    ssp.update(n)
             
             if n > 0.: 
-                Wi_class = gcint.Wi(n, self.IN, self.lifetime_class, 
-                                    self.time_chosen, self.Z_v, self.SFR_v,
-                            self.Greggio05_SD, self.IMF, self.ZA_sorted)
-                _rates = Wi_class.compute_rates()
+                if self.IN.rate_option == 'simpson' or self.IN.ejecta_option == 'simpson':
+                    # Mass grids of the Simpson integrals
+                    Wi_class = gcint.Wi(n, self.IN, self.lifetime_class, 
+                                        self.time_chosen, self.Z_v, self.SFR_v,
+                                self.Greggio05_SD, self.IMF, self.ZA_sorted,
+                                Z_grid_state=self.Z_grid_state, Z_history=self.Z_history,
+                                SFR_history=self.SFR_history)
+                    for ch, iterations in Wi_class.Z_grid_iterations.items():
+                        self.Z_grid_iter_v[ch][n] = iterations
+                    self.file1.write(' Z grid iterations: %s\n'%(', '.join(
+                        ['%s %d'%(ch, it) for ch, it in Wi_class.Z_grid_iterations.items()])))
+                if self.IN.rate_option == 'convolution':
+                    _rates = self.rate_convolution.rates(n)
+                else:
+                    _rates = Wi_class.compute_rates()
                 self.Rate_SNCC[n] = _rates['SNCC']
                 self.Rate_LIMs[n] = _rates['LIMs']
                 self.Rate_SNIa[n] = _rates['SNIa']
-                Wi_comp = {ch: Wi_class.compute(ch)
-                        for ch in self.IN.include_channel}
-                Z_comp = {}
-                for ch in self.IN.include_channel:
-                    if len(Wi_comp[ch]['birthtime_grid']) > 1.:
-                        Z_comp[ch] = pd.DataFrame(
-                        Wi_class.Z_component(Wi_comp[ch]['birthtime_grid']),
-                                            columns=['metallicity']) 
-                    else:
-                        Z_comp[ch] = pd.DataFrame(columns=['metallicity']) 
-                for i, _ in enumerate(self.ZA_sorted): 
-                    self.Mass_i_v[i, n+1] = self.aux.RK4(
-                        self.isotopes_evolution,self.time_chosen[n],
-                        self.Mass_i_v[i,n], n, self.IN.nTimeStep,
-                        i=i, Wi_comp=Wi_comp, Z_comp=Z_comp)
+                if self.IN.ejecta_option == 'ssp':
+                    # The SNCC and LIMs ejecta come from self.ssp_ejecta
+                    Wi_comp, Z_comp = {}, {}
+                else:
+                    Wi_comp = {ch: Wi_class.compute(ch)
+                            for ch in self.IN.include_channel}
+                    Z_comp = {}
+                    for ch in self.IN.include_channel:
+                        if len(Wi_comp[ch]['birthtime_grid']) > 1.:
+                            Z_comp[ch] = pd.DataFrame(
+                            Wi_class.Z_component(Wi_comp[ch]['birthtime_grid']),
+                                                columns=['metallicity']) 
+                        else:
+                            Z_comp[ch] = pd.DataFrame(columns=['metallicity']) 
+                if self.IN.evolve_option == 'scalar':
+                    # Reference path: one RK4 call per isotope
+                    for i, _ in enumerate(self.ZA_sorted): 
+                        self.Mass_i_v[i, n+1] = self.aux.RK4(
+                            self.isotopes_evolution,self.time_chosen[n],
+                            self.Mass_i_v[i,n], n, self.IN.nTimeStep,
+                            const_rhs=self.IN.RK4_const_rhs,
+                            i=i, Wi_comp=Wi_comp, Z_comp=Z_comp)
+                else:
+                    # The whole isotope column is advanced as one state vector
+                    self.Mass_i_v[:, n+1] = self.aux.RK4(
+                        self.isotopes_evolution_vectorized, self.time_chosen[n],
+                        self.Mass_i_v[:,n], n, self.IN.nTimeStep,
+                        const_rhs=self.IN.RK4_const_rhs,
+                        Wi_comp=Wi_comp, Z_comp=Z_comp)
+            if self.IN.Xi_lazy:
+                self.Xi_norm_v[n] = np.sum(self.Mass_i_v[:,n]) / self.Mgas_v[n]
             self.Mass_i_v[:, n] = np.multiply(self.Mass_i_v[:,n], #!!!!!!!
                                               self.Mgas_v[n]/np.sum(self.Mass_i_v[:,n]))
+            if writer is not None:
+                writer.append(n)
         self.Z_v[-1] = np.divide(np.sum(self.Mass_i_v[self.i_Z:,-1]), 
                                 self.Mgas_v[-1])
-        self.Xi_v[:,-1] = np.divide(self.Mass_i_v[:,-1], self.Mgas_v[-1]) 
+        if not self.IN.Xi_lazy:
+            self.Xi_v[:,-1] = np.divide(self.Mass_i_v[:,-1], self.Mgas_v[-1]) 
+        if writer is not None:
+            writer.close()
 
     def Mgas_func(self, t_n, y_n, n, i=None):
         # Explicit general diff eq GCE function
@@ -332,9 +467,11 @@ class OneZone(Setup):
         '''Integral for the total physical quantities'''
         self.SFR_v[n] = self.SFR_tn(n)
         self.Mstar_v[n+1] = self.aux.RK4(self.Mstar_func, self.time_chosen[n],
-                                        self.Mstar_v[n], n, self.IN.nTimeStep)
+                                        self.Mstar_v[n], n, self.IN.nTimeStep,
+                                        const_rhs=self.IN.RK4_const_rhs)
         self.Mgas_v[n+1] = self.aux.RK4(self.Mgas_func, self.time_chosen[n], 
-                                        self.Mgas_v[n], n, self.IN.nTimeStep)   
+                                        self.Mgas_v[n], n, self.IN.nTimeStep,
+                                        const_rhs=self.IN.RK4_const_rhs)   
 
     def isotopes_evolution(self, t_n, y_n, n, **kwargs):
         '''
@@ -361,6 +498,8 @@ class OneZone(Setup):
                 if ch == 'SNIa':
                     Wi_vals[ch] = 0.5 * (self.Rate_SNIa[n] * # Don't count SNIas twice
                                    self.yield_models['SNIa'][i])
+                elif self.IN.ejecta_option == 'ssp':
+                    Wi_vals[ch] = self.ssp_ejecta[ch].ejecta(n)[i]
                 else:
                     if len(Wi_comps[ch]['birthtime_grid']) > 1.:
                         if not self.yield_models[ch][i].empty:
@@ -378,3 +517,291 @@ class OneZone(Setup):
             val = infall_comp - sfr_comp + np.sum([Wi_vals[ch] 
                                         for ch in self.IN.include_channel])
         return val
+
+    def yield_matrix(self, channel_switch, yield_grid):
+        '''
+        Yields of every isotope in ZA_sorted evaluated at the yield grid.
+        Returns an (isotopes x grid points) array, with zero rows 
+        for the isotopes not tabulated by the channel.
+        '''
+        return self.yield_interpolants[channel_switch](yield_grid)
+
+    def isotopes_evolution_vectorized(self, t_n, y_n, n, **kwargs):
+        '''
+        Same as isotopes_evolution, but for all the isotopes at once.
+        y_n is the Mass_i_v[:,n] column, and the channel integrals 
+        are computed as a single matrix product across isotopes: 
+        the Simpson quadrature is linear in the integrand, so it reduces 
+        to (yields at the grid) @ (integrand * Simpson weights).
+        '''
+        Wi_comps = kwargs['Wi_comp'] 
+        Z_comps = kwargs['Z_comp'] 
+        infall_comp = self.Infall_rate[n] * self.models_BBN
+        self.W_i_comp['BBN'][:,n] = infall_comp
+        sfr_comp = self.SFR_v[n] * self.Xi_v[:,n] # astration
+        if n <= 0:
+            return infall_comp - sfr_comp
+        Wi_vals = {}
+        for ch in self.IN.include_channel:
+            if ch == 'SNIa':
+                Wi_vals[ch] = 0.5 * (self.Rate_SNIa[n] * # Don't count SNIas twice
+                               np.array(self.yield_models['SNIa']))
+            elif self.IN.ejecta_option == 'ssp':
+                Wi_vals[ch] = self.ssp_ejecta[ch].ejecta(n)
+            elif len(Wi_comps[ch]['birthtime_grid']) > 1.:
+                yield_grid = Z_comps[ch]
+                yield_grid['mass'] = Wi_comps[ch]['mass_grid']
+                weights = np.multiply(Wi_comps[ch]['integrand'], 
+                        self.aux.simpson_weights(Wi_comps[ch]['birthtime_grid']))
+                Wi_vals[ch] = self.IN.factor * np.dot(
+                        self.yield_matrix(ch, yield_grid), weights)
+            else:
+                Wi_vals[ch] = np.zeros(len(self.ZA_sorted))
+            self.W_i_comp[ch][:,n] = Wi_vals[ch] 
+        return infall_comp - sfr_comp + np.sum([Wi_vals[ch] 
+                                for ch in self.IN.include_channel], axis=0)
+
+
+class Ensemble(Setup):
+    """
+    Ensemble class
+    
+    Evolves several parameter sets (models) in one vectorized loop.
+    The yields, lifetimes, IMF and the kernels of the rates and of the 
+    ejecta are loaded once, and the state arrays carry a leading model axis:
+    Mgas_v, Mstar_v, SFR_v, Z_v, Rate_* have shape (models, timesteps), 
+    Mass_i_v and Xi_v (models, isotopes, timesteps).
+    The channels go through gcint.Rate_Convolution and gcint.SSP_Ejecta 
+    (IN.rate_option = 'convolution', IN.ejecta_option = 'ssp'), 
+    whose sums are linear in the SFR of each model.
+    
+    IN (Input): an Input configuration instance 
+    params [dict]: lists of equal length, one entry per model, of the 
+                   ensemble_params. The 'morphology' key picks the 
+                   default_params of every model, which the others override
+    """
+    ensemble_params = ['nu', 'tau_inf', 'k_SFR', 'M_inf']
+    model_arrays = ['Mtot', 'Infall_rate', 'Mstar_v', 'Mgas_v', 'SFR_v', 'Z_v', 
+                    'Mass_i_v', 'Xi_v', 'Rate_SNCC', 'Rate_LIMs', 'Rate_SNIa']
+    
+    def __init__(self, IN, params, outdir='runs/myensemble/'):
+        self.tic = []
+        self.tic.append(time.process_time())
+        unknown = set(params) - set(self.ensemble_params + ['morphology'])
+        if unknown:
+            raise ValueError('Unknown ensemble parameters: %s'%', '.join(sorted(unknown)))
+        lengths = set(len(value) for value in params.values())
+        if len(lengths) != 1:
+            raise ValueError('The ensemble parameters must have the same number of models')
+        self.params = params
+        self.n_models = lengths.pop()
+        import copy
+        IN = copy.copy(IN) # the options below apply to the ensemble, not to the caller's Inputs
+        IN.rate_option = 'convolution'
+        IN.ejecta_option = 'ssp'
+        IN.stream_output = False # the models are saved by main, after the evolution
+        super().__init__(IN, outdir=outdir)
+        self.IN_models = [self.model_inputs(k) for k in range(self.n_models)]
+        self.M_inf = np.array([IN_k.M_inf for IN_k in self.IN_models])
+        
+        # The infall normalization is an integral per model
+        self.Infall_rate = np.array([morph.Infall(IN_k, time=self.time_chosen).inf()(self.time_chosen)
+                                     for IN_k in self.IN_models])
+        self.Mtot = np.insert(np.cumsum((self.Infall_rate[:,1:]
+                            + self.Infall_rate[:,:-1]) * self.IN.nTimeStep / 2, axis=1),
+                              0, self.IN.epsilon, axis=1)
+        # SFRgal broadcasts over the model axis of nu, k_SFR and M_inf
+        IN_SFR = copy.copy(self.IN)
+        for key in ['nu', 'k_SFR', 'M_inf']:
+            IN_SFR.__dict__[key] = np.array([IN_k.__dict__[key] for IN_k in self.IN_models])
+        self.SFR_class = morph.Star_Formation_Rate(IN_SFR, self.IN.SFR_option,
+                                                   self.IN.custom_SFR)
+        
+        self.Mstar_v = self.initialize_models()
+        self.Mgas_v = self.initialize_models()
+        self.SFR_v = self.initialize_models()
+        self.Mass_i_v = self.initialize_models(matrix=True, name='Mass_i_v')
+        self.Xi_v = self.mass_fractions(models=self.n_models)
+        self.Z_v = self.initialize_models()
+        self.Rate_SNCC = self.initialize_models()
+        self.Rate_LIMs = self.initialize_models()
+        self.Rate_SNIa = self.initialize_models()
+        # Ejecta of every channel summed over the isotopes (the per-isotope W_i_comp is not kept)
+        self.W_v = {ch: len(self.ZA_sorted) * self.initialize_models()
+                    for ch in self.IN.include_channel}
+        self.W_i_comp = None
+        self.rate_convolution = self.rate_convolution.bind(self.SFR_v, self.Z_v, M_inf=self.M_inf)
+        self.ssp_ejecta = {ch: ssp.bind(self.SFR_v, self.Z_v, M_inf=self.M_inf)
+                           for ch, ssp in self.ssp_ejecta.items()}
+        self.tic.append(time.process_time())
+        print('Package lodaded in %.1e seconds.'%self.tic[-1])
+    
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+    
+    def model_inputs(self, k):
+        '''Copy of IN with the parameters of model k'''
+        import copy
+        IN_k = copy.copy(self.IN)
+        if 'morphology' in self.params:
+            IN_k.morphology = self.params['morphology'][k]
+            for key in ['M_inf', 'Reff', 'tau_inf', 'nu']:
+                IN_k.__dict__[key] = IN_k.default_params(key, IN_k.morphology)
+        for key in self.ensemble_params:
+            if key in self.params:
+                IN_k.__dict__[key] = self.params[key][k]
+        self.observed_rates(IN_k)
+        return IN_k
+    
+    def initialize_models(self, matrix=False, name=None):
+        return self.initialize(matrix=matrix, name=name, models=self.n_models)
+    
+    def model(self, k):
+        '''
+        Shallow copy holding the arrays of model k only, in outdir/model_<k>/. 
+        It saves (save_inputs, save_outputs) like a OneZone run
+        '''
+        import copy
+        one = copy.copy(self)
+        one.IN = self.IN_models[k]
+        for key in self.model_arrays:
+            one.__dict__[key] = self.__dict__[key][k]
+        one._dir_out = self._dir_out + 'model_%d/'%k
+        one._dir_out_figs = one._dir_out + 'figs/'
+        os.makedirs(one._dir_out_figs, exist_ok=True)
+        return one
+    
+    def main(self):
+        ''' Run the Ensemble program '''
+        self.tic.append(time.process_time())
+        self.file1 = open(self._dir_out + "Terminal_output.txt", "w")
+        pd.DataFrame({key: self.params[key] for key in self.params}).to_csv(
+                      self._dir_out + 'ensemble.dat', index_label='model')
+        self.evolve()
+        self.aux.tic_count(string="Computation time", tic=self.tic)
+        print("Saving the output...")
+        for k in range(self.n_models):
+            model = self.model(k)
+            model.save_inputs()
+            model.save_outputs()
+        self.aux.tic_count(string="Output saved in", tic=self.tic)
+        self.file1.close()
+    
+    def evolve(self):
+        '''Evolution routine of OneZone.evolve, for all the models at once'''
+        # First timestep: the galaxy is empty
+        self.Mass_i_v[:,:,0] = np.multiply.outer(self.Mtot[:,0], self.models_BBN)
+        self.Mgas_v[:,0] = self.Mtot[:,0]
+        # Second timestep: infall only
+        self.Mass_i_v[:,:,1] = np.multiply.outer(self.Mtot[:,1], self.models_BBN)
+        self.Mgas_v[:,1] = self.Mtot[:,1]
+        for n in range(len(self.time_chosen[:self.idx_Galaxy_age])+1):
+            print('time [Gyr] = %.2f'%self.time_chosen[n])
+            self.file1.write('n = %d\n'%n)
+            self.total_evolution(n)
+            if not self.IN.Xi_lazy:
+                self.Xi_v[:,:,n] = np.divide(self.Mass_i_v[:,:,n], self.Mgas_v[:,n,None])
+            self.Z_v[:,n] = np.divide(np.sum(self.Mass_i_v[:,self.i_Z:,n], axis=1),
+                                      self.Mgas_v[:,n])
+            self.rate_convolution.update(n)
+            for ssp in self.ssp_ejecta.values():
+                ssp.update(n)
+            if n > 0.:
+                _rates = self.rate_convolution.rates(n)
+                self.Rate_SNCC[:,n] = _rates['SNCC']
+                self.Rate_LIMs[:,n] = _rates['LIMs']
+                self.Rate_SNIa[:,n] = _rates['SNIa']
+                self.Mass_i_v[:,:,n+1] = self.aux.RK4(
+                    self.isotopes_evolution, self.time_chosen[n],
+                    self.Mass_i_v[:,:,n], n, self.IN.nTimeStep,
+                    const_rhs=self.IN.RK4_const_rhs)
+            if self.IN.Xi_lazy:
+                self.Xi_norm_v[:,n] = np.sum(self.Mass_i_v[:,:,n], axis=1) / self.Mgas_v[:,n]
+            self.Mass_i_v[:,:,n] = np.multiply(self.Mass_i_v[:,:,n], #!!!!!!!
+                        (self.Mgas_v[:,n]/np.sum(self.Mass_i_v[:,:,n], axis=1))[:,None])
+        self.Z_v[:,-1] = np.divide(np.sum(self.Mass_i_v[:,self.i_Z:,-1], axis=1), 
+                                   self.Mgas_v[:,-1])
+        if not self.IN.Xi_lazy:
+            self.Xi_v[:,:,-1] = np.divide(self.Mass_i_v[:,:,-1], self.Mgas_v[:,-1,None])
+    
+    def Mgas_func(self, t_n, y_n, n, i=None):
+        return self.Infall_rate[:,n] - self.SFR_tn(n) * self.M_inf + np.sum([
+                self.W_v[ch][:,n-1] for ch in self.IN.include_channel], axis=0)
+    
+    def Mstar_func(self, t_n, y_n, n, i=None):
+        return self.SFR_tn(n) * self.M_inf - np.sum([
+               self.W_v[ch][:,n-1] for ch in self.IN.include_channel], axis=0)
+    
+    def SFR_tn(self, timestep_n):
+        '''SFR of every model [Gyr^-1]'''
+        return self.SFR_class.SFR(Mgas=self.Mgas_v.T, Mtot=self.Mtot.T, 
+                                  timestep_n=timestep_n)
+    
+    def total_evolution(self, n):
+        '''Integral for the total physical quantities'''
+        self.SFR_v[:,n] = self.SFR_tn(n)
+        self.Mstar_v[:,n+1] = self.aux.RK4(self.Mstar_func, self.time_chosen[n],
+                                        self.Mstar_v[:,n], n, self.IN.nTimeStep,
+                                        const_rhs=self.IN.RK4_const_rhs)
+        self.Mgas_v[:,n+1] = self.aux.RK4(self.Mgas_func, self.time_chosen[n], 
+                                        self.Mgas_v[:,n], n, self.IN.nTimeStep,
+                                        const_rhs=self.IN.RK4_const_rhs)
+    
+    def isotopes_evolution(self, t_n, y_n, n, **kwargs):
+        '''OneZone.isotopes_evolution_vectorized, y_n of shape (models, isotopes)'''
+        infall_comp = np.multiply.outer(self.Infall_rate[:,n], self.models_BBN)
+        sfr_comp = self.SFR_v[:,n,None] * self.Xi_v[:,:,n] # astration
+        if n <= 0:
+            return infall_comp - sfr_comp
+        Wi_vals = {}
+        for ch in self.IN.include_channel:
+            if ch == 'SNIa':
+                Wi_vals[ch] = 0.5 * np.multiply.outer(self.Rate_SNIa[:,n], # Don't count SNIas twice
+                               np.array(self.yield_models['SNIa']))
+            else:
+                Wi_vals[ch] = self.ssp_ejecta[ch].ejecta(n)
+            self.W_v[ch][:,n] = np.sum(Wi_vals[ch], axis=1)
+        return infall_comp - sfr_comp + np.sum([Wi_vals[ch] 
+                                for ch in self.IN.include_channel], axis=0)
+
+
+class Mass_Fractions:
+    """
+    Mass_Fractions class
+    
+    Xi_v when IN.Xi_lazy: the mass fractions Mass_i_v / Mgas_v, 
+    computed from the two arrays when indexed instead of stored.
+    Mass_i_v is (models..., isotopes, timesteps), Mgas_v and Xi_norm_v 
+    (models..., timesteps). Xi_v is stored before the normalization of 
+    Mass_i_v at the end of every step, which Xi_norm_v (the sum of 
+    Mass_i_v over Mgas_v before the normalization) undoes
+    """
+    def __init__(self, Mass_i_v, Mgas_v, Xi_norm_v):
+        self.Mass_i_v = Mass_i_v
+        self.Mgas_v = Mgas_v
+        self.Xi_norm_v = Xi_norm_v
+    
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+    
+    @property
+    def shape(self):
+        return self.Mass_i_v.shape
+
+    @property
+    def dtype(self):
+        '''The dtype of Mass_i_v (Inputs.matrix_dtype), as a stored Xi_v'''
+        return self.Mass_i_v.dtype
+
+    def __len__(self):
+        return len(self.Mass_i_v)
+    
+    def __getitem__(self, key):
+        factor = np.broadcast_to(np.divide(self.Xi_norm_v, self.Mgas_v)[..., None, :],
+                                 self.Mass_i_v.shape)
+        return np.multiply(self.Mass_i_v[key], factor[key])
+    
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[...], dtype=dtype)
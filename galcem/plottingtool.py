@@ -2,62 +2,140 @@
 "                                              "
 "       PLOT CLASS FOR SINGLE-ZONE RUNS        "
 "  Contains the plot class to be paired with   " 
-"        the Setup class of onezone.py         "
+"   the run directories written by onezone.py  "
 "                                              "
 " LIST OF CLASSES:                             "
-"    __        Plots (subclass)                "
+"    __        Plots                           "
 "                                              "
 """"""""""""""""""""""""""""""""""""""""""""""""
 
+import os
 import pickle
 import time
+import functools
 import numpy as np
 import pandas as pd
-from .onezone import Setup
 from .classes.inputs import Auxiliary
+from . import runstore as rs
+from .observations import Abundance_Catalog
+from .comparison import Run_Comparison
 import warnings
 warnings.filterwarnings("ignore")
 np.seterr(divide='ignore') 
 
-class Plots(Setup):
+class Plots:
     """
     PLOTTING
+    
+    Figures of a run directory, drawn from its outputs (RunResult), 
+    inputs.pkl and metadata.pkl (written by Setup.save_inputs), 
+    without rebuilding the Setup. For the runs without metadata.pkl, 
+    its quantities are computed from the outputs and the Inputs
     """    
     def __init__(self, outdir = 'runs/mygcrun/'):
         self.tic = []
         self.tic.append(time.process_time())
-        self.IN = pickle.load(open(outdir + 'inputs.pkl','rb'))
-        super().__init__(self.IN, outdir=outdir)
+        self._dir_out = outdir if outdir[-1]=='/' else outdir+'/'
+        print('Output directory: ', self._dir_out)
+        self._dir_out_figs = self._dir_out + 'figs/'
+        os.makedirs(self._dir_out_figs,exist_ok=True)
+        self._dir = os.path.dirname(__file__)
+        self.aux = Auxiliary()
+        self.IN = pickle.load(open(self._dir_out + 'inputs.pkl','rb'))
+        self.__dict__.update(self.load_metadata())
         self.tic.append(time.process_time())
-        package_loading_time = self.tic[-1]
+        package_loading_time = self.tic[-1] - self.tic[0]
         print('Lodaded the plotting class in %.1e seconds.'%package_loading_time)  
     
     def __repr__(self):
         aux = Auxiliary()
         return aux.repr(self) 
         
-    def plots(self):
+    def load_metadata(self):
+        ''' metadata.pkl, or the same quantities for the runs saved before it '''
+        if os.path.isfile(self._dir_out + 'metadata.pkl'):
+            return pickle.load(open(self._dir_out + 'metadata.pkl','rb'))
+        from .classes import yields as yi
+        c_class = yi.Concentrations(self.IN)
+        ZA_sorted = self.run.ZA_sorted
+        return {'ZA_sorted': ZA_sorted,
+                'ZA_symb_list': self.IN.periodic['elemSymb'][ZA_sorted[:,0]],
+                'i_Z': np.where((ZA_sorted[:,0]>2) | (ZA_sorted[:,0]==0))[0][0],
+                'asplund3_percent': c_class.abund_percentage(ZA_sorted),
+                'solarA09_vs_H_bymass': c_class.solarA09_vs_H_bymass,
+                'solarA09_vs_Fe_bymass': c_class.solarA09_vs_Fe_bymass}
+    
+    @property
+    def run(self):
+        '''RunResult of the run: its outputs are read once, and shared by the plots'''
+        return rs.RunResult.open(self._dir_out)
+    
+    # Figures of plots(): (plot method, keyword arguments), in order
+    figures = [('FeH_evolution_plot', {'logAge': True}),
+               ('Z_evolution_plot', {'logAge': True}),
+               ('FeH_evolution_plot', {'logAge': False}),
+               ('Z_evolution_plot', {'logAge': False}),
+               ('total_evolution_plot', {'logAge': False}),
+               ('total_evolution_plot', {'logAge': True}),
+               ('lifetimeratio_test_plot', {}),
+               ('tracked_elements_3D_plot', {}),
+               ('observational_plot', {}),
+               ('observational_lelemZ_plot', {}),
+               ('obs_lZ_plot', {}),
+               ('iso_evolution_comp_plot', {'logAge': False}),
+               ('iso_evolution_comp_plot', {'logAge': True}),
+               ('iso_evolution_comp_lelemz_plot', {}),
+               ('obs_table', {}),
+               #('ind_evolution_plot', {}),
+               ('DTD_plot', {})]
+               ## elem_abundance() compares and requires multiple runs (IMF & SFR variations)
+    
+    # Observational layers (see _observations_layer)
+    raster_dpi = 150 # dpi of the rasterized layers in the saved figures
+    obs_bins = (90, 120) # [Fe/H] x [X/Fe] bins of obs_layer='density'
+    obs_range = ((-7., 2.), (-6., 6.))
+    
+    @staticmethod
+    def figure_label(name, kwargs):
+        return name + '(%s)'%', '.join(['%s=%s'%item for item in kwargs.items()])
+    
+    def plots(self, figures=None, max_workers=None, start_method='fork'):
+        '''
+        Renders the figures (all of Plots.figures by default, or those of 
+        the given plot methods or labels, e.g. 'FeH_evolution_plot(logAge=True)') 
+        with the Agg backend, in a pool of max_workers processes 
+        (os.cpu_count() by default, 1 renders in this process).
+        The outputs of the run are read before the pool starts, so that 
+        the forked workers share them. A figure which fails does not stop 
+        the others. Returns the time [s], worker and error of every figure
+        '''
         self.tic.append(time.process_time())
         print('Starting to plot')
-        self.FeH_evolution_plot(logAge=True)
-        self.Z_evolution_plot(logAge=True)
-        self.FeH_evolution_plot(logAge=False)
-        self.Z_evolution_plot(logAge=False)
-        self.total_evolution_plot(logAge=False)
-        self.total_evolution_plot(logAge=True)
-        self.lifetimeratio_test_plot()
-        self.tracked_elements_3D_plot()
-        self.observational_plot()
-        self.observational_lelemZ_plot()
-        self.obs_lZ_plot()
-        self.iso_evolution_comp_plot(logAge=False)
-        self.iso_evolution_comp_plot(logAge=True)
-        self.iso_evolution_comp_lelemz_plot()
-        self.obs_table()
-        #self.ind_evolution_plot()
-        self.DTD_plot()
-        ## self.elem_abundance() # compares and requires multiple runs (IMF & SFR variations)
+        tic = time.perf_counter()
+        selected = [(self.figure_label(name, kwargs), name, kwargs) for name, kwargs in self.figures
+                    if figures is None or name in figures or self.figure_label(name, kwargs) in figures]
+        max_workers = os.cpu_count() if max_workers is None else max_workers
+        # The outputs are read once, and shared by the forked workers
+        phys, Mass_i = self.run.phys, self.run.Mass_i
+        if max_workers == 1:
+            import matplotlib
+            matplotlib.use('Agg')
+            rows = [render_figure(*figure, plots=self) for figure in selected]
+        else:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            context = multiprocessing.get_context(start_method)
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                                     initializer=attach_plots, initargs=(self,)) as pool:
+                rows = list(pool.map(render_figure, *zip(*selected)))
+        timings = pd.DataFrame(rows, columns=['figure', 'time[s]', 'pid', 'error'])
+        print(timings.drop(columns='error').to_string(index=False))
+        for figure, error in timings.loc[timings['error'] != '', ['figure', 'error']].to_numpy():
+            print('%s failed: %s'%(figure, error))
+        print('%d figures in %.1f seconds (wall) on %d workers'%(len(timings), 
+              time.perf_counter() - tic, max_workers))
         self.aux.tic_count(string="Plots saved in", tic=self.tic)
+        return timings
       
     def tracked_elements_3D_plot(self, cmap_name='magma_r', cbins=10): # angle = 2 * np.pi / np.arctan(0.4) !!!!!!!
         print('Starting ZA_sorted_plot()')
@@ -109,7 +187,7 @@ class Plots(Setup):
         print('Starting DTD_plot()')
         from matplotlib import pyplot as plt
         plt.style.use(self._dir+'/galcem.mplstyle')
-        phys = pd.read_csv(self._dir_out+'phys.dat', sep=',', comment='#')
+        phys = self.run.phys
         gal_time = phys['time[Gyr]'].iloc[:-1]
         DTD_SNIa = phys['DTD_Ia[N/yr]'].iloc[:-1]
         fig, ax = plt.subplots(1,1, figsize=(7,5))
@@ -183,8 +261,8 @@ class Plots(Setup):
         import matplotlib.ticker as ticker
         Mfin = self.IN.M_inf
         #plt.style.use(self._dir+'/galcem.mplstyle')
-        phys = pd.read_csv(self._dir_out+'phys.dat', sep=',', comment='#')
-        Mass_i = np.loadtxt(self._dir_out + 'Mass_i.dat')
+        phys = self.run.phys
+        Mass_i = self.run.Mass_i
         time_chosen = phys['time[Gyr]']#.iloc[:-1]
         Mtot = phys['Mtot[Msun]']
         Mgas_v = phys['Mgas[Msun]']
@@ -209,10 +287,10 @@ class Plots(Setup):
         axs[0].semilogy(time_plot, Mstar_v + Mgas_v, label= r'$M_g + M_s$', linewidth=3, linestyle = '--', color='#a9a9a9')
         axs[0].semilogy(time_plot, Mstar_v, label= r'$M_{star}$', linewidth=3, color='#ff8c00')
         axs[0].semilogy(time_plot, Mgas_v, label= r'$M_{gas}$', linewidth=3, color='#0d00ff')
-        axs[0].semilogy(time_plot, np.sum(Mass_i[:,2:], axis=0), label = r'$M_{g,tot,i}$', linewidth=2, linestyle=':', color='#00b3ff')
-        axs[0].semilogy(time_plot, np.sum(Mass_i[:2,2:], axis=0), label = r'$M_{H,g}$', linewidth=1, linestyle='-.', color='#0033ff')
-        axs[0].semilogy(time_plot, np.sum(Mass_i[4:,2:], axis=0), label = r'$M_{Z,g}$', linewidth=2, linestyle=':', color='#ff0073')
-        axs[0].semilogy(time_plot, np.sum(Mass_i[2:4,2:], axis=0), label = r'$M_{He,g}$', linewidth=1, linestyle='--', color='#0073ff')
+        axs[0].semilogy(time_plot, np.sum(Mass_i, axis=0), label = r'$M_{g,tot,i}$', linewidth=2, linestyle=':', color='#00b3ff')
+        axs[0].semilogy(time_plot, np.sum(Mass_i[:2], axis=0), label = r'$M_{H,g}$', linewidth=1, linestyle='-.', color='#0033ff')
+        axs[0].semilogy(time_plot, np.sum(Mass_i[4:], axis=0), label = r'$M_{Z,g}$', linewidth=2, linestyle=':', color='#ff0073')
+        axs[0].semilogy(time_plot, np.sum(Mass_i[2:4], axis=0), label = r'$M_{He,g}$', linewidth=1, linestyle='--', color='#0073ff')
         axs[1].semilogy(time_plot[:-1], Rate_SNCC[:-1], label= r'$R_{SNCC}$', color = '#0034ff', linestyle=':', linewidth=3)
         axs[1].semilogy(time_plot[:-1], Rate_SNIa[:-1], label= r'$R_{SNIa}$', color = '#00b3ff', linestyle=':', linewidth=3)
         axs[1].semilogy(time_plot[:-1], Rate_LIMs[:-1], label= r'$R_{LIMs}$', color = '#ff00b3', linestyle=':', linewidth=3)
@@ -279,16 +357,15 @@ class Plots(Setup):
         print('Starting FeH_evolution()')
         from matplotlib import pyplot as plt
         #plt.style.use(self._dir+'/galcem.mplstyle')
-        Z_list = np.unique(self.ZA_sorted[:,0])
-        phys = pd.read_csv(self._dir_out+'phys.dat', sep=',', comment='#')
+        Z_list = self._elements()
+        phys = self.run.phys
         gal_time = phys['time[Gyr]'].iloc[c:]
-        solar_norm_H = self.c_class.solarA09_vs_H_bymass[Z_list]
-        solar_norm_Fe = self.c_class.solarA09_vs_Fe_bymass[Z_list]
-        Mass_i = np.loadtxt(self._dir_out + 'Mass_i.dat')
+        solar_norm_H = self.solarA09_vs_H_bymass[Z_list]
+        solar_norm_Fe = self.solarA09_vs_Fe_bymass[Z_list]
         FeH_value, FeH_age, _, _ = self._age_observations()
         a, b = np.polyfit(FeH_age, FeH_value, 1)
-        Fe = np.sum(Mass_i[self._select_elemZ_idx(elemZ), c+2:], axis=0)
-        H = np.sum(Mass_i[self._select_elemZ_idx(1), c+2:], axis=0)
+        Fe = self.run.element(elemZ)[c:]
+        H = self.run.element(1)[c:]
         FeH = np.log10(np.divide(Fe, H)) - solar_norm_H[elemZ]
         fig, ax = plt.subplots(1,1, figsize=(7,5))
         ax.plot(gal_time, FeH, color='black', label='[Fe/H]', linewidth=3) 
@@ -316,15 +393,14 @@ class Plots(Setup):
         print('Starting Z_evolution()')
         from matplotlib import pyplot as plt
         #plt.style.use(self._dir+'/galcem.mplstyle')
-        Z_list = np.unique(self.ZA_sorted[:,0])
-        phys = pd.read_csv(self._dir_out+'phys.dat', sep=',', comment='#')
+        Z_list = self._elements()
+        phys = self.run.phys
         gal_time = phys['time[Gyr]'].iloc[c:]
         _, _, metallicity_value, metallicity_age = self._age_observations()
         a, b = np.polyfit(metallicity_age, metallicity_value, 1)
-        solar_norm_H = self.c_class.solarA09_vs_H_bymass[Z_list]
-        Mass_i = np.loadtxt(self._dir_out + 'Mass_i.dat')
-        Z = np.sum(Mass_i[self.i_Z:, c+2:], axis=0)
-        H = np.sum(Mass_i[self._select_elemZ_idx(1), c+2:], axis=0)
+        solar_norm_H = self.solarA09_vs_H_bymass[Z_list]
+        Z = np.sum(self.run.Mass_i[self.i_Z:, c:], axis=0)
+        H = self.run.element(1)[c:]
         ZH = np.log10(np.divide(Z, H)/self.IN.solar_metallicity)
         fig, ax = plt.subplots(1,1, figsize=(7,5))
         ax.plot(gal_time, ZH, color='blue', label='Z', linewidth=3)
@@ -352,16 +428,15 @@ class Plots(Setup):
         print('Starting ind_evolution()')
         from matplotlib import pyplot as plt
         #plt.style.use(self._dir+'/galcem.mplstyle')
-        Z_list = np.unique(self.ZA_sorted[:,0])
-        phys = pd.read_csv(self._dir_out+'phys.dat', sep=',', comment='#')
+        Z_list = self._elements()
+        phys = self.run.phys
         gal_time = phys['time[Gyr]'].iloc[c:]
        # _, _, metallicity_value, metallicity_age = self._age_observations()
         #a, b = np.polyfit(metallicity_age, metallicity_value, 1)
-        solar_norm_Fe = self.c_class.solarA09_vs_Fe_bymass[Z_list]
-        Mass_i = np.loadtxt(self._dir_out + 'Mass_i.dat')
-        N = np.sum(Mass_i[self._select_elemZ_idx(elemZ1), c+2:], axis=0)
-        Mg = np.sum(Mass_i[self._select_elemZ_idx(elemZ2), c+2:], axis=0)
-        Fe = np.sum(Mass_i[self._select_elemZ_idx(26), c+2:], axis=0)
+        solar_norm_Fe = self.solarA09_vs_Fe_bymass[Z_list]
+        N = self.run.element(elemZ1)[c:]
+        Mg = self.run.element(elemZ2)[c:]
+        Fe = self.run.element(26)[c:]
         NFe = np.log10(np.divide(N, Fe)) - solar_norm_Fe[elemZ1]
         MgFe = np.log10(np.divide(Mg, Fe)) - solar_norm_Fe[elemZ2]
         fig, ax = plt.subplots(1,1, figsize=(7,5))
@@ -393,11 +468,10 @@ class Plots(Setup):
         from matplotlib import pyplot as plt
         plt.style.use(self._dir+'/galcem.mplstyle')
         import matplotlib.ticker as ticker
-        Mass_i = np.loadtxt(self._dir_out + 'Mass_i.dat')
-        Masses = np.log10(Mass_i[:,2:])#, where=Mass_i[:,2:]>0.)
-        phys = pd.read_csv(self._dir_out+'phys.dat', sep=',', comment='#')
+        Masses = np.log10(self.run.Mass_i)#, where=self.run.Mass_i>0.)
+        phys = self.run.phys
         timex = phys['time[Gyr]']
-        W_i_comp = pickle.load(open(self._dir_out + 'W_i_comp.pkl','rb'))
+        W_i_comp = self.run.W_i_comp
         #Mass_MRSN = np.log10(W_i_comp['MRSN'])
         Mass_BBN = np.log10(W_i_comp['BBN'])#, where=W_i_comp['BBN']>0.)
         Mass_SNCC = np.log10(W_i_comp['SNCC'])#, where=W_i_comp['SNCC']>0.)
@@ -408,7 +482,7 @@ class Plots(Setup):
         if ncol==None: ncol = np.floor(np.sqrt(lenA)).astype('int')
         nrow = np.ceil(len(A)/ncol).astype('int')
         #print('(# nuclides, nrow, ncol) = (%d, %d, %d)'%(len(Z), nrow, ncol))
-        fig, axs = plt.subplots(nrow, ncol, figsize=figsize)#, sharex=True)
+        fig, axs = plt.subplots(nrow, ncol, figsize=figsize, squeeze=False)#, sharex=True)
         for i, ax in enumerate(axs.flat):
             if i < len(Z):
                 #print('i %d'%(i))
@@ -470,11 +544,10 @@ class Plots(Setup):
         from matplotlib import pyplot as plt
         plt.style.use(self._dir+'/galcem.mplstyle')
         import matplotlib.ticker as ticker
-        Mass_i = np.loadtxt(self._dir_out + 'Mass_i.dat')
-        Masses = np.log10(Mass_i[:,2:])#, where=Mass_i[:,2:]>0.)
-        phys = pd.read_csv(self._dir_out+'phys.dat', sep=',', comment='#')
+        Masses = np.log10(self.run.Mass_i)#, where=self.run.Mass_i>0.)
+        phys = self.run.phys
         timex = phys['time[Gyr]']
-        W_i_comp = pickle.load(open(self._dir_out + 'W_i_comp.pkl','rb'))
+        W_i_comp = self.run.W_i_comp
         #Mass_MRSN = np.log10(W_i_comp['MRSN'], where=W_i_comp['MRSN']>0.)
         yr_rate = IN.nTimeStep * 1e9
         Mass_BBN = np.log10(W_i_comp['BBN']/yr_rate)#, where=W_i_comp['BBN']>0., out=np.zeros((W_i_comp['BBN']).shape))
@@ -486,7 +559,7 @@ class Plots(Setup):
         if ncol==None: ncol = np.floor(np.sqrt(lenA)).astype('int')
         nrow = 12# np.ceil(len(A)/ncol).astype('int')
         #print('(# nuclides, nrow, ncol) = (%d, %d, %d)'%(len(Z), nrow, ncol))
-        fig, axs = plt.subplots(nrow, ncol, figsize=figsize)#, sharex=True)
+        fig, axs = plt.subplots(nrow, ncol, figsize=figsize, squeeze=False)#, sharex=True)
         for i, ax in enumerate(axs.flat):
             if i < len(Z):
                 #print('i %d'%(i))
@@ -541,17 +614,16 @@ class Plots(Setup):
         plt.savefig(self._dir_out_figs + 'iso_evolution_comp_lz'+str(xscale)+'.pdf', bbox_inches='tight')
 
     def _extract_normalized_abundances(self, Z_list, Mass_i_loc, c=3):
-        solar_norm_H = self.c_class.solarA09_vs_H_bymass[Z_list]
-        solar_norm_Fe = self.c_class.solarA09_vs_Fe_bymass[Z_list]
-        Mass_i = np.loadtxt(Mass_i_loc)
+        solar_norm_H = self.solarA09_vs_H_bymass[Z_list]
+        solar_norm_Fe = self.solarA09_vs_Fe_bymass[Z_list]
+        run = rs.RunResult.open(os.path.dirname(Mass_i_loc)+'/')
         #Fe = np.sum(Mass_i[np.intersect1d(np.where(ZA_sorted[:,0]==26)[0], np.where(ZA_sorted[:,1]==56)[0]), c+2:], axis=0)
-        Fe = np.sum(Mass_i[self._select_elemZ_idx(26), c+2:], axis=0)
-        H = np.sum(Mass_i[self._select_elemZ_idx(1), c+2:], axis=0)
+        Fe = run.element(26)[c:]
+        H = run.element(1)[c:]
         FeH = np.log10(np.divide(Fe, H)) - solar_norm_H[26]
         abund_i = []
         for i,val in enumerate(Z_list):
-            mass = np.sum(Mass_i[self._select_elemZ_idx(val), c+2:], axis=0)
-            abund_i.append(np.log10(np.divide(mass,Fe)) - solar_norm_Fe[val])
+            abund_i.append(run.ratio(val, 26)[c:] - solar_norm_Fe[val])
         normalized_abundances = np.array(abund_i)
         return normalized_abundances, FeH
 
@@ -560,7 +632,7 @@ class Plots(Setup):
         from matplotlib import pyplot as plt
         #plt.style.use(self._dir+'/galcem.mplstyle')
         import matplotlib.ticker as ticker
-        Z_list = np.unique(self.ZA_sorted[:,0])
+        Z_list = self._elements()
         ncol = self.aux.find_nearest(np.power(np.arange(20),2), len(Z_list))
         if len(Z_list) < ncol:
             nrow = ncol
@@ -614,28 +686,80 @@ class Plots(Setup):
         plt.show(block=False)
         plt.savefig(self._dir_out_figs + 'elem_abundance.pdf', bbox_inches='tight')
     
+    def _observations_layer(self, ax, catalog, elemZ, listmarkers, listcolors, obs_layer='points', legend=False):
+        '''
+        The observations of elemZ of every survey, below the model tracks:
+        obs_layer='points' one collection (Survey_Layer) of the points of all the surveys, 
+                           each with the marker and color of its survey (vector),
+                  'raster' the same collection, rasterized into one image per panel,
+                  'density' the 2D histogram of the points of all the surveys (obs_bins),
+                  None      no observations.
+        legend: the panel holds the legend, with a handle for every survey
+        '''
+        if obs_layer is None:
+            return None
+        if obs_layer == 'density':
+            from matplotlib.colors import LogNorm
+            survey, FeH_obs, XFe_obs = catalog.points(elemZ)
+            counts = np.histogram2d(FeH_obs, XFe_obs, bins=self.obs_bins, range=self.obs_range)[0]
+            if not counts.any():
+                return None
+            # An image, embedded as such in the pdf with no rasterization pass
+            ax.imshow(np.ma.masked_equal(counts.T, 0), extent=np.ravel(self.obs_range), origin='lower', 
+                      aspect='auto', interpolation='nearest', cmap='Greys', norm=LogNorm(), zorder=0.9)
+            return None
+        from matplotlib.collections import PathCollection
+        from matplotlib.transforms import IdentityTransform
+        from .surveylayer import Survey_Layer
+        surveys = []
+        for j, (label, FeH_obs, XFe_obs) in enumerate(catalog.by_survey(elemZ)):
+            path, linewidth = marker_path(listmarkers[j % len(listmarkers)])
+            color = listcolors[j % len(listcolors)]
+            if legend:
+                # Collection of no points: the legend handle of the survey
+                handle = PathCollection((path,), sizes=[20], facecolors=color, edgecolors='face', 
+                                        linewidths=linewidth, alpha=0.3, label=label, zorder=0.9,
+                                        offsets=np.empty((0, 2)), offset_transform=ax.transData)
+                handle.set_transform(IdentityTransform())
+                ax.add_collection(handle, autolim=False)
+            surveys.append((path, linewidth, color, np.column_stack([FeH_obs, XFe_obs])))
+        # The surveys are drawn over one another in their order, as separate collections would be
+        layer = Survey_Layer(surveys, ax, sizes=[20], alpha=0.3, zorder=0.9)
+        if len(layer.get_offsets()):
+            ax.add_collection(layer, autolim=False)
+            ax.update_datalim(layer.get_offsets())
+        ax.autoscale_view()
+        if obs_layer == 'raster':
+            # Every artist below zorder 1 is drawn in one image, with the markers stamped by Agg
+            ax.set_rasterization_zorder(1)
+        return None
+
+    def _elements(self):
+        '''
+        Atomic numbers of the run, without the metal pool (Z=0) of 
+        Inputs.tracked_isotopes. The H and He pools are the H and He of the run
+        '''
+        Z_list = np.unique(self.ZA_sorted[:,0])
+        return Z_list[Z_list > 0]
+
     def _select_elemZ_idx(self, elemZ):
         ''' auxiliary function that selects the isotope indexes where Z=elemZ '''
         return np.where(self.ZA_sorted[:,0]==elemZ)[0]
    
-    def observational_plot(self, figsiz = (15,10), c=3):
+    def observational_plot(self, figsiz = (15,10), c=3, obs_layer='points'):
         print('Starting observational_plot()')
-        import glob
-        import itertools
         from matplotlib import pyplot as plt
         import matplotlib.ticker as ticker
         plt.style.use(self._dir+'/galcem.mplstyle')
-        Mass_i = np.loadtxt(self._dir_out+'Mass_i.dat')
-        Z_list = np.unique(self.ZA_sorted[:,0])
+        Z_list = self._elements()
         Z_symb_list = self.IN.periodic['elemSymb'][Z_list] # name of elements for all isotopes
-        solar_norm_H = self.c_class.solarA09_vs_H_bymass[Z_list]
-        solar_norm_Fe = self.c_class.solarA09_vs_Fe_bymass[Z_list]
+        solar_norm_H = self.solarA09_vs_H_bymass[Z_list]
+        solar_norm_Fe = self.solarA09_vs_Fe_bymass[Z_list]
         Masses2_i = []
-        Fe = np.sum(Mass_i[self._select_elemZ_idx(26), c+2:], axis=0)
-        H = np.sum(Mass_i[self._select_elemZ_idx(1), c+2:], axis=0)
+        Fe = self.run.element(26)[c:]
+        H = self.run.element(1)[c:]
         for i,val in enumerate(Z_list):
-            mass = np.sum(Mass_i[self._select_elemZ_idx(val), c+2:], axis=0)
-            Masses2_i.append(np.log10(np.divide(mass,Fe)) - solar_norm_Fe[val])
+            Masses2_i.append(self.run.ratio(val, 26)[c:] - solar_norm_Fe[val])
         Masses2 = np.array(Masses2_i) 
         FeH = np.log10(np.divide(Fe, H)) - solar_norm_H[26]
         ncol = self.aux.find_nearest(np.power(np.arange(20),2), len(Z_list))
@@ -643,27 +767,9 @@ class Plots(Setup):
             nrow = ncol
         else:
             nrow = ncol + 1
-        fig, axs = plt.subplots(nrow, ncol, figsize =figsiz)#, sharex=True)
+        fig, axs = plt.subplots(nrow, ncol, figsize =figsiz, squeeze=False)#, sharex=True)
     
-        path = self._dir + r'/input/observations/abund' # use your path
-        all_files = glob.glob(path + "/*.txt")
-        all_files = sorted(all_files, key=len)
-
-        li = []
-        linames = []
-        elemZmin = 12
-        elemZmax = 12
-
-        for filename in all_files:
-            df = pd.read_table(filename, sep=',')
-            elemZmin0 = np.min(df.iloc[:,0])
-            elemZmax0 = np.max(df.iloc[:,0])
-            elemZmin = np.min([elemZmin0, elemZmin])
-            elemZmax = np.max([elemZmax0, elemZmax])
-            li.append(df)
-            linames.append(df['paperName'][0])
-
-        lenlist = len(li)
+        catalog = Abundance_Catalog.open(self._dir + r'/input/observations/abund')
         listmarkers = [r"$\mathcal{A}$",  r"$\mathcal{B}$",  r"$\mathcal{C}$",
                                     r"$\mathcal{D}$", r"$\mathcal{E}$", r"$\mathcal{F}$",
                                     r"$\mathcal{G}$", r"$\mathcal{H}$", r"$\mathcal{I}$",
@@ -682,20 +788,15 @@ class Plots(Setup):
         '#8ed5f0', '#660033', '#b20058', '#e50072', '#ff3298', '#ff7fbf',
         '#252525', '#525252', '#737373', '#969696', '#bdbdbd', '#d9d9d9',
         '#7f0000', '#cc0000', '#ff4444', '#ff7f7f', '#ffb2b2', '#995100']
-        lenlist = len(li)
     
         for i, ax in enumerate(axs.flat):
-            colorlist = itertools.cycle(listcolors)
-            markerlist =itertools.cycle(listmarkers)
-            for j, ll in enumerate(li):
-                ip = i+2 # Shift to skip H and He
-                idx_obs = np.where(ll.iloc[:,0] == ip+1)[0]
-                ax.scatter(ll.iloc[idx_obs,1], ll.iloc[idx_obs,2], label=linames[j], alpha=0.3, marker=next(markerlist), c=next(colorlist), s=20)
-            if i == len(Z_list)-3:
+            ip = i+2 # Shift to skip H and He
+            if i < len(Z_list)-2:
+                self._observations_layer(ax, catalog, Z_list[ip], listmarkers, listcolors, obs_layer=obs_layer, 
+                                         legend=(i == len(Z_list)-3))
+                if i == len(Z_list)-3:
                     ax.legend(ncol=7, loc='upper left', bbox_to_anchor=(1, 1), frameon=False, fontsize=7)
                     ax.set_xlabel('[Fe/H]', fontsize = 15)
-            if i < len(Z_list)-2:
-                ip = i+2 # Shift to skip H and He
                 ax.plot(FeH, Masses2[ip], color='black', linewidth=2)
                 ax.annotate(f"{Z_list[ip]}{Z_symb_list[Z_list[ip]]}", xy=(0.5, 0.92), xycoords='axes fraction', horizontalalignment='center', verticalalignment='top', fontsize=12, alpha=0.7)
                 ax.set_ylim(-5.9, 5.9)
@@ -720,56 +821,34 @@ class Plots(Setup):
         #fig.tight_layout(rect = [0.03, 0, 1, 1])
         fig.subplots_adjust(wspace=0., hspace=0.)
         plt.show(block=False)
-        plt.savefig(self._dir_out_figs + 'elem_obs.pdf', bbox_inches='tight')
+        fig.savefig(self._dir_out_figs + 'elem_obs.pdf', bbox_inches='tight', dpi=self.raster_dpi)
         return None
 
-    def observational_lelemZ_plot(self, figsiz = (15,10), c=3, yrange='zoom', romano10=False):
-        ''' yrange full to include all observational points'''
+    def observational_lelemZ_plot(self, figsiz = (15,10), c=3, yrange='zoom', romano10=False, obs_layer='points'):
+        ''' yrange full to include all observational points. obs_layer: see _observations_layer'''
         print('Starting observational_lelemZ()')
-        import glob
-        import itertools
         from matplotlib import pyplot as plt
         import matplotlib.ticker as ticker
         #plt.style.use(self._dir+'/galcem.mplstyle')
-        Mass_i = np.loadtxt(self._dir_out+'Mass_i.dat')
-        Z_list = np.unique(self.ZA_sorted[:,0])
+        Z_list = self._elements()
         Z_symb_list = self.IN.periodic['elemSymb'][Z_list] # name of elements for all isotopes
-        solar_norm_H = self.c_class.solarA09_vs_H_bymass[Z_list]
-        solar_norm_Fe = self.c_class.solarA09_vs_Fe_bymass[Z_list]
+        solar_norm_H = self.solarA09_vs_H_bymass[Z_list]
+        solar_norm_Fe = self.solarA09_vs_Fe_bymass[Z_list]
         Masses_i = []
         Masses2_i = []
-        Fe = np.sum(Mass_i[self._select_elemZ_idx(26), c+2:], axis=0)
-        H = np.sum(Mass_i[self._select_elemZ_idx(1), c+2:], axis=0)
+        Fe = self.run.element(26)[c:]
+        H = self.run.element(1)[c:]
         for i,val in enumerate(Z_list):
-            mass = np.sum(Mass_i[self._select_elemZ_idx(val), c+2:], axis=0)
-            Masses2_i.append(np.log10(np.divide(mass,Fe)) - solar_norm_Fe[val])
-            Masses_i.append(mass)
+            Masses2_i.append(self.run.ratio(val, 26)[c:] - solar_norm_Fe[val])
+            Masses_i.append(self.run.element(val)[c:])
         Masses = np.log10(np.divide(Masses_i, Fe))
         Masses2 = np.array(Masses2_i) 
         FeH = np.log10(np.divide(Fe, H)) - solar_norm_H[26]
-        nrow = 5
         ncol = 6
-        fig, axs = plt.subplots(nrow, ncol, figsize =figsiz)#, sharex=True)
-
-        path = self._dir + r'/input/observations/abund' # use your path
-        all_files = glob.glob(path + "/*.txt")
-        all_files = sorted(all_files, key=len)#list(np.sort(all_files))
+        nrow = min(5, int(np.ceil((len(Z_list)-2)/ncol))) # up to 30 elements after H and He
+        fig, axs = plt.subplots(nrow, ncol, figsize =figsiz, squeeze=False)#, sharex=True)
 
-        li = []
-        linames = []
-        elemZmin = 12
-        elemZmax = 12
-
-        for filename in all_files:
-            df = pd.read_table(filename, sep=',')
-            elemZmin0 = np.min(df.iloc[:,0])
-            elemZmax0 = np.max(df.iloc[:,0])
-            elemZmin = np.min([elemZmin0, elemZmin])
-            elemZmax = np.max([elemZmax0, elemZmax])
-            li.append(df)
-            linames.append(df['paperName'][0])
-
-        lenlist = len(li)
+        catalog = Abundance_Catalog.open(self._dir + r'/input/observations/abund')
         listmarkers = [r"$\mathcal{A}$",  r"$\mathcal{B}$",  r"$\mathcal{C}$",
                                     r"$\mathcal{D}$", r"$\mathcal{E}$", r"$\mathcal{F}$",
                                     r"$\mathcal{G}$", r"$\mathcal{H}$", r"$\mathcal{I}$",
@@ -801,16 +880,11 @@ class Plots(Setup):
             r10_elem_dict = dict(zip(r10_labels, r10_elem))
 
         for i, ax in enumerate(axs.flat):
-            colorlist = itertools.cycle(listcolors)
-            markerlist =itertools.cycle(listmarkers)
-            for j, ll in enumerate(li):
-                ip = i+2 # Shift to skip H and He
-                idx_obs = np.where(ll.iloc[:,0] == ip+1)[0]
-                ax.scatter(ll.iloc[idx_obs,1], ll.iloc[idx_obs,2], label=linames[j], alpha=0.3, marker=next(markerlist), c=next(colorlist), s=20)
-            if i == 0:
+            ip = i+2 # Shift to skip H and He
+            if i < len(Z_list)-2:
+                self._observations_layer(ax, catalog, Z_list[ip], listmarkers, listcolors, obs_layer=obs_layer, legend=(i == 0))
+                if i == 0:
                     ax.legend(ncol=7, loc='lower left', bbox_to_anchor=(-.2, 1.), frameon=False, fontsize=9)
-            if i < nrow*ncol:
-                ip = i+2 # Shift to skip H and He
                 ax.plot(FeH, Masses2[ip], color='black', linewidth=2)
                 ax.annotate(f"{Z_list[ip]}{Z_symb_list[Z_list[ip]]}", xy=(0.5, 0.92), xycoords='axes fraction', horizontalalignment='center', verticalalignment='top', fontsize=12, alpha=0.7)
                 if romano10 == True:
@@ -840,60 +914,30 @@ class Plots(Setup):
         #fig.tight_layout(rect=[0., 0, 1, .9])
         fig.subplots_adjust(wspace=0., hspace=0.)
         plt.show(block=False)
-        plt.savefig(self._dir_out_figs + 'elem_obs_lelemZ.pdf', bbox_inches='tight')
+        fig.savefig(self._dir_out_figs + 'elem_obs_lelemZ.pdf', bbox_inches='tight', dpi=self.raster_dpi)
         return None
     
-    def _extract_comparison(self, dir_val, _select_elemZ_idx, solar_norm_H, solar_norm_Fe, Z_list, c):
-        directory = 'runs/'+dir_val+'/'
-        Mass_i = np.loadtxt(directory+'Mass_i.dat')
-        Masses_i = []
-        Fe = np.sum(Mass_i[self._select_elemZ_idx(26), c+2:], axis=0)
-        H = np.sum(Mass_i[self._select_elemZ_idx(1), c+2:], axis=0)
-        FeH = np.log10(np.divide(Fe, H)) - solar_norm_H[26]
-        for i,val in enumerate(Z_list):
-            mass = np.sum(Mass_i[self._select_elemZ_idx(val), c+2:], axis=0)
-            Masses_i.append(np.log10(np.divide(mass,Fe)) - solar_norm_Fe[val])
-        Masses = np.array(Masses_i) 
-        return FeH, Masses
-    
-    def observational_helemZ_dir_comparison_plot(self, figsiz = (15,10), c=3, yrange='full', 
+    def observational_helemZ_dir_comparison_plot(self, figsiz = (15,10), c=3, yrange='full', obs_layer='points',
                                             romano10=False, directories={'SMBH zap':'20220623_zap_2Myr','MRSN':'20220614_MRSN_massrange_2Myr'},
                                             Z_list=[26,38,39,40,41,42,44,46,47,56,57,58,59,
                                                     60,62,63,64,66,67,68,70,72,76,77,79,82]):
-        ''' yrange full to include all observational points'''
+        ''' yrange full to include all observational points. obs_layer: see _observations_layer'''
         print('observational_helemZ_dir_comparison()')
-        import glob
         import itertools
         from matplotlib import pyplot as plt
         import matplotlib.ticker as ticker
         #plt.style.use(self._dir+'/galcem.mplstyle')
         Z_list = np.array(Z_list)
         Z_symb_list = self.IN.periodic['elemSymb'][Z_list] # name of elements for all isotopes
-        solar_norm_H = self.c_class.solarA09_vs_H_bymass[Z_list]
-        solar_norm_Fe = self.c_class.solarA09_vs_Fe_bymass[Z_list]
+        solar_norm_H = self.solarA09_vs_H_bymass[Z_list]
+        solar_norm_Fe = self.solarA09_vs_Fe_bymass[Z_list]
+        # The tracks of every directory, extracted in parallel and cached in the run directories
+        comparison = Run_Comparison(['runs/'+directories[d]+'/' for d in directories])
         plot_pairs = {}
         for d in directories:
-            plot_pairs[d] = self._extract_comparison(directories[d], self._select_elemZ_idx, solar_norm_H, solar_norm_Fe, Z_list, c)
-
-        path = self._dir + r'/input/observations/abund' # use your path
-        all_files = glob.glob(path + "/*.txt")
-        all_files = sorted(all_files, key=len)#list(np.sort(all_files))
-
-        li = []
-        linames = []
-        elemZmin = 12
-        elemZmax = 12
-
-        for filename in all_files:
-            df = pd.read_table(filename, sep=',')
-            elemZmin0 = np.min(df.iloc[:,0])
-            elemZmax0 = np.max(df.iloc[:,0])
-            elemZmin = np.min([elemZmin0, elemZmin])
-            elemZmax = np.max([elemZmax0, elemZmax])
-            li.append(df)
-            linames.append(df['paperName'][0])
+            plot_pairs[d] = comparison.tracks('runs/'+directories[d]+'/', Z_list, solar_norm_H, solar_norm_Fe, c=c)
 
-        lenlist = len(li)
+        catalog = Abundance_Catalog.open(self._dir + r'/input/observations/abund')
         listmarkers = [r"$\mathcal{A}$",  r"$\mathcal{B}$",  r"$\mathcal{C}$",
                                     r"$\mathcal{D}$", r"$\mathcal{E}$", r"$\mathcal{F}$",
                                     r"$\mathcal{G}$", r"$\mathcal{H}$", r"$\mathcal{I}$",
@@ -929,14 +973,9 @@ class Plots(Setup):
         fig, axs = plt.subplots(nrow, ncol, figsize =figsiz)#, sharex=True)
         
         for i, ax in enumerate(axs.flat):
-            colorlist = itertools.cycle(listcolors)
-            markerlist = itertools.cycle(listmarkers)
             linestylelist = itertools.cycle(['-','--',':','-.']) 
-            for j, ll in enumerate(li):
-                if i < len(Z_list):
-                    ip = Z_list[i]#+2 # Shift to skip H and He
-                    idx_obs = np.where(ll.iloc[:,0] == ip)[0]
-                    ax.scatter(ll.iloc[idx_obs,1], ll.iloc[idx_obs,2], label=linames[j], alpha=0.3, marker=next(markerlist), c=next(colorlist), s=20)
+            if i < len(Z_list):
+                self._observations_layer(ax, catalog, Z_list[i], listmarkers, listcolors, obs_layer=obs_layer, legend=(i == 0))
             if i == 0:
                     ax.legend(ncol=7, loc='lower left', bbox_to_anchor=(-.2, 1.), frameon=False, fontsize=9)
             if i < len(Z_list):
@@ -975,55 +1014,33 @@ class Plots(Setup):
         fig.tight_layout(rect=[0., 0, 1, .9])
         fig.subplots_adjust(wspace=0., hspace=0.)
         plt.show(block=False)
-        plt.savefig(self._dir_out_figs + 'elem_obs_helemZ_dir_comparison.pdf', bbox_inches='tight')
+        fig.savefig(self._dir_out_figs + 'elem_obs_helemZ_dir_comparison.pdf', bbox_inches='tight', dpi=self.raster_dpi)
         return None
     
-    def obs_lZ_plot(self, figsiz = (21,7), c=3):
+    def obs_lZ_plot(self, figsiz = (21,7), c=3, obs_layer='points'):
         print('Starting observational_lZ()')
-        import glob
-        import itertools
         from matplotlib import pyplot as plt
         import matplotlib.ticker as ticker
         #plt.style.use(self._dir+'/galcem.mplstyle')
-        Mass_i = np.loadtxt(self._dir_out+'Mass_i.dat')
-        Z_list = np.unique(self.ZA_sorted[:,0])
+        Z_list = self._elements()
         Z_symb_list = self.IN.periodic['elemSymb'][Z_list] # name of elements for all isotopes
-        solar_norm_H = self.c_class.solarA09_vs_H_bymass[Z_list]
-        solar_norm_Fe = self.c_class.solarA09_vs_Fe_bymass[Z_list]
+        solar_norm_H = self.solarA09_vs_H_bymass[Z_list]
+        solar_norm_Fe = self.solarA09_vs_Fe_bymass[Z_list]
         Masses_i = []
         Masses2_i = []
-        Fe = np.sum(Mass_i[self._select_elemZ_idx(26), c+2:], axis=0)
-        H = np.sum(Mass_i[self._select_elemZ_idx(1), c+2:], axis=0)
+        Fe = self.run.element(26)[c:]
+        H = self.run.element(1)[c:]
         for i,val in enumerate(Z_list):
-            mass = np.sum(Mass_i[self._select_elemZ_idx(val), c+2:], axis=0)
-            Masses2_i.append(np.log10(np.divide(mass,Fe)) - solar_norm_Fe[val])
-            Masses_i.append(mass)
+            Masses2_i.append(self.run.ratio(val, 26)[c:] - solar_norm_Fe[val])
+            Masses_i.append(self.run.element(val)[c:])
         Masses = np.log10(np.divide(Masses_i, Fe))
         Masses2 = np.array(Masses2_i) 
         FeH = np.log10(np.divide(Fe, H)) - solar_norm_H[26]
-        nrow = 4
         ncol = 7
-        fig, axs = plt.subplots(nrow, ncol, figsize =figsiz)#, sharex=True)
-
-        path = self._dir + r'/input/observations/abund' # use your path
-        all_files = glob.glob(path + "/*.txt")
-        all_files = sorted(all_files, key=len)
-
-        li = []
-        linames = []
-        elemZmin = 12
-        elemZmax = 12
-
-        for filename in all_files:
-            df = pd.read_table(filename, sep=',')
-            elemZmin0 = np.min(df.iloc[:,0])
-            elemZmax0 = np.max(df.iloc[:,0])
-            elemZmin = np.min([elemZmin0, elemZmin])
-            elemZmax = np.max([elemZmax0, elemZmax])
-            li.append(df)
-            linames.append(df['paperName'][0])
+        nrow = min(4, int(np.ceil((len(Z_list)-2)/ncol))) # up to 28 elements after H and He
+        fig, axs = plt.subplots(nrow, ncol, figsize =figsiz, squeeze=False)#, sharex=True)
 
-        lenlist = len(li)
+        catalog = Abundance_Catalog.open(self._dir + r'/input/observations/abund')
         listmarkers = [r"$\mathcal{A}$",  r"$\mathcal{B}$",  r"$\mathcal{C}$",
                                     r"$\mathcal{D}$", r"$\mathcal{E}$", r"$\mathcal{F}$",
                                     r"$\mathcal{G}$", r"$\mathcal{H}$", r"$\mathcal{I}$",
@@ -1042,19 +1059,13 @@ class Plots(Setup):
         '#8ed5f0', '#660033', '#b20058', '#e50072', '#ff3298', '#ff7fbf',
         '#252525', '#525252', '#737373', '#969696', '#bdbdbd', '#d9d9d9',
         '#7f0000', '#cc0000', '#ff4444', '#ff7f7f', '#ffb2b2', '#995100']
-        lenlist = len(li)
 
         for i, ax in enumerate(axs.flat):
-            colorl = itertools.cycle(listcolors)
-            markerl = itertools.cycle(listmarkers)
-            for j, ll in enumerate(li):
-                ip = i+2 # Shift to skip H and He
-                idx_obs = np.where(ll.iloc[:,0] == ip+1)[0]
-                ax.scatter(ll.iloc[idx_obs,1], ll.iloc[idx_obs,2], label=linames[j], alpha=0.3, marker=next(markerl), c=next(colorl), s=20)
-            if i == 0:
+            ip = i+2 # Shift to skip H and He
+            if i < len(Z_list)-2:
+                self._observations_layer(ax, catalog, Z_list[ip], listmarkers, listcolors, obs_layer=obs_layer, legend=(i == 0))
+                if i == 0:
                     ax.legend(ncol=7, loc='lower left', bbox_to_anchor=(-0.2, 1.05), frameon=False, fontsize=9)
-            if i < nrow*ncol:
-                ip = i+2 # Shift to skip H and He
                 ax.plot(FeH, Masses2[ip], color='black', linewidth=2)
                 ax.annotate(f"{Z_list[ip]}{Z_symb_list[Z_list[ip]]}", xy=(0.5, 0.92), xycoords='axes fraction', horizontalalignment='center', verticalalignment='top', fontsize=12, alpha=0.7)
                 ax.set_ylim(-4.9, 4.9)
@@ -1080,31 +1091,22 @@ class Plots(Setup):
         #fig.tight_layout(rect=[0.0, 0, 1, .8])
         fig.subplots_adjust(wspace=0., hspace=0.)
         plt.show(block=False)
-        plt.savefig(self._dir_out_figs + 'elem_obs_lZ.pdf', bbox_inches='tight')
+        fig.savefig(self._dir_out_figs + 'elem_obs_lZ.pdf', bbox_inches='tight', dpi=self.raster_dpi)
         return None
     
     def obs_table(self, up_to_elemZ=30):
-        import glob
         elemZ = np.arange(3,up_to_elemZ+1)
         Z_symb_list = self.IN.periodic['elemSymb'][elemZ]
         
-        path = self._dir + r'/input/observations/abund' # use your path
-        all_files = glob.glob(path + "/*.txt")
-        all_files = sorted(all_files, key=len)#list(np.sort(all_files))
-
-        li = []
-        linames = []
-        for filename in all_files:
-            df = pd.read_table(filename, sep=',')
-            li.append(df)
-            df['paperName'] = df['paperName'].str.replace('&','-and-')
-            linames.append(df['paperName'][0])
+        catalog = Abundance_Catalog.open(self._dir + r'/input/observations/abund')
         
         obs_dict = {}
-        for en, paperName in enumerate(linames):
+        for en, paperName in enumerate(catalog.surveys):
+            paperName = paperName.replace('&','-and-')
+            survey_elemZ = catalog.survey_elements(en)
             elemZ_yn = []
             for eZ in elemZ:
-                if eZ in np.unique(li[en]['elemZ']):
+                if eZ in survey_elemZ:
                     elemZ_yn.append(' $\\times$ ')
                 else:
                     if not eZ == 26:
@@ -1116,4 +1118,42 @@ class Plots(Setup):
         save_obs_dict['elemZ'] = Z_symb_list.to_numpy()
         save_obs_dict_to_csv = save_obs_dict.T.iloc[::-1]
         save_obs_dict_to_csv['return'] = ' \\\\'
-        save_obs_dict_to_csv.to_csv(self._dir_out + 'observationtable.csv', sep='&')
\ No newline at end of file
+        save_obs_dict_to_csv.to_csv(self._dir_out + 'observationtable.csv', sep='&')
+
+
+_plots = None # the Plots of a worker process of Plots.plots()
+
+@functools.lru_cache(maxsize=None)
+def marker_path(marker):
+    '''
+    Path of a scatter marker (of 1 point), and its line width as in ax.scatter.
+    Parsed once: mathtext markers are typeset on every call of ax.scatter
+    '''
+    from matplotlib import rcParams
+    from matplotlib.markers import MarkerStyle
+    style = MarkerStyle(marker)
+    linewidth = rcParams['patch.linewidth'] if style.is_filled() else rcParams['lines.linewidth']
+    return style.get_path().transformed(style.get_transform()), linewidth
+
+def attach_plots(plots):
+    '''Process pool initializer of Plots.plots(): Agg backend, and the Plots of the run'''
+    import matplotlib
+    matplotlib.use('Agg')
+    global _plots
+    _plots = plots
+
+
+def render_figure(label, name, kwargs, plots=None):
+    '''Draws one figure of Plots.plots(): (label, time [s], pid, error)'''
+    import contextlib
+    from matplotlib import pyplot as plt
+    plots = _plots if plots is None else plots
+    tic = time.perf_counter()
+    error = ''
+    try:
+        with contextlib.redirect_stdout(None):
+            getattr(plots, name)(**kwargs)
+    except Exception as e:
+        error = repr(e)
+    plt.close('all')
+    return label, time.perf_counter() - tic, os.getpid(), error
@@ -0,0 +1,398 @@
+""""""""""""""""""""""""""""""""""""""""""""""""
+"                                              "
+"          BINARY OUTPUT OF THE RUNS           "
+"   Chunked, compressed (isotopes x timesteps) "
+"   arrays of a run, with the ZA, time and     "
+"   input-hash metadata, written at the end    "
+"   of the run or streamed during evolve,      "
+"   and the converter from/to the text files   "
+"                                              "
+" LIST OF CLASSES:                             "
+"    __        Run_Store                       "
+"    __        Run_Writer                      "
+"    __        RunResult                       "
+"                                              "
+""""""""""""""""""""""""""""""""""""""""""""""""
+
+import os
+import json
+import zlib
+import pickle
+import numpy as np
+import pandas as pd
+from .classes.inputs import Auxiliary
+
+RUN_STORE_VERSION = 1
+RUN_STORE_DIR = 'run.gcs/'
+TEXT_HEADERS = {
+    'Mass_i': 'elemZ    elemA    masses[Msun] # of every isotope for every timestep',
+    'X_i': 'elemZ    elemA    X_i # abundance mass ratios of every isotope for every timestep (normalized to solar, Asplund et al., 2009)'}
+
+
+def input_hash(IN):
+    '''sha1 of every Inputs attribute, DataFrames and arrays by their content'''
+    import hashlib
+    key = hashlib.sha1()
+    for name in sorted(IN.__dict__):
+        value = IN.__dict__[name]
+        if isinstance(value, pd.DataFrame):
+            value = pd.util.hash_pandas_object(value, index=True).to_numpy()
+        if isinstance(value, np.ndarray):
+            value = (value.shape, value.dtype.str, value.tobytes())
+        key.update(('%s=%r;'%(name, value)).encode())
+    return key.hexdigest()
+
+
+class Run_Store:
+    '''
+    Binary output of a run, in <run directory>/run.gcs/:
+    meta.json (ZA_sorted, time, input hash, and the shape, dtype, chunks
+    and chunk index of every array) and one <name>.bin file per array.
+
+    Every array (Mass_i, X_i, W_i_comp.<channel>, and phys, whose rows are 
+    the columns of phys.dat) is (rows x timesteps), cut in chunks of 
+    (chunks[0] rows x chunks[1] timesteps), each byte-shuffled and 
+    zlib-compressed, so that an isotope or a timestep is read from one 
+    row or one column of chunks (read).
+    A run streamed by Run_Writer can be opened while it is computing:
+    n_steps timesteps are readable, and refresh() updates them.
+
+    path [str]: run directory
+    '''
+    chunks = (64, 128)
+    level = 1 # zlib compression level
+
+    def __init__(self, path):
+        self.run_dir = path if path[-1]=='/' else path+'/'
+        self.path = self.run_dir + RUN_STORE_DIR
+        self.refresh()
+
+    def refresh(self):
+        '''(Re)reads meta.json, e.g. for the new timesteps of a run still computing'''
+        with open(self.path + 'meta.json') as f:
+            self.meta = json.load(f)
+        self.ZA_sorted = np.array(self.meta['ZA_sorted'], dtype=int).reshape(-1, 2)
+        self.time = np.array(self.meta['time'])
+        self.input_hash = self.meta['input_hash']
+        self.arrays = self.meta['arrays']
+        self.n_steps = self.meta.get('n_steps', len(self.time))
+        self.complete = self.meta.get('complete', True)
+
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+
+    @staticmethod
+    def exists(path):
+        path = path if path[-1]=='/' else path+'/'
+        return os.path.isfile(path + RUN_STORE_DIR + 'meta.json')
+
+    @staticmethod
+    def encode(block, level):
+        block = np.ascontiguousarray(block)
+        shuffled = block.view(np.uint8).reshape(-1, block.dtype.itemsize).T
+        return zlib.compress(np.ascontiguousarray(shuffled).tobytes(), level)
+
+    @staticmethod
+    def decode(data, shape, dtype):
+        dtype = np.dtype(dtype)
+        shuffled = np.frombuffer(zlib.decompress(data), dtype=np.uint8)
+        return np.ascontiguousarray(shuffled.reshape(dtype.itemsize, -1).T).view(dtype).reshape(shape)
+
+    @classmethod
+    def write(cls, path, arrays, ZA_sorted, time, input_hash=None, source='galcem', labels={}):
+        '''
+        Writes the (rows x timesteps) arrays {name: array} of a run at once.
+        The arrays are read one chunk at a time (np.memmap or Xi_v when
+        IN.Xi_lazy are never loaded whole)
+        '''
+        writer = Run_Writer(path, arrays, ZA_sorted, time, input_hash=input_hash, 
+                            source=source, labels=labels, batch=cls.chunks[1])
+        writer.close()
+        return cls(path)
+
+    def chunk(self, f, name, I, J):
+        '''Chunk (I, J) of the array name, from its open .bin file f'''
+        offset, nbytes, rows, cols = self.arrays[name]['index']['%d.%d'%(I, J)]
+        f.seek(offset)
+        return self.decode(f.read(nbytes), (rows, cols), self.arrays[name]['dtype'])
+
+    def read(self, name, isotopes=slice(None), steps=slice(None)):
+        '''
+        Array name, or its rows isotopes and columns steps (int, slice or
+        index array) among the n_steps written, decompressing only the 
+        chunks they fall in
+        '''
+        meta = self.arrays[name]
+        ci, ct = meta['chunks']
+        rows = np.arange(meta['shape'][0])[isotopes]
+        cols = np.arange(self.n_steps)[steps]
+        out = np.empty((np.size(rows), np.size(cols)), dtype=meta['dtype'])
+        r, c = np.atleast_1d(rows), np.atleast_1d(cols)
+        with open(self.path + meta['file'], 'rb') as f:
+            for I in np.unique(r // ci):
+                in_I = np.where(r // ci == I)[0]
+                for J in np.unique(c // ct):
+                    in_J = np.where(c // ct == J)[0]
+                    block = self.chunk(f, name, I, J)
+                    out[np.ix_(in_I, in_J)] = block[np.ix_(r[in_I] - I*ci, c[in_J] - J*ct)]
+        return out.reshape(np.shape(rows) + np.shape(cols))
+
+    def phys(self):
+        '''The columns of phys.dat, over the n_steps written'''
+        return pd.DataFrame(self.read('phys').T, columns=self.arrays['phys']['rows'])
+
+    def W_i_comp(self):
+        '''{channel: W_i_comp array}, as W_i_comp.pkl'''
+        return {name.split('.', 1)[1]: self.read(name)
+                for name in self.arrays if name.startswith('W_i_comp.')}
+
+    def legacy(self, name):
+        '''Array name in the layout of the text files: the ZA_sorted columns, then one column per timestep'''
+        return np.column_stack((self.ZA_sorted, self.read(name)))
+
+    def export_text(self, outdir=None):
+        '''Writes the legacy Mass_i.dat, X_i.dat and W_i_comp.pkl'''
+        outdir = self.run_dir if outdir is None else outdir
+        for name, header in TEXT_HEADERS.items():
+            if name in self.arrays:
+                np.savetxt(outdir + name + '.dat', self.legacy(name),
+                           fmt=' '.join(['%5.i']*2 + ['%12.4e']*self.n_steps),
+                           header=header)
+        W_i_comp = self.W_i_comp()
+        if W_i_comp:
+            pickle.dump(W_i_comp, open(outdir + 'W_i_comp.pkl', 'wb'))
+
+
+class Run_Writer:
+    '''
+    Writes the arrays of a run to its Run_Store one batch of timesteps 
+    at a time: append(n) once the timestep n is final in every array, 
+    and close() at the end of the run. Every batch is one column of chunks,
+    appended to the .bin files, after which meta.json is replaced, so that 
+    a Run_Store opened meanwhile sees the batches written so far 
+    (n_steps, complete=False).
+
+    path [str]: run directory
+    arrays [dict]: {name: (rows x timesteps) array}, read at every write, 
+        or a function of the steps (slice) returning those columns,
+        whose row names are in labels
+    batch [int]: timesteps per write, i.e. the width of the chunks
+    '''
+    def __init__(self, path, arrays, ZA_sorted, time, input_hash=None, 
+                 source='galcem', labels={}, batch=128):
+        self.run_dir = path if path[-1]=='/' else path+'/'
+        self.path = self.run_dir + RUN_STORE_DIR
+        os.makedirs(self.path, exist_ok=True)
+        self.arrays = arrays
+        self.batch = int(batch)
+        self.n_steps = 0
+        self.meta = {'version': RUN_STORE_VERSION, 'source': source, 'input_hash': input_hash,
+                     'ZA_sorted': np.asarray(ZA_sorted).astype(int).tolist(),
+                     'time': np.asarray(time, dtype=float).tolist(), 
+                     'n_steps': 0, 'complete': False, 'arrays': {}}
+        for name, array in arrays.items():
+            if callable(array):
+                shape, dtype = (len(labels[name]), len(time)), np.dtype(float)
+            else:
+                shape, dtype = array.shape, np.dtype(array.dtype)
+            self.meta['arrays'][name] = {'file': name + '.bin', 'shape': list(shape), 
+                                         'dtype': dtype.str, 'chunks': [Run_Store.chunks[0], self.batch], 
+                                         'index': {}}
+            if name in labels:
+                self.meta['arrays'][name]['rows'] = list(labels[name])
+            open(self.path + name + '.bin', 'wb').close()
+        self.write_meta()
+
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+
+    def write_meta(self):
+        self.meta['n_steps'] = self.n_steps
+        with open(self.path + 'meta.json.tmp', 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(self.path + 'meta.json.tmp', self.path + 'meta.json')
+
+    def append(self, n):
+        '''The timesteps up to n are final: writes every full batch among them'''
+        while n + 1 - self.n_steps >= self.batch:
+            self.flush(self.n_steps + self.batch)
+
+    def flush(self, upto):
+        '''Writes the timesteps from n_steps to upto (one column of chunks)'''
+        steps = slice(self.n_steps, upto)
+        J = self.n_steps // self.batch
+        for name, array in self.arrays.items():
+            meta = self.meta['arrays'][name]
+            ci = meta['chunks'][0]
+            columns = array(steps) if callable(array) else array[:, steps]
+            with open(self.path + meta['file'], 'ab') as f:
+                for i0 in range(0, meta['shape'][0], ci):
+                    block = np.asarray(columns[i0:i0+ci], dtype=meta['dtype'])
+                    data = Run_Store.encode(block, Run_Store.level)
+                    meta['index']['%d.%d'%(i0//ci, J)] = [f.tell(), len(data)] + list(block.shape)
+                    f.write(data)
+        self.n_steps = upto
+        self.write_meta()
+
+    def close(self):
+        '''Writes the remaining timesteps, and marks the run complete'''
+        n_time = len(self.meta['time'])
+        while self.n_steps < n_time:
+            self.flush(min(self.n_steps + self.batch, n_time))
+        self.meta['complete'] = True
+        self.write_meta()
+
+
+class RunResult:
+    '''
+    Outputs of a run directory, opened once and read lazily: phys, 
+    Mass_i, X_i and W_i_comp are read from the Run_Store (or from the 
+    text files of older runs) when first used, and kept, like the element 
+    masses (element) and the abundance ratios (ratio) computed from them.
+    The chunks of the Run_Store are compressed, so the arrays are 
+    decompressed once rather than memory-mapped.
+    RunResult.open(run_dir) returns the same instance for a run directory
+    until its outputs are rewritten, so that Plots and analysis code share it.
+
+    run_dir [str]: run directory
+    '''
+    _runs = {} # absolute run directory -> (modification time of the outputs, RunResult)
+
+    def __init__(self, run_dir):
+        self.run_dir = run_dir if run_dir[-1]=='/' else run_dir+'/'
+        self.store = Run_Store(self.run_dir) if Run_Store.exists(self.run_dir) else None
+        self._cache = {}
+
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+
+    @classmethod
+    def open(cls, run_dir):
+        '''The RunResult of run_dir, shared until the run is rewritten'''
+        run_dir = run_dir if run_dir[-1]=='/' else run_dir+'/'
+        key = os.path.abspath(run_dir)
+        stamp = cls.stamp(run_dir)
+        if key not in cls._runs or cls._runs[key][0] != stamp:
+            cls._runs[key] = (stamp, cls(run_dir))
+        return cls._runs[key][1]
+
+    @staticmethod
+    def stamp(run_dir):
+        paths = [run_dir + RUN_STORE_DIR + 'meta.json', run_dir + 'phys.dat']
+        return tuple(os.path.getmtime(path) if os.path.isfile(path) else None for path in paths)
+
+    def cached(self, key, function, *args):
+        if key not in self._cache:
+            self._cache[key] = function(*args)
+        return self._cache[key]
+
+    @property
+    def phys(self):
+        '''The columns of phys.dat (DataFrame)'''
+        if self.store is not None and 'phys' in self.store.arrays:
+            return self.cached('phys', self.store.phys)
+        return self.cached('phys', lambda: pd.read_csv(self.run_dir + 'phys.dat', sep=',', comment='#'))
+
+    @property
+    def time(self):
+        return self.phys['time[Gyr]'].to_numpy()
+
+    @property
+    def ZA_sorted(self):
+        if self.store is not None:
+            return self.store.ZA_sorted
+        return self.legacy('Mass_i')[:,:2].astype(int)
+
+    def array(self, name):
+        '''(isotopes x timesteps) array name (Mass_i or X_i)'''
+        if self.store is not None:
+            return self.cached(name, self.store.read, name)
+        return self.legacy(name)[:,2:]
+
+    @property
+    def Mass_i(self):
+        return self.array('Mass_i')
+
+    @property
+    def X_i(self):
+        return self.array('X_i')
+
+    @property
+    def W_i_comp(self):
+        if self.store is not None:
+            return self.cached('W_i_comp', self.store.W_i_comp)
+        return self.cached('W_i_comp', load_W_i_comp, self.run_dir)
+
+    def legacy(self, name):
+        '''Array name in the layout of the text files: the ZA_sorted columns, then one column per timestep'''
+        if self.store is not None:
+            return self.cached(('legacy', name), self.store.legacy, name)
+        return self.cached(('legacy', name), np.loadtxt, self.run_dir + name + '.dat')
+
+    def isotope(self, elemZ, elemA):
+        '''Mass of the isotope (elemZ, elemA) at every timestep'''
+        i = np.where((self.ZA_sorted[:,0] == elemZ) & (self.ZA_sorted[:,1] == elemA))[0]
+        return self.Mass_i[i[0]]
+
+    def element(self, elemZ):
+        '''Mass of the element elemZ (all its isotopes) at every timestep'''
+        return self.cached(('element', elemZ), lambda: np.sum(
+                           self.Mass_i[np.where(self.ZA_sorted[:,0] == elemZ)[0]], axis=0))
+
+    def ratio(self, elemZ, elemZ_ref=26):
+        '''
+        log10 of the mass ratio of the elements elemZ and elemZ_ref, at every 
+        timestep: [X/Fe] (or [X/H] for elemZ_ref=1) once the solar value is subtracted
+        '''
+        return self.cached(('ratio', elemZ, elemZ_ref), lambda: np.log10(
+                           np.divide(self.element(elemZ), self.element(elemZ_ref))))
+
+
+def convert_run(run_dir):
+    '''
+    Run_Store of a run directory saved as text (Mass_i.dat, X_i.dat,
+    W_i_comp.pkl, phys.dat and inputs.pkl). The arrays keep the 4
+    significant digits of the text files
+    '''
+    run_dir = run_dir if run_dir[-1]=='/' else run_dir+'/'
+    arrays = {}
+    for name in TEXT_HEADERS:
+        if os.path.isfile(run_dir + name + '.dat'):
+            table = np.loadtxt(run_dir + name + '.dat')
+            ZA_sorted, arrays[name] = table[:,:2], table[:,2:]
+    if os.path.isfile(run_dir + 'W_i_comp.pkl'):
+        W_i_comp = pickle.load(open(run_dir + 'W_i_comp.pkl', 'rb'))
+        arrays.update({'W_i_comp.' + ch: np.asarray(W) for ch, W in W_i_comp.items()})
+    phys = pd.read_csv(run_dir + 'phys.dat', sep=',', comment='#')
+    try:
+        IN = pickle.load(open(run_dir + 'inputs.pkl', 'rb'))
+        hash_IN = input_hash(IN)
+    except Exception:
+        hash_IN = None
+    return Run_Store.write(run_dir, arrays, ZA_sorted, phys['time[Gyr]'],
+                           input_hash=hash_IN, source='text')
+
+
+def load_W_i_comp(run_dir):
+    '''W_i_comp of a run, from the Run_Store or W_i_comp.pkl'''
+    if Run_Store.exists(run_dir):
+        return Run_Store(run_dir).W_i_comp()
+    return pickle.load(open(run_dir + 'W_i_comp.pkl', 'rb'))
+
+
+if __name__ == '__main__':
+    # python -m galcem.runstore convert|export <run directory> [...]
+    import sys
+    for run_dir in sys.argv[2:]:
+        run_dir = run_dir if run_dir[-1]=='/' else run_dir+'/'
+        if sys.argv[1] == 'convert':
+            store = convert_run(run_dir)
+            print('%s: %s'%(store.path, ', '.join(store.arrays)))
+        elif sys.argv[1] == 'export':
+            Run_Store(run_dir).export_text()
+            print('%s: text files written'%run_dir)
+        else:
+            raise ValueError('Usage: python -m galcem.runstore convert|export <run directory> [...]')
@@ -0,0 +1,59 @@
+""""""""""""""""""""""""""""""""""""""""""""""""
+"                                              "
+"        OBSERVATIONAL LAYER OF A PANEL        "
+"   One collection of the points of all the    "
+"   surveys of a panel, each with its marker   "
+"   (imported by plottingtool with matplotlib) "
+"                                              "
+" LIST OF CLASSES:                             "
+"    __        Survey_Layer                    "
+"                                              "
+""""""""""""""""""""""""""""""""""""""""""""""""
+
+import numpy as np
+from matplotlib import artist as martist
+from matplotlib.collections import PathCollection
+from matplotlib.transforms import IdentityTransform
+
+
+class Survey_Layer(PathCollection):
+    '''
+    The points of several surveys as one artist of the axes, drawn survey
+    by survey in their order. Every survey is drawn as the markers of one
+    path and color (renderer.draw_markers): the backends stamp the marker
+    once per survey, where a collection with one path per point has every
+    path written out in the pdf.
+
+    surveys: list of (path, linewidth, color, offsets [N,2]) in data coordinates,
+    the other kwargs are those of PathCollection (sizes, alpha, zorder...)
+    '''
+    def __init__(self, surveys, ax, **kwargs):
+        surveys = [s for s in surveys if len(s[3])]
+        offsets = np.concatenate([s[3] for s in surveys]) if surveys else np.empty((0, 2))
+        super().__init__([s[0] for s in surveys], offsets=offsets, offset_transform=ax.transData,
+                         facecolors=[s[2] for s in surveys], linewidths=[s[1] for s in surveys],
+                         edgecolors='face', **kwargs)
+        self.set_transform(IdentityTransform())
+        bounds = np.cumsum([0] + [len(s[3]) for s in surveys])
+        self._surveys = [(path, linewidth, color, slice(start, stop)) for (path, linewidth, color, _), start, stop
+                         in zip(surveys, bounds[:-1], bounds[1:])]
+
+    @martist.allow_rasterization
+    def draw(self, renderer):
+        if not self.get_visible():
+            return None
+        paths, offsets = self.get_paths(), self.get_offsets()
+        try:
+            for path, linewidth, color, points in self._surveys:
+                self.set_paths([path])
+                self.set_offsets(offsets[points])
+                self.set_facecolor(color)
+                self.set_linewidth(linewidth)
+                super().draw(renderer)
+        finally:
+            self.set_paths(paths)
+            self.set_offsets(offsets)
+            self.set_facecolor([s[2] for s in self._surveys])
+            self.set_linewidth([s[1] for s in self._surveys])
+        self.stale = False
+        return None
@@ -0,0 +1,238 @@
+""""""""""""""""""""""""""""""""""""""""""""""""
+"                                              "
+"        PARAMETER SWEEPS OF ONEZONE RUNS      "
+"     Runs OneZone for many sets of Inputs     "
+"    in a process pool, with the compiled      "
+"    tables loaded once in shared memory       "
+"                                              "
+" LIST OF CLASSES:                             "
+"    __        Shared_Tables                   "
+"    __        Sweep                           "
+"                                              "
+""""""""""""""""""""""""""""""""""""""""""""""""
+
+import os
+import copy
+import time
+import itertools
+import numpy as np
+import pandas as pd
+from .classes.inputs import Auxiliary, SHARED_TABLES
+
+
+class Shared_Tables:
+    '''
+    Arrays of the compiled tables in multiprocessing.shared_memory blocks.
+
+    The parent process publishes every table once (publish), and passes
+    the picklable spec to the workers, which map the same blocks with no
+    copy (attach) and register them in SHARED_TABLES, where
+    yi.load_yield_table and morph.load_lifetime_tables look them up
+    by the path of the file they were compiled to.
+    The parent unlinks the blocks when the sweep is over (unlink).
+    '''
+    def __init__(self):
+        self.blocks = [] # SharedMemory instances, which must outlive the arrays
+        self.spec = {} # path -> {name: (block name, shape, dtype)}
+        self.tables = {} # path -> {name: array}
+
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+
+    def publish(self, path, arrays):
+        '''Copies the arrays of the table compiled to path into new shared memory blocks'''
+        from multiprocessing import shared_memory
+        path = os.path.abspath(path)
+        if path in self.spec:
+            return
+        self.spec[path], self.tables[path] = {}, {}
+        for name, array in arrays.items():
+            array = np.asarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            self.blocks.append(block)
+            view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            view[...] = array
+            self.spec[path][name] = (block.name, array.shape, array.dtype.str)
+            self.tables[path][name] = view
+
+    @classmethod
+    def attach(cls, spec):
+        '''Maps the blocks of spec (read-only) and registers them in SHARED_TABLES'''
+        from multiprocessing import shared_memory
+        shared = cls()
+        shared.spec = spec
+        for path, arrays in spec.items():
+            shared.tables[path] = {}
+            for name, (block_name, shape, dtype) in arrays.items():
+                block = shared_memory.SharedMemory(name=block_name)
+                shared.blocks.append(block)
+                view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+                view.flags.writeable = False
+                shared.tables[path][name] = view
+        SHARED_TABLES.update(shared.tables)
+        return shared
+
+    def nbytes(self):
+        return sum(block.size for block in self.blocks)
+
+    def unlink(self):
+        '''Releases the blocks (parent process only)'''
+        for path in self.tables:
+            SHARED_TABLES.pop(path, None)
+        self.tables = {}
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+_shared_tables = None # the Shared_Tables of a worker process
+
+def attach_tables(spec):
+    '''Process pool initializer: the tables of every worker come from shared memory'''
+    global _shared_tables
+    _shared_tables = Shared_Tables.attach(spec)
+
+
+def run_onezone(IN, outdir):
+    '''
+    One run of the sweep, in a worker: OneZone(IN).main() with its
+    standard output in outdir/stdout.txt. Returns the timings [s]
+    '''
+    import contextlib
+    from .onezone import OneZone
+    os.makedirs(outdir, exist_ok=True)
+    timings = {'pid': os.getpid()}
+    with open(os.path.join(outdir, 'stdout.txt'), 'w') as stdout:
+        with contextlib.redirect_stdout(stdout):
+            tic = time.perf_counter()
+            oz = OneZone(IN, outdir=outdir)
+            timings['setup[s]'] = time.perf_counter() - tic
+            oz.file1 = open(oz._dir_out + "Terminal_output.txt", "w")
+            oz.save_inputs()
+            tic = time.perf_counter()
+            oz.evolve()
+            timings['evolve[s]'] = time.perf_counter() - tic
+            tic = time.perf_counter()
+            oz.save_outputs()
+            timings['output[s]'] = time.perf_counter() - tic
+            oz.file1.close()
+    return timings
+
+
+class Sweep:
+    """
+    Sweep class
+
+    Runs OneZone for every set of Inputs overrides in a process pool,
+    for sweeps too heterogeneous for Ensemble (e.g. include_channel,
+    IMF_option, yields_*_option).
+    The yield and lifetime tables of all the runs are compiled and loaded
+    once by the parent, into shared memory that every worker maps
+    (Shared_Tables). The runs are saved in outdir/run_<k>/, and
+    outdir/manifest.csv collects their overrides, status and timings.
+
+    IN (Input): an Input configuration instance, common to all the runs
+    overrides [list of dict]: Inputs attributes of every run, see also Sweep.grid()
+    max_workers [int]: worker processes, os.cpu_count() by default
+    start_method [str]: 'forkserver' (default), 'spawn' or 'fork'
+    """
+    def __init__(self, IN, overrides, outdir='runs/mysweep/', max_workers=None,
+                 start_method='forkserver'):
+        self._dir_out = outdir if outdir[-1]=='/' else outdir+'/'
+        os.makedirs(self._dir_out, exist_ok=True)
+        self.IN = IN
+        self.overrides = list(overrides)
+        for override in self.overrides:
+            unknown = [key for key in override if key not in self.IN.__dict__ 
+                       and key not in self.IN.static_tables]
+            if unknown:
+                raise ValueError('Unknown Inputs attributes: %s'%', '.join(unknown))
+        self.max_workers = os.cpu_count() if max_workers is None else max_workers
+        self.start_method = start_method
+        self.manifest = None
+
+    def __repr__(self):
+        aux = Auxiliary()
+        return aux.repr(self)
+
+    @staticmethod
+    def grid(params):
+        '''Overrides of all the combinations of a dict of lists'''
+        return [dict(zip(params, values)) for values in itertools.product(*params.values())]
+
+    def run_inputs(self, k):
+        '''Copy of IN with the overrides of run k'''
+        IN_k = copy.copy(self.IN)
+        for key, value in self.overrides[k].items():
+            IN_k.__dict__[key] = value
+        return IN_k
+
+    def run_dir(self, k):
+        return self._dir_out + 'run_%d/'%k
+
+    def shared_tables(self):
+        '''
+        Compiles (if needed) and publishes the yield and lifetime tables
+        of every run, once per table
+        '''
+        from .classes import morphology as morph
+        from .classes import yields as yi
+        shared = Shared_Tables()
+        try:
+            for k in range(len(self.overrides)):
+                IN_k = self.run_inputs(k)
+                for yields_class in [yi.Yields_SNCC, yi.Yields_LIMs, yi.Yields_SNIa, yi.Yields_BBN]:
+                    yields = yields_class(IN_k)
+                    yields.import_yields()
+                    if yields.table_path is not None:
+                        shared.publish(yields.table_path, yields.tables)
+                lifetimes = morph.Stellar_Lifetimes(IN_k)
+                if lifetimes.table_path is not None:
+                    arrays = dict(morph.load_lifetime_tables(lifetimes.table_path))
+                    for table in [lifetimes.lifetime_by_mass_metallicity_loaded,
+                                  lifetimes.mass_by_lifetime_metallicity_loaded]:
+                        arrays[table.name+'.coeffs'] = table.coeffs
+                    shared.publish(lifetimes.table_path, arrays)
+        except BaseException:
+            shared.unlink()
+            raise
+        return shared
+
+    def write_manifest(self, rows):
+        self.manifest = pd.DataFrame(rows).sort_values('run').reset_index(drop=True)
+        self.manifest.to_csv(self._dir_out + 'manifest.csv', index=False)
+
+    def main(self):
+        ''' Run the Sweep program '''
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        tic = time.perf_counter()
+        shared = self.shared_tables()
+        print('%d tables (%.1f MB) in shared memory in %.2f seconds.'%(
+              len(shared.spec), shared.nbytes()/1e6, time.perf_counter()-tic))
+        context = multiprocessing.get_context(self.start_method)
+        if self.start_method == 'forkserver':
+            context.set_forkserver_preload(['galcem.onezone'])
+        rows = []
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                     initializer=attach_tables, initargs=(shared.spec,)) as pool:
+                futures = {pool.submit(run_onezone, self.run_inputs(k), self.run_dir(k)): k
+                           for k in range(len(self.overrides))}
+                for future in as_completed(futures):
+                    k = futures[future]
+                    row = {'run': k, 'outdir': self.run_dir(k)}
+                    row.update({key: str(value) for key, value in self.overrides[k].items()})
+                    if future.exception() is None:
+                        row.update(status='done', error='', **future.result())
+                    else:
+                        row.update(status='failed', error=repr(future.exception()))
+                    rows.append(row)
+                    self.write_manifest(rows)
+                    print('run %d %s (%d/%d)'%(k, row['status'], len(rows), len(futures)))
+        finally:
+            shared.unlink()
+        print('Sweep of %d runs in %.1f seconds.'%(len(rows), time.perf_counter()-tic))
+        return self.manifest
@@ -0,0 +1,22 @@
+import os
+import pandas as pd
+from galcem.classes.yields import compile_yield_table, load_yield_table, yield_table_path, yield_table_stamp
+
+def compile_yield_tables(options=['lc18', 'c15', 'k10'], subdivisions=8):
+    # compile yield_interpolation/<option>/data.csv into <option>_yields.v*.npz (irv=0)
+    root = os.path.abspath(os.path.dirname(__file__))
+    for option in options:
+        df = pd.read_csv(root+'/%s/data.csv'%option)
+        if 'irv' in df.columns:
+            df = df[df['irv']==0]
+        ycol = 'massfrac' if 'massfrac' in df.columns else 'yield'
+        path = yield_table_path(root+'/'+option, option)
+        compile_yield_table(df, path, ycol=ycol, subdivisions=subdivisions,
+                            stamp=yield_table_stamp(root+'/%s/data.csv'%option, ycol=ycol))
+        table = load_yield_table(path)
+        print('%s: %d isotopes on a %d x %d (metallicity x mass) grid of %s -> %s'%(
+            option, len(table['ZA']), len(table['log_metallicity']),
+            len(table['log_mass']), ycol, path))
+
+if __name__ == '__main__':
+    compile_yield_tables()